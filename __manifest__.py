@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Options Pharmacy',
-    'version': '1.0.1',
+    'version': '1.0.2',
     'category': 'Point of Sale',
     'summary': 'Complete Point of Sale System for Options Pharmacy',
     'description': """
@@ -37,7 +37,7 @@
         'contacts',
     ],
     'external_dependencies': {
-        'python': ['qrcode', 'requests'],
+        'python': ['qrcode', 'requests', 'numpy'],
     },
     'data': [
         # Security first (but basic groups only)
@@ -49,21 +49,43 @@
         
         # Access rules (after models are loaded)
         'security/ir.model.access.csv',
+        'data/markdown_data.xml',
+        
+        # Scheduled actions
+        'data/ir_cron_data.xml',
         
         # Views
         'views/pharmacy_product_views.xml',
+        'views/drug_interaction_views.xml',
         'views/prescription_views.xml',
         'views/pos_order_views.xml',
         'views/pos_config_views.xml',
         'views/patient_views.xml',
+        'views/patient_duplicate_views.xml',
         'views/prescriber_views.xml',
         'views/controlled_drugs_register_views.xml',
         'views/kra_etims_views.xml',
         'views/payment_method_views.xml',
         'views/pharmacy_dashboard_views.xml',
+        'views/pharmacy_sales_report_views.xml',
+        'views/report_batch_views.xml',
+        'views/insurance_claim_views.xml',
+        'views/pipeline_stat_views.xml',
+        'views/cold_chain_views.xml',
+        'views/markdown_views.xml',
+        'views/sale_blocklist_views.xml',
+        'views/practitioner_register_views.xml',
+        'views/session_report_views.xml',
         
         # Wizards
         'wizards/expiry_alert_wizard_views.xml',
+        'wizards/batch_recall_wizard_views.xml',
+        'wizards/lot_intake_wizard_views.xml',
+        'wizards/catalogue_import_wizard_views.xml',
+        'wizards/patient_import_wizard_views.xml',
+        'wizards/claim_batch_wizard_views.xml',
+        'wizards/reorder_wizard_views.xml',
+        'wizards/practitioner_import_wizard_views.xml',
         
         # Menu
         'views/menu_views.xml',
@@ -71,6 +93,7 @@
         # Reports
         'reports/prescription_report.xml',
         'reports/controlled_drugs_report.xml',
+        'reports/session_report.xml',
         'reports/expiry_report.xml',
         'reports/sales_report.xml',
         'reports/receipt_templates.xml',
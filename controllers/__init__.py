@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import dashboard
+from . import cold_chain
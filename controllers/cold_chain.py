@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import hmac
+import json
+import logging
+
+from odoo import http
+from odoo.exceptions import UserError
+from odoo.http import request
+
+_logger = logging.getLogger(__name__)
+
+
+class ColdChainController(http.Controller):
+
+    def _json_response(self, payload, status=200):
+        return request.make_response(json.dumps(payload), headers=[('Content-Type', 'application/json')], status=status)
+
+    @http.route('/softlink_pos/cold_chain/readings', type='http', auth='none', methods=['POST'], csrf=False)
+    def ingest_readings(self, **kwargs):
+        """Batch upload from a fridge sensor gateway.
+
+        Body: ``{"serial": "...", "readings": [[timestamp, temperature], ...]}``
+        with timestamps as epoch seconds or ISO 8601, authenticated with the
+        sensor token as ``Authorization: Bearer <token>``.
+        """
+        try:
+            payload = json.loads(request.httprequest.get_data() or b'{}')
+            serial = payload['serial']
+            readings = payload['readings']
+        except (ValueError, KeyError, TypeError):
+            return self._json_response({'error': 'invalid payload'}, status=400)
+
+        device = request.env['pharmacy.cold.chain.device'].sudo().search([('serial', '=', serial)], limit=1)
+        header = request.httprequest.headers.get('Authorization', '')
+        token = header[7:] if header.startswith('Bearer ') else ''
+        if not device or not device.token or not hmac.compare_digest(device.token, token):
+            return self._json_response({'error': 'unauthorized'}, status=401)
+
+        try:
+            stored = device._ingest(readings)
+        except (UserError, ValueError, TypeError) as e:
+            request.env.cr.rollback()
+            _logger.warning('Rejected cold chain readings from %s: %s', serial, e)
+            return self._json_response({'error': str(e)}, status=400)
+        return self._json_response({'stored': stored, 'state': device.state})
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+from odoo import http
+from odoo.http import request
+
+
+class PharmacyDashboardController(http.Controller):
+
+    @http.route('/softlink_pos/dashboard/kpis', type='json', auth='user')
+    def dashboard_kpis(self, config_id=False):
+        """All dashboard KPIs in one response, served from a short-lived cache"""
+        return request.env['pos.session'].get_pharmacy_dashboard_kpis(config_id=config_id)
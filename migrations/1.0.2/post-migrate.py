@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Move the eTIMS data once kept on pos_order into kra_etims_document.
+
+The columns are dropped once copied, and the stored QR code images are
+removed; receipts now render them on demand.
+"""
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools import split_every
+from odoo.tools.sql import column_exists
+
+_logger = logging.getLogger(__name__)
+
+# Former pos_order columns, by document column
+LEGACY_ORDER_COLUMNS = {'signature': 'kra_signature', 'qr_data': 'kra_qr_data', 'response': 'kra_response'}
+
+
+def migrate(cr, version):
+    legacy = {column: order_column for column, order_column in LEGACY_ORDER_COLUMNS.items()
+              if column_exists(cr, 'pos_order', order_column)}
+    if legacy:
+        columns = ', '.join(legacy)
+        selects = ', '.join(f'o.{order_column}' for order_column in legacy.values())
+        condition = ' OR '.join(f'o.{order_column} IS NOT NULL' for order_column in legacy.values())
+        cr.execute(f"""
+            INSERT INTO kra_etims_document (order_id, {columns}, archived,
+                                            create_uid, create_date, write_uid, write_date)
+            SELECT o.id, {selects}, FALSE, 1, NOW() AT TIME ZONE 'UTC', 1, NOW() AT TIME ZONE 'UTC'
+            FROM pos_order o
+            WHERE ({condition})
+            ON CONFLICT (order_id) DO NOTHING
+        """)
+        _logger.info('Moved eTIMS data of %s orders out of pos_order', cr.rowcount)
+        for order_column in legacy.values():
+            cr.execute(f'ALTER TABLE pos_order DROP COLUMN {order_column}')
+
+    # Unlinked through the ORM so the files are removed from the filestore too
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Attachment = env['ir.attachment']
+    attachment_ids = Attachment.search([('res_model', '=', 'pos.order'), ('res_field', '=', 'kra_qr_code')]).ids
+    for ids in split_every(1000, attachment_ids, list):
+        Attachment.browse(ids).unlink()
+    if attachment_ids:
+        _logger.info('Removed %s stored eTIMS QR code images', len(attachment_ids))
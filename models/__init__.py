@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 
 from . import pharmacy_product
+from . import drug_interaction
 from . import prescription
 from . import patient
+from . import patient_duplicate
+from . import practitioner_register
 from . import prescriber
+from . import pipeline_stat
 from . import pos_order
 from . import pos_config
 from . import pos_session
@@ -12,3 +16,13 @@ from . import product_template
 from . import stock_lot
 from . import payment_method
 from . import kra_etims
+from . import etims_document
+from . import escpos_receipt
+from . import receipt_block
+from . import report_batch
+from . import insurance_claim
+from . import pharmacy_sales_report
+from . import cold_chain
+from . import markdown
+from . import sale_blocklist
+from . import session_report
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import secrets
+from datetime import datetime, timedelta, timezone
+
+from psycopg2.extras import execute_values
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools.sql import index_exists
+
+_logger = logging.getLogger(__name__)
+
+# Raw readings are kept this long; hourly rollups are kept forever
+RAW_RETENTION_DAYS = 30
+# Readings accepted per request
+MAX_READINGS_PER_BATCH = 5000
+
+
+def parse_reading_time(value):
+    """Naive UTC datetime from an epoch number or an ISO 8601 string"""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class ColdChainDevice(models.Model):
+    _name = 'pharmacy.cold.chain.device'
+    _description = 'Cold Chain Sensor'
+    _inherit = ['mail.thread']
+
+    name = fields.Char(string='Fridge / Sensor', required=True)
+    serial = fields.Char(string='Sensor Serial', required=True, copy=False)
+    token = fields.Char(string='Ingestion Token', copy=False, groups='softlink_pos.group_pharmacy_manager',
+                        default=lambda self: secrets.token_urlsafe(24))
+    location_id = fields.Many2one('stock.location', string='Stock Location', required=True,
+                                  domain=[('usage', '=', 'internal')],
+                                  help='Location of the refrigerated stock monitored by this sensor')
+    company_id = fields.Many2one('res.company', string='Company', required=True, default=lambda self: self.env.company)
+    active = fields.Boolean(string='Active', default=True)
+
+    min_temp = fields.Float(string='Min Temperature (°C)', default=2.0)
+    max_temp = fields.Float(string='Max Temperature (°C)', default=8.0)
+    excursion_minutes = fields.Integer(string='Tolerated Excursion (min)', default=30,
+                                       help='Stock is flagged once an excursion lasts longer than this')
+
+    last_reading_at = fields.Datetime(string='Last Reading', readonly=True)
+    last_temperature = fields.Float(string='Last Temperature (°C)', readonly=True)
+    rollup_pending_since = fields.Datetime(string='Rollup Pending Since', readonly=True,
+                                           help='Earliest reading received since the last hourly rollup')
+    state = fields.Selection([
+        ('ok', 'In Range'),
+        ('excursion', 'Excursion'),
+    ], string='Status', default='ok', readonly=True, tracking=True)
+    open_excursion_id = fields.Many2one('pharmacy.cold.chain.excursion', string='Open Excursion', readonly=True)
+    excursion_ids = fields.One2many('pharmacy.cold.chain.excursion', 'device_id', string='Excursions')
+
+    _sql_constraints = [
+        ('serial_uniq', 'unique(serial)', 'A sensor with this serial number already exists.'),
+    ]
+
+    def init(self):
+        # Raw readings live outside the ORM: three columns, no audit fields
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS pharmacy_cold_chain_reading (
+                device_id integer NOT NULL REFERENCES pharmacy_cold_chain_device (id) ON DELETE CASCADE,
+                recorded_at timestamp NOT NULL,
+                temperature real NOT NULL
+            )
+        """)
+        if not index_exists(self.env.cr, 'pharmacy_cold_chain_reading_device_time_uniq'):
+            # One reading per sensor and instant; resent readings from before
+            # the constraint existed are dropped
+            self.env.cr.execute("""
+                DELETE FROM pharmacy_cold_chain_reading r
+                USING pharmacy_cold_chain_reading d
+                WHERE d.device_id = r.device_id AND d.recorded_at = r.recorded_at AND d.ctid < r.ctid
+            """)
+            if self.env.cr.rowcount:
+                _logger.info('Dropped %s duplicate cold chain readings', self.env.cr.rowcount)
+            self.env.cr.execute("""
+                CREATE UNIQUE INDEX pharmacy_cold_chain_reading_device_time_uniq
+                ON pharmacy_cold_chain_reading (device_id, recorded_at)
+            """)
+            self.env.cr.execute("DROP INDEX IF EXISTS pharmacy_cold_chain_reading_device_time_idx")
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS pharmacy_cold_chain_reading_time_brin
+            ON pharmacy_cold_chain_reading USING brin (recorded_at)
+        """)
+
+    def action_regenerate_token(self):
+        for device in self:
+            device.sudo().token = secrets.token_urlsafe(24)
+
+    # Ingestion
+
+    def _ingest(self, readings):
+        """Store a batch of (recorded_at, temperature) readings and run the detector.
+
+        Readings are inserted in one statement and readings already stored
+        for the same instant are ignored; only readings newer than the last
+        one seen are fed to the excursion detector, so gateways may resend a
+        window without duplicating rows or alarms.
+        """
+        self.ensure_one()
+        if len(readings) > MAX_READINGS_PER_BATCH:
+            raise UserError(f'At most {MAX_READINGS_PER_BATCH} readings are accepted per batch.')
+        rows = sorted({
+            parse_reading_time(recorded_at): float(temperature) for recorded_at, temperature in readings
+        }.items())
+        if not rows:
+            return 0
+        execute_values(self.env.cr._obj, """
+            INSERT INTO pharmacy_cold_chain_reading (device_id, recorded_at, temperature) VALUES %s
+            ON CONFLICT (device_id, recorded_at) DO NOTHING
+        """, [(self.id, recorded_at, temperature) for recorded_at, temperature in rows], page_size=1000)
+        # Late uploads move the device's rollup window back to their first hour
+        self.env.cr.execute("""
+            UPDATE pharmacy_cold_chain_device
+            SET rollup_pending_since = LEAST(rollup_pending_since, %s)
+            WHERE id = %s
+        """, (rows[0][0], self.id))
+        self.invalidate_recordset(['rollup_pending_since'])
+
+        fresh = [row for row in rows if not self.last_reading_at or row[0] > self.last_reading_at]
+        if fresh:
+            self._detect_excursions(fresh)
+            self.sudo().write({
+                'last_reading_at': fresh[-1][0],
+                'last_temperature': fresh[-1][1],
+            })
+        return len(rows)
+
+    def _detect_excursions(self, rows):
+        """Streaming detector: open, extend and close excursions reading by reading"""
+        self.ensure_one()
+        Excursion = self.env['pharmacy.cold.chain.excursion'].sudo()
+        excursion = self.open_excursion_id.sudo()
+        low, high = self.min_temp, self.max_temp
+        values = {}
+        for recorded_at, temperature in rows:
+            out_of_range = temperature < low or temperature > high
+            if out_of_range:
+                if not excursion:
+                    excursion = Excursion.create({
+                        'device_id': self.id,
+                        'start': recorded_at,
+                        'min_temp': temperature,
+                        'max_temp': temperature,
+                    })
+                    values = {}
+                values['end'] = recorded_at
+                values['min_temp'] = min(values.get('min_temp', excursion.min_temp), temperature)
+                values['max_temp'] = max(values.get('max_temp', excursion.max_temp), temperature)
+            elif excursion:
+                values['state'] = 'closed'
+                values['end'] = recorded_at
+                excursion.write(values)
+                excursion._check_duration()
+                excursion = Excursion
+                values = {}
+        if excursion:
+            excursion.write(values)
+            excursion._check_duration()
+        self.sudo().write({
+            'open_excursion_id': excursion.id or False,
+            'state': 'excursion' if excursion else 'ok',
+        })
+
+    # Rollups
+
+    @api.model
+    def _cron_rollup_readings(self):
+        """Roll raw readings up per hour and drop raw readings past retention.
+
+        Each device is recomputed from the hour of the earliest reading it
+        received since the previous run, so re-running is idempotent and a
+        gateway uploading days of backlog still gets its hours rolled up
+        before the raw readings are purged.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT id, date_trunc('hour', rollup_pending_since)
+            FROM pharmacy_cold_chain_device
+            WHERE rollup_pending_since IS NOT NULL
+            FOR UPDATE
+        """)
+        pending = self.env.cr.fetchall()
+        if pending:
+            self.env.cr.execute("""
+                INSERT INTO pharmacy_cold_chain_rollup AS r
+                    (device_id, hour, min_temp, max_temp, avg_temp, reading_count,
+                     create_uid, create_date, write_uid, write_date)
+                SELECT reading.device_id, date_trunc('hour', reading.recorded_at), MIN(reading.temperature),
+                       MAX(reading.temperature), AVG(reading.temperature), COUNT(*),
+                       %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+                FROM unnest(%(device_ids)s::integer[], %(since)s::timestamp[]) AS w (device_id, since)
+                JOIN pharmacy_cold_chain_reading reading
+                  ON reading.device_id = w.device_id AND reading.recorded_at >= w.since
+                GROUP BY reading.device_id, date_trunc('hour', reading.recorded_at)
+                ON CONFLICT (device_id, hour) DO UPDATE SET
+                    min_temp = EXCLUDED.min_temp,
+                    max_temp = EXCLUDED.max_temp,
+                    avg_temp = EXCLUDED.avg_temp,
+                    reading_count = EXCLUDED.reading_count,
+                    write_date = EXCLUDED.write_date
+            """, {
+                'uid': self.env.uid,
+                'device_ids': [device_id for device_id, since in pending],
+                'since': [since for device_id, since in pending],
+            })
+            self.env.cr.execute("""
+                UPDATE pharmacy_cold_chain_device SET rollup_pending_since = NULL WHERE id = ANY(%s)
+            """, ([device_id for device_id, since in pending],))
+            self.invalidate_model(['rollup_pending_since'])
+        self.env.cr.execute("""
+            DELETE FROM pharmacy_cold_chain_reading
+            WHERE recorded_at < NOW() AT TIME ZONE 'UTC' - %s * INTERVAL '1 day'
+        """, (RAW_RETENTION_DAYS,))
+        self.env['pharmacy.cold.chain.rollup'].invalidate_model()
+
+    # Simulator
+
+    def action_simulate(self, hours=24, interval_seconds=60, excursion=True, seed=None):
+        """Feed the detector with simulated readings, as a fridge sensor would.
+
+        Readings drift around the middle of the allowed range; with
+        ``excursion`` a door-open event pushes the temperature out of range
+        for twice the tolerated duration halfway through.
+        """
+        self.ensure_one()
+        rng = random.Random(seed)
+        now = fields.Datetime.now().replace(microsecond=0)
+        start = max(self.last_reading_at or datetime.min, now - timedelta(hours=hours)) + timedelta(seconds=interval_seconds)
+        count = int((now - start).total_seconds() // interval_seconds) + 1
+        middle = (self.min_temp + self.max_temp) / 2
+        excursion_start = count // 2
+        excursion_length = max(1, 2 * self.excursion_minutes * 60 // interval_seconds)
+        batch = []
+        temperature = middle
+        for index in range(count):
+            temperature += rng.uniform(-0.2, 0.2) + (middle - temperature) * 0.1
+            value = temperature
+            if excursion and excursion_start <= index < excursion_start + excursion_length:
+                value = self.max_temp + 2.0 + rng.uniform(0, 1.5)
+            batch.append((start + timedelta(seconds=index * interval_seconds), round(value, 2)))
+            if len(batch) == MAX_READINGS_PER_BATCH:
+                self._ingest([(recorded_at.isoformat(), value) for recorded_at, value in batch])
+                batch = []
+        if batch:
+            self._ingest([(recorded_at.isoformat(), value) for recorded_at, value in batch])
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Simulation Complete',
+                'message': f'{count} readings ingested for {self.name}.',
+                'type': 'info',
+                'sticky': False,
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            },
+        }
+
+
+class ColdChainExcursion(models.Model):
+    _name = 'pharmacy.cold.chain.excursion'
+    _description = 'Cold Chain Excursion'
+    _inherit = ['mail.thread']
+    _order = 'start desc'
+
+    device_id = fields.Many2one('pharmacy.cold.chain.device', string='Sensor', required=True, ondelete='cascade', index=True)
+    location_id = fields.Many2one(related='device_id.location_id', string='Location')
+    company_id = fields.Many2one(related='device_id.company_id', store=True)
+    start = fields.Datetime(string='Start', required=True)
+    end = fields.Datetime(string='End')
+    duration_minutes = fields.Float(string='Duration (min)', compute='_compute_duration', store=True)
+    min_temp = fields.Float(string='Min (°C)')
+    max_temp = fields.Float(string='Max (°C)')
+    state = fields.Selection([
+        ('open', 'Ongoing'),
+        ('closed', 'Ended'),
+    ], string='Status', default='open', required=True, tracking=True)
+    lot_ids = fields.Many2many('stock.lot', string='Affected Lots', readonly=True)
+    reviewed = fields.Boolean(string='Reviewed', tracking=True)
+    review_notes = fields.Text(string='Review Notes')
+
+    @api.depends('start', 'end')
+    def _compute_duration(self):
+        for excursion in self:
+            if excursion.start and excursion.end:
+                excursion.duration_minutes = (excursion.end - excursion.start).total_seconds() / 60
+            else:
+                excursion.duration_minutes = 0.0
+
+    def _check_duration(self):
+        """Flag cold-chain lots in the sensor's location once the tolerance is exceeded"""
+        for excursion in self.filtered(lambda e: not e.lot_ids):
+            if excursion.duration_minutes <= excursion.device_id.excursion_minutes:
+                continue
+            quants = self.env['stock.quant'].sudo().search([
+                ('location_id', 'child_of', excursion.device_id.location_id.id),
+                ('lot_id', '!=', False),
+                ('quantity', '>', 0),
+                ('product_id.product_tmpl_id.pharmacy_product_id.cold_chain', '=', True),
+            ])
+            lots = quants.lot_id
+            if not lots:
+                continue
+            excursion.lot_ids = [(6, 0, lots.ids)]
+            lots.write({'cold_chain_compromised': True})
+            excursion.message_post(body=f'{len(lots)} lot(s) flagged: temperature out of range for '
+                                        f'{excursion.duration_minutes:.0f} minutes.')
+            _logger.warning('Cold chain excursion on %s flagged %s lots', excursion.device_id.name, len(lots))
+
+    def action_mark_reviewed(self):
+        self.write({'reviewed': True})
+
+
+class ColdChainRollup(models.Model):
+    _name = 'pharmacy.cold.chain.rollup'
+    _description = 'Cold Chain Hourly Readings'
+    _order = 'hour desc'
+
+    device_id = fields.Many2one('pharmacy.cold.chain.device', string='Sensor', required=True, ondelete='cascade')
+    hour = fields.Datetime(string='Hour', required=True)
+    min_temp = fields.Float(string='Min (°C)', aggregator='min')
+    max_temp = fields.Float(string='Max (°C)', aggregator='max')
+    avg_temp = fields.Float(string='Avg (°C)', aggregator='avg')
+    reading_count = fields.Integer(string='Readings')
+
+    _sql_constraints = [
+        ('device_hour_uniq', 'unique(device_id, hour)', 'One rollup per sensor and hour.'),
+    ]
+
@@ -1,6 +1,43 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import hmac
+import logging
+
 from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Columns covered by the register hash chain. Changing this list invalidates
+# every existing chain. The patient is covered through its name/ID snapshot
+# rather than patient_id, so merging duplicate patients can re-point entries.
+CHAIN_FIELDS = [
+    'company_id', 'date', 'product_id', 'quantity', 'pos_order_id',
+    'patient_name', 'patient_id_number', 'patient_address',
+    'prescription_id', 'prescriber_id', 'prescriber_license',
+    'dispensed_by', 'pharmacist_id',
+]
+# Fields that cannot be written once an entry is recorded. patient_id is
+# not hashed but stays protected; only the patient merge re-points it, in SQL.
+PROTECTED_FIELDS = CHAIN_FIELDS + ['patient_id', 'chain_sequence', 'previous_hash', 'entry_hash']
+CHAIN_BATCH_SIZE = 2000
+
+
+def _chain_hash(row, previous_hash):
+    """Hash one register row (a dict of raw column values) onto the chain"""
+    parts = []
+    for name in CHAIN_FIELDS:
+        value = row[name]
+        if value is None or value is False:
+            value = ''
+        elif name == 'date':
+            value = fields.Datetime.to_string(value)
+        elif name == 'quantity':
+            value = '%.6f' % value
+        parts.append(str(value))
+    payload = (previous_hash or '') + '|' + '|'.join(parts)
+    return hashlib.sha256(payload.encode()).hexdigest()
 
 
 class ControlledDrugsRegister(models.Model):
@@ -16,6 +53,7 @@ class ControlledDrugsRegister(models.Model):
     product_id = fields.Many2one('product.product', string='Product', required=True)
     pharmacy_product_id = fields.Many2one('pharmacy.product', string='Pharmacy Product',
                                           related='product_id.product_tmpl_id.pharmacy_product_id', readonly=True)
+    lot_id = fields.Many2one('stock.lot', string='Lot/Batch', index='btree_not_null')
     
     # Patient Information
     patient_id = fields.Many2one('pharmacy.patient', string='Patient')
@@ -46,6 +84,154 @@ class ControlledDrugsRegister(models.Model):
     company_id = fields.Many2one('res.company', string='Company', required=True, 
                                  default=lambda self: self.env.company)
     
+    # Tamper-evident hash chain (per company)
+    chain_sequence = fields.Integer(string='Chain Sequence', readonly=True, copy=False)
+    previous_hash = fields.Char(string='Previous Hash', readonly=True, copy=False)
+    entry_hash = fields.Char(string='Entry Hash', readonly=True, copy=False)
+    
+    def init(self):
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS pharmacy_controlled_drugs_register_chain_idx
+            ON pharmacy_controlled_drugs_register (company_id, chain_sequence)
+            WHERE chain_sequence IS NOT NULL
+        """)
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(ControlledDrugsRegister, self).create(vals_list)
+        records._append_to_chain()
+        return records
+    
+    def write(self, vals):
+        protected = set(vals) & set(PROTECTED_FIELDS)
+        if protected and any(record.entry_hash for record in self):
+            raise UserError('Controlled drugs register entries cannot be modified once recorded. '
+                            'Record a correcting entry instead.')
+        return super(ControlledDrugsRegister, self).write(vals)
+    
+    def unlink(self):
+        if any(record.entry_hash for record in self):
+            raise UserError('Controlled drugs register entries cannot be deleted once recorded.')
+        return super(ControlledDrugsRegister, self).unlink()
+    
+    def _read_chain_rows(self, where, params):
+        self.env.cr.execute(f"""
+            SELECT id, chain_sequence, previous_hash, entry_hash, {', '.join(CHAIN_FIELDS)}
+            FROM pharmacy_controlled_drugs_register
+            WHERE {where}
+        """, params)
+        return self.env.cr.dictfetchall()
+    
+    def _append_to_chain(self):
+        """Chain unhashed entries onto the tail of their company's chain.
+
+        The tail is kept on the company's chain head row, locked with
+        SELECT ... FOR UPDATE, so the cost per insert stays constant however
+        long the register grows. A till whose snapshot predates another
+        till's append gets a serialization failure on the lock and Odoo
+        retries its transaction, so two entries never share a sequence.
+        """
+        if not self:
+            return
+        self.flush_model()
+        Head = self.env['pharmacy.controlled.drugs.chain.head']
+        for company_id in set(self.mapped('company_id').ids):
+            sequence, previous_hash = Head._lock(company_id)
+            rows = self._read_chain_rows(
+                'id IN %s AND company_id = %s AND entry_hash IS NULL ORDER BY id',
+                (tuple(self.ids), company_id))
+            if not rows:
+                continue
+            for row in rows:
+                sequence += 1
+                entry_hash = _chain_hash(row, previous_hash)
+                self.env.cr.execute("""
+                    UPDATE pharmacy_controlled_drugs_register
+                    SET chain_sequence = %s, previous_hash = %s, entry_hash = %s
+                    WHERE id = %s
+                """, (sequence, previous_hash, entry_hash, row['id']))
+                previous_hash = entry_hash
+            Head._move(company_id, sequence, previous_hash)
+        self.invalidate_recordset(['chain_sequence', 'previous_hash', 'entry_hash'])
+    
+    @api.model
+    def _verify_company_chain(self, company, full=False):
+        """Verify a company's chain from its latest valid checkpoint.
+
+        Returns (last_sequence, last_hash) on success and raises UserError at the
+        first broken link. With ``full`` the whole chain is rehashed.
+        """
+        Checkpoint = self.env['pharmacy.controlled.drugs.checkpoint']
+        sequence, previous_hash = 0, ''
+        if not full:
+            checkpoint = Checkpoint._latest_valid_checkpoint(company)
+            if checkpoint:
+                sequence, previous_hash = checkpoint.chain_sequence, checkpoint.entry_hash
+        
+        # Re-check the checkpointed entry itself so an edit to it is not missed
+        if sequence:
+            rows = self._read_chain_rows('company_id = %s AND chain_sequence = %s', (company.id, sequence))
+            if not rows or _chain_hash(rows[0], rows[0]['previous_hash']) != previous_hash:
+                raise UserError(f'Controlled drugs register chain for {company.name} is broken '
+                                f'at checkpointed entry #{sequence}.')
+        
+        while True:
+            rows = self._read_chain_rows(
+                'company_id = %s AND chain_sequence > %s ORDER BY chain_sequence LIMIT %s',
+                (company.id, sequence, CHAIN_BATCH_SIZE))
+            if not rows:
+                break
+            for row in rows:
+                if (row['chain_sequence'] != sequence + 1
+                        or (row['previous_hash'] or '') != previous_hash
+                        or _chain_hash(row, previous_hash) != row['entry_hash']):
+                    raise UserError(f'Controlled drugs register chain for {company.name} is broken '
+                                    f'at entry #{sequence + 1}.')
+                sequence, previous_hash = row['chain_sequence'], row['entry_hash']
+        return sequence, previous_hash
+    
+    @api.model
+    def _verify_and_checkpoint(self, company, full=False):
+        """Chain pending entries, verify the company's chain and checkpoint its tail"""
+        unchained = self.search([('company_id', '=', company.id), ('entry_hash', '=', False)])
+        unchained._append_to_chain()
+        sequence, entry_hash = self._verify_company_chain(company, full=full)
+        if sequence:
+            self.env['pharmacy.controlled.drugs.checkpoint']._create_checkpoint(company, sequence, entry_hash)
+        return sequence
+    
+    @api.model
+    def action_verify_chain(self, full=False):
+        """Verify the register chain and checkpoint the verified tail"""
+        messages = []
+        for company in self.env.companies:
+            sequence = self._verify_and_checkpoint(company, full=full)
+            messages.append(f'{company.name}: {sequence} entries verified')
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Controlled Drugs Register',
+                'message': '\n'.join(messages),
+                'type': 'success',
+                'sticky': False,
+            },
+        }
+    
+    @api.model
+    def _cron_checkpoint_chains(self):
+        """Daily incremental verification, leaving a fresh checkpoint per company.
+
+        Each company is verified on its own: a broken chain is logged and does
+        not stop the other companies from being checked.
+        """
+        for company in self.env['res.company'].search([]):
+            try:
+                with self.env.cr.savepoint():
+                    self.with_company(company)._verify_and_checkpoint(company)
+            except UserError as e:
+                _logger.error('Controlled drugs register verification failed: %s', e)
+    
     @api.onchange('patient_id')
     def _onchange_patient_id(self):
         if self.patient_id:
@@ -64,3 +250,103 @@ class ControlledDrugsRegister(models.Model):
         if self.prescription_id:
             self.prescriber_id = self.prescription_id.prescriber_id
             self.prescriber_license = self.prescription_id.prescriber_id.license_number
+
+
+class ControlledDrugsChainHead(models.Model):
+    """Tail of a company's register chain, the row appends lock on"""
+    _name = 'pharmacy.controlled.drugs.chain.head'
+    _description = 'Controlled Drugs Register Chain Head'
+    _log_access = False
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True, ondelete='cascade')
+    chain_sequence = fields.Integer(string='Chain Sequence', readonly=True)
+    entry_hash = fields.Char(string='Entry Hash', readonly=True)
+    
+    _sql_constraints = [
+        ('company_uniq', 'unique(company_id)', 'A company has a single register chain.'),
+    ]
+    
+    def init(self):
+        # Start from the current tail of chains recorded before the head row existed
+        self.env.cr.execute("""
+            INSERT INTO pharmacy_controlled_drugs_chain_head (company_id, chain_sequence, entry_hash)
+            SELECT DISTINCT ON (company_id) company_id, chain_sequence, entry_hash
+            FROM pharmacy_controlled_drugs_register
+            WHERE chain_sequence IS NOT NULL
+            ORDER BY company_id, chain_sequence DESC
+            ON CONFLICT (company_id) DO NOTHING
+        """)
+    
+    @api.model
+    def _lock(self, company_id):
+        """Lock the company's chain head and return its (sequence, hash)"""
+        for attempt in range(2):
+            self.env.cr.execute("""
+                SELECT chain_sequence, entry_hash FROM pharmacy_controlled_drugs_chain_head
+                WHERE company_id = %s
+                FOR UPDATE
+            """, (company_id,))
+            row = self.env.cr.fetchone()
+            if row:
+                return row[0] or 0, row[1] or ''
+            # First entry of the company; a concurrent creator makes the
+            # insert fail to serialize and the transaction is retried
+            self.env.cr.execute("""
+                INSERT INTO pharmacy_controlled_drugs_chain_head (company_id, chain_sequence, entry_hash)
+                VALUES (%s, 0, '')
+                ON CONFLICT (company_id) DO NOTHING
+            """, (company_id,))
+        raise UserError('Could not lock the controlled drugs register chain.')
+    
+    @api.model
+    def _move(self, company_id, chain_sequence, entry_hash):
+        self.env.cr.execute("""
+            UPDATE pharmacy_controlled_drugs_chain_head
+            SET chain_sequence = %s, entry_hash = %s
+            WHERE company_id = %s
+        """, (chain_sequence, entry_hash, company_id))
+        self.invalidate_model()
+
+
+class ControlledDrugsCheckpoint(models.Model):
+    _name = 'pharmacy.controlled.drugs.checkpoint'
+    _description = 'Controlled Drugs Register Checkpoint'
+    _order = 'company_id, chain_sequence desc'
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True)
+    chain_sequence = fields.Integer(string='Chain Sequence', required=True, readonly=True)
+    entry_hash = fields.Char(string='Entry Hash', required=True, readonly=True)
+    signature = fields.Char(string='Signature', required=True, readonly=True)
+    date = fields.Datetime(string='Verified On', required=True, readonly=True, default=fields.Datetime.now)
+    verified_by = fields.Many2one('res.users', string='Verified By', readonly=True,
+                                  default=lambda self: self.env.user)
+    
+    @api.model
+    def _sign(self, company_id, chain_sequence, entry_hash):
+        secret = self.env['ir.config_parameter'].sudo().get_param('database.secret')
+        message = f"{company_id}|{chain_sequence}|{entry_hash}"
+        return hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+    
+    @api.model
+    def _create_checkpoint(self, company, chain_sequence, entry_hash):
+        latest = self.search([('company_id', '=', company.id)], limit=1)
+        if latest and latest.chain_sequence == chain_sequence:
+            return latest
+        return self.sudo().create({
+            'company_id': company.id,
+            'chain_sequence': chain_sequence,
+            'entry_hash': entry_hash,
+            'signature': self._sign(company.id, chain_sequence, entry_hash),
+        })
+    
+    @api.model
+    def _latest_valid_checkpoint(self, company):
+        """Most recent checkpoint whose signature still matches its content"""
+        for checkpoint in self.search([('company_id', '=', company.id)], limit=10):
+            expected = self._sign(company.id, checkpoint.chain_sequence, checkpoint.entry_hash)
+            if hmac.compare_digest(expected, checkpoint.signature):
+                return checkpoint
+        return self.browse()
+    
+    def write(self, vals):
+        raise UserError('Register checkpoints cannot be modified.')
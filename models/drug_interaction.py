@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+from itertools import combinations
+
+from odoo import models, fields, api
+
+from .pharmacy_product import normalize_ingredients
+from .worker_cache import WorkerCache
+
+SEVERITY_RANK = {'contraindicated': 4, 'major': 3, 'moderate': 2, 'minor': 1}
+# Catalogue and interaction lookup tables, rebuilt after either changes
+SCREENING_INDEX = WorkerCache('screening_index')
+
+
+class DrugInteraction(models.Model):
+    """Known interaction between two ingredients or pharmacological classes.
+
+    Screening runs against an in-memory index of the catalogue and of these
+    pairs, built once per worker and dropped whenever either changes.
+    """
+    _name = 'pharmacy.drug.interaction'
+    _description = 'Drug Interaction'
+    _order = 'ingredient_a, ingredient_b'
+
+    ingredient_a = fields.Char(string='Ingredient / Class', required=True,
+                               help='Active ingredient or pharmacological class, e.g. warfarin or NSAIDs')
+    ingredient_b = fields.Char(string='Interacts With', required=True)
+    severity = fields.Selection([
+        ('minor', 'Minor'),
+        ('moderate', 'Moderate'),
+        ('major', 'Major'),
+        ('contraindicated', 'Contraindicated'),
+    ], string='Severity', required=True, default='moderate')
+    description = fields.Text(string='Clinical Effect')
+    active = fields.Boolean(string='Active', default=True)
+    
+    def init(self):
+        SCREENING_INDEX.init(self.env.cr)
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(DrugInteraction, self).create(vals_list)
+        self._invalidate_screening_index()
+        return records
+    
+    def write(self, vals):
+        res = super(DrugInteraction, self).write(vals)
+        self._invalidate_screening_index()
+        return res
+    
+    def unlink(self):
+        res = super(DrugInteraction, self).unlink()
+        self._invalidate_screening_index()
+        return res
+    
+    @api.model
+    def _invalidate_screening_index(self):
+        SCREENING_INDEX.invalidate(self.env)
+    
+    @api.model
+    def _get_screening_index(self):
+        return SCREENING_INDEX.get(self.env, 'index', self._build_screening_index)
+    
+    @api.model
+    def _build_screening_index(self):
+        """Compile the catalogue and interaction pairs into lookup tables.
+
+        Returns ``(products, interactions)`` where ``products`` maps a
+        product.product id to ``(name, terms, contraindication)`` (terms being
+        its ingredients and classes) and ``interactions`` maps a term to
+        ``{other term: (severity, description)}``. Both are read-only.
+        """
+        self.env['pharmacy.product'].flush_model()
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT product_id, name, generic_name, active_ingredient,
+                   pharmacological_class, therapeutic_class, contraindication
+            FROM pharmacy_product
+        """)
+        products = {}
+        for product_id, name, generic, ingredient, pharmacological, therapeutic, contraindication in self.env.cr.fetchall():
+            terms = normalize_ingredients(ingredient) | normalize_ingredients(generic)
+            terms |= {value.strip().lower() for value in (pharmacological, therapeutic) if value}
+            products[product_id] = (name, frozenset(terms), (contraindication or '').lower())
+        
+        self.env.cr.execute("""
+            SELECT lower(trim(ingredient_a)), lower(trim(ingredient_b)), severity, description
+            FROM pharmacy_drug_interaction
+            WHERE active
+        """)
+        interactions = {}
+        for term_a, term_b, severity, description in self.env.cr.fetchall():
+            interactions.setdefault(term_a, {})[term_b] = (severity, description or '')
+            interactions.setdefault(term_b, {})[term_a] = (severity, description or '')
+        return products, interactions
+    
+    @api.model
+    def get_pos_screening_index(self):
+        """The screening index as JSON, so tills can screen baskets while offline.
+
+        ``products`` maps a product.product id to ``[name, terms]`` and
+        ``interactions`` maps a term to ``{other term: [severity, description]}``.
+        Patient checks need the patient record and stay on the server.
+        """
+        products, interactions = self._get_screening_index()
+        return {
+            'products': {product_id: [name, sorted(terms)] for product_id, (name, terms, dummy) in products.items()},
+            'interactions': interactions,
+        }
+    
+    @api.model
+    def _match_interactions(self, interactions, terms_a, terms_b):
+        for term in terms_a:
+            partners = interactions.get(term)
+            if partners:
+                for other in terms_b:
+                    if other in partners:
+                        yield term, other, partners[other]
+    
+    @api.model
+    def screen_basket(self, product_ids, patient_id=False):
+        """Screen products (product.product ids) against each other and the patient.
+
+        Returns a list of alerts ``{'type', 'severity', 'message', 'product_ids'}``
+        sorted by severity. Apart from one read of the patient record this is
+        pure in-memory set lookups.
+        """
+        products, interactions = self._get_screening_index()
+        basket = [(product_id, products[product_id]) for product_id in dict.fromkeys(product_ids) if product_id in products]
+        alerts = []
+        
+        for (id_a, (name_a, terms_a, _ca)), (id_b, (name_b, terms_b, _cb)) in combinations(basket, 2):
+            for term_a, term_b, (severity, description) in self._match_interactions(interactions, terms_a, terms_b):
+                alerts.append({
+                    'type': 'interaction',
+                    'severity': severity,
+                    'message': f'{name_a} ({term_a}) interacts with {name_b} ({term_b}). {description}'.strip(),
+                    'product_ids': [id_a, id_b],
+                })
+            shared = terms_a & terms_b
+            if shared:
+                alerts.append({
+                    'type': 'duplicate',
+                    'severity': 'moderate',
+                    'message': f"{name_a} and {name_b} both contain {', '.join(sorted(shared))}.",
+                    'product_ids': [id_a, id_b],
+                })
+        
+        patient = self.env['pharmacy.patient'].browse(patient_id).exists() if patient_id else False
+        if patient:
+            allergies = normalize_ingredients(patient.allergies)
+            medications = normalize_ingredients(patient.current_medications)
+            conditions = {condition.strip().lower() for condition in
+                          (patient.chronic_conditions or '').replace(';', ',').replace('\n', ',').split(',')
+                          if condition.strip()}
+            for product_id, (name, terms, contraindication) in basket:
+                for allergy in allergies:
+                    matched = [term for term in terms if allergy in term or term in allergy]
+                    if matched:
+                        alerts.append({
+                            'type': 'allergy',
+                            'severity': 'contraindicated',
+                            'message': f"Patient is allergic to {allergy}: {name} contains {', '.join(matched)}.",
+                            'product_ids': [product_id],
+                        })
+                for term, medication, (severity, description) in self._match_interactions(interactions, terms, medications):
+                    alerts.append({
+                        'type': 'interaction',
+                        'severity': severity,
+                        'message': f'{name} ({term}) interacts with current medication {medication}. {description}'.strip(),
+                        'product_ids': [product_id],
+                    })
+                for condition in conditions:
+                    if condition in contraindication:
+                        alerts.append({
+                            'type': 'contraindication',
+                            'severity': 'major',
+                            'message': f'{name} is contraindicated in {condition}.',
+                            'product_ids': [product_id],
+                        })
+        
+        alerts.sort(key=lambda alert: -SEVERITY_RANK[alert['severity']])
+        return alerts
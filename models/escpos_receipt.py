@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import logging
+import time
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# 80mm printers print 48 columns in font A
+RECEIPT_WIDTH = 48
+# PC858 (Western Europe with euro sign), selected with ESC t 19
+RECEIPT_CODEPAGE = ('cp858', 19)
+
+ESC = b'\x1b'
+GS = b'\x1d'
+
+
+class EscPosReceipt:
+    """Byte-level builder for ESC/POS thermal receipts.
+
+    Commands are appended to a bytearray; ``getvalue`` returns the stream
+    ready to send to the printer. Text is encoded in RECEIPT_CODEPAGE and
+    characters outside it are replaced by '?'.
+    """
+
+    def __init__(self, width=RECEIPT_WIDTH):
+        self.width = width
+        self.buffer = bytearray(ESC + b'@' + ESC + b't' + bytes([RECEIPT_CODEPAGE[1]]))
+
+    def getvalue(self):
+        return bytes(self.buffer)
+
+    def raw(self, data):
+        self.buffer += data
+        return self
+
+    def text(self, value):
+        self.buffer += str(value).encode(RECEIPT_CODEPAGE[0], errors='replace')
+        return self
+
+    def line(self, value=''):
+        return self.text(value).raw(b'\n')
+
+    def align(self, position):
+        return self.raw(ESC + b'a' + bytes([{'left': 0, 'center': 1, 'right': 2}[position]]))
+
+    def bold(self, enabled=True):
+        return self.raw(ESC + b'E' + bytes([1 if enabled else 0]))
+
+    def size(self, width=1, height=1):
+        return self.raw(GS + b'!' + bytes([(width - 1) << 4 | (height - 1)]))
+
+    def separator(self, char='-'):
+        return self.line(char * self.width)
+
+    def columns(self, left, right, width=None):
+        """Left text and right-aligned text on one line, left truncated to fit"""
+        width = width or self.width
+        left, right = str(left), str(right)
+        left = left[:max(width - len(right) - 1, 0)]
+        return self.line(left + right.rjust(width - len(left)))
+
+    def wrap(self, value, indent=''):
+        """Word-wrap long text to the receipt width"""
+        current = indent
+        for word in str(value).split():
+            if len(current) + len(word) + 1 > self.width and current.strip():
+                self.line(current)
+                current = indent
+            current += (' ' if current.strip() else '') + word
+        if current.strip():
+            self.line(current)
+        return self
+
+    def qr(self, data, module_size=6, error_level='M'):
+        """Native QR code (GS ( k, model 2) so the printer rasterises it"""
+        payload = str(data).encode('ascii', errors='replace')
+        store_len = len(payload) + 3
+        level = {'L': 48, 'M': 49, 'Q': 50, 'H': 51}[error_level]
+        self.raw(GS + b'(k\x04\x001A2\x00')
+        self.raw(GS + b'(k\x03\x001C' + bytes([module_size]))
+        self.raw(GS + b'(k\x03\x001E' + bytes([level]))
+        self.raw(GS + b'(k' + bytes([store_len % 256, store_len // 256]) + b'1P0' + payload)
+        return self.raw(GS + b'(k\x03\x001Q0')
+
+    def cut(self, feed=4):
+        return self.raw(ESC + b'd' + bytes([feed]) + GS + b'V\x01')
+
+
+def _money(amount):
+    return f"{amount:,.2f}"
+
+
+class PosOrder(models.Model):
+    _inherit = 'pos.order'
+
+    def _render_escpos(self, receipt=None):
+        """Append the thermal receipt of each order to ``receipt``.
+
+        Mirrors report_thermal_receipt without going through QWeb and the
+        PDF pipeline. Returns the EscPosReceipt builder.
+        """
+        receipt = receipt or EscPosReceipt()
+        for order in self:
+            company = order.company_id
+            receipt.align('center').bold().size(2, 2).line(company.name).size().bold(False)
+            for value in (company.street, company.street2):
+                if value:
+                    receipt.line(value)
+            if company.city:
+                receipt.line(f"{company.city}, Kenya")
+            if company.phone:
+                receipt.line(f"Tel: {company.phone}")
+            if company.vat:
+                receipt.bold().line(f"PIN: {company.vat}").bold(False)
+            receipt.align('left').separator()
+
+            # Receipt info
+            date_order = fields.Datetime.context_timestamp(order, order.date_order)
+            receipt.columns('Receipt No:', order.receipt_number or order.name)
+            receipt.columns('Date:', date_order.strftime('%d/%m/%Y %H:%M'))
+            receipt.columns('Cashier:', order.cashier_name or '')
+            if order.patient_id:
+                receipt.columns('Patient:', order.patient_id.full_name)
+            if order.prescription_id:
+                receipt.columns('Prescription:', order.prescription_id.name)
+            receipt.separator()
+
+            # Items
+            for line in order.lines:
+                receipt.bold().wrap(line.full_product_name or line.product_id.name).bold(False)
+                if line.lot_id:
+                    batch = f"  Batch: {line.lot_id.name}"
+                    if line.expiry_date:
+                        batch += f" | Exp: {line.expiry_date.strftime('%m/%Y')}"
+                    receipt.line(batch)
+                receipt.columns(f"  {line.qty:g} x {_money(line.price_unit)}", _money(line.price_subtotal_incl))
+            receipt.separator()
+
+            # Totals
+            receipt.columns('Subtotal:', f"KES {_money(order.amount_total - order.amount_tax)}")
+            receipt.columns('VAT:', f"KES {_money(order.amount_tax)}")
+            receipt.bold().size(1, 2).columns('TOTAL:', f"KES {_money(order.amount_total)}").size().bold(False)
+            receipt.separator()
+
+            # Payments
+            receipt.bold().line('Payment Details:').bold(False)
+            for payment in order.payment_ids:
+                label = payment.payment_method_id.name
+                if payment.mpesa_receipt_number:
+                    label += f" ({payment.mpesa_receipt_number})"
+                receipt.columns(label, f"KES {_money(payment.amount)}")
+                if payment.payment_type == 'cash' and payment.change_amount > 0:
+                    receipt.columns('    Tendered:', f"KES {_money(payment.amount_tendered)}")
+                    receipt.columns('    Change:', f"KES {_money(payment.change_amount)}")
+
+            # Insurance split
+            if order.insurance_claim:
+                receipt.separator().bold().line('Insurance Claim:').bold(False)
+                receipt.columns('Company:', order.insurance_company or '')
+                receipt.columns('Member No:', order.insurance_number or '')
+                receipt.columns('Insurance Pays:', f"KES {_money(order.insurance_amount)}")
+                receipt.columns('Patient Copay:', f"KES {_money(order.patient_copay)}")
+
+            # KRA eTIMS
+            if order.kra_invoice_number:
+                receipt.separator().align('center').bold().line('TAX INVOICE').bold(False).align('left')
+                receipt.columns('Invoice No:', order.kra_invoice_number)
+                receipt.columns('CU Serial:', order.kra_cu_serial or '')
+                receipt.columns('Signature:', order.kra_signature or '')
+                if order.kra_qr_data:
+                    receipt.align('center').qr(order.kra_qr_data).line()
+                    receipt.line('Scan for KRA verification').align('left')
+
+            # Footer
+            receipt.separator().align('center').bold().line('THANK YOU!').bold(False)
+            receipt.line(f"You were served by {order.cashier_name or ''}")
+            if order.approved_by_pharmacist and order.pharmacist_id:
+                receipt.line(f"Pharmacist: {order.pharmacist_id.name}")
+            receipt.line('Please keep this receipt for your records')
+            receipt.line('Powered by Options Pharmacy POS').align('left').cut()
+        return receipt
+
+    def get_escpos_receipt(self):
+        """ESC/POS byte stream of the orders, base64 encoded for the client"""
+        start = time.perf_counter()
+        data = self._render_escpos().getvalue()
+        _logger.debug('Rendered %s ESC/POS receipts in %.1f ms', len(self), (time.perf_counter() - start) * 1000)
+        return base64.b64encode(data).decode()
+
+    def _escpos_attachment_action(self, name, record):
+        """Store the receipts of ``self`` on ``record`` and download them"""
+        if not self:
+            raise UserError('There are no receipts to print.')
+        attachment = self.env['ir.attachment'].create({
+            'name': name,
+            'datas': self.get_escpos_receipt(),
+            'mimetype': 'application/octet-stream',
+            'res_model': record._name,
+            'res_id': record.id,
+        })
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?download=true',
+            'target': 'self',
+        }
+
+    def action_print_escpos(self):
+        """Download the thermal receipt as a raw ESC/POS file"""
+        self.ensure_one()
+        return self._escpos_attachment_action(f"{self.name}.bin", self)
+
+
+class PosSession(models.Model):
+    _inherit = 'pos.session'
+
+    def action_reprint_escpos(self):
+        """Reprint every paid receipt of the session as one ESC/POS stream"""
+        self.ensure_one()
+        orders = self.env['pos.order'].search([
+            ('session_id', '=', self.id),
+            ('state', 'in', ['paid', 'done', 'invoiced']),
+        ], order='date_order, id')
+        return orders._escpos_attachment_action(f"{self.name} receipts.bin", self)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import zlib
+from datetime import timedelta
+
+from psycopg2.extras import execute_values
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+ARCHIVE_DAYS_PARAM = 'softlink_pos.etims_archive_days'
+ARCHIVE_DAYS_DEFAULT = 90
+ARCHIVE_BATCH_SIZE = 1000
+# Batches per cron run; the cron re-triggers itself while work is left
+ARCHIVE_MAX_BATCHES = 50
+# Document columns folded into the compressed archive
+ARCHIVED_FIELDS = ['signature', 'qr_data', 'response', 'payload']
+
+
+class KraEtimsDocument(models.Model):
+    _name = 'kra.etims.document'
+    _description = 'KRA eTIMS Invoice Document'
+    _rec_name = 'order_id'
+
+    order_id = fields.Many2one('pos.order', string='Order', required=True, ondelete='cascade', readonly=True)
+    signature = fields.Char(string='Signature')
+    qr_data = fields.Char(string='QR Data')
+    response = fields.Text(string='KRA Response')
+    payload = fields.Text(string='Submitted Payload')
+    archived = fields.Boolean(string='Archived', readonly=True,
+                              help='The data is compressed in the archive column and read back on demand')
+    archive_date = fields.Datetime(string='Archived On', readonly=True)
+
+    _sql_constraints = [
+        ('order_uniq', 'unique(order_id)', 'An order has a single eTIMS document.'),
+    ]
+
+    def init(self):
+        # Compressed payloads are raw bytes, not a base64 Binary field
+        self.env.cr.execute("ALTER TABLE kra_etims_document ADD COLUMN IF NOT EXISTS archive_blob bytea")
+
+    # Read path
+
+    def _get_values(self):
+        """{order_id: {field: value}} for these documents, decompressing archived ones"""
+        archived = self.filtered('archived')
+        blobs = {}
+        if archived:
+            self.env.cr.execute("SELECT id, archive_blob FROM kra_etims_document WHERE id IN %s",
+                                (tuple(archived.ids),))
+            blobs = {document_id: blob for document_id, blob in self.env.cr.fetchall()}
+        result = {}
+        for document in self:
+            if document.archived:
+                blob = blobs.get(document.id)
+                result[document.order_id.id] = json.loads(zlib.decompress(blob)) if blob else {}
+            else:
+                result[document.order_id.id] = {fname: document[fname] for fname in ARCHIVED_FIELDS}
+        return result
+
+    def _set_values(self, values):
+        """Write document data, restoring archived documents to plain columns first"""
+        for document in self:
+            if document.archived:
+                restored = document._get_values()[document.order_id.id]
+                restored.update(values)
+                self.env.cr.execute("UPDATE kra_etims_document SET archive_blob = NULL WHERE id = %s", (document.id,))
+                document.write(dict(restored, archived=False, archive_date=False))
+            else:
+                document.write(values)
+
+    # Archival
+
+    @api.model
+    def _archive_cutoff(self):
+        days = self.env['ir.config_parameter'].sudo().get_param(ARCHIVE_DAYS_PARAM, ARCHIVE_DAYS_DEFAULT)
+        return fields.Datetime.now() - timedelta(days=int(days))
+
+    @api.model
+    def _cron_archive(self):
+        """Compress the eTIMS data of orders in closed sessions past the retention window"""
+        self.env.flush_all()
+        cutoff = self._archive_cutoff()
+        cr = self.env.cr
+        archived = 0
+        for dummy in range(ARCHIVE_MAX_BATCHES):
+            cr.execute(f"""
+                SELECT d.id, {', '.join(f'd.{fname}' for fname in ARCHIVED_FIELDS)}
+                FROM kra_etims_document d
+                JOIN pos_order o ON o.id = d.order_id
+                JOIN pos_session s ON s.id = o.session_id
+                WHERE d.archived IS NOT TRUE
+                  AND s.state = 'closed'
+                  AND o.date_order < %s
+                ORDER BY d.id
+                LIMIT %s
+            """, (cutoff, ARCHIVE_BATCH_SIZE))
+            rows = cr.fetchall()
+            if not rows:
+                break
+            now = fields.Datetime.now()
+            execute_values(cr._obj, f"""
+                UPDATE kra_etims_document d
+                SET archive_blob = v.blob, archived = TRUE, archive_date = v.archive_date,
+                    {', '.join(f'{fname} = NULL' for fname in ARCHIVED_FIELDS)}
+                FROM (VALUES %s) AS v (id, blob, archive_date)
+                WHERE d.id = v.id
+            """, [
+                (row[0], zlib.compress(json.dumps(dict(zip(ARCHIVED_FIELDS, row[1:]))).encode(), 9), now)
+                for row in rows
+            ], template='(%s, %s::bytea, %s::timestamp)')
+            archived += len(rows)
+        else:
+            self.env.ref('softlink_pos.ir_cron_etims_archive')._trigger()
+        self.invalidate_model()
+        _logger.info('Archived eTIMS data of %s orders', archived)
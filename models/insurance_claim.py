@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+import logging
+import tempfile
+from xml.sax.saxutils import escape, quoteattr
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+
+from .report_batch import attach_stream
+
+_logger = logging.getLogger(__name__)
+
+# Claims read per query when streaming a claim file
+EXPORT_CHUNK_SIZE = 500
+
+CLAIM_EXPORT_COLUMNS = [
+    'claim_reference', 'order_reference', 'date', 'member_number', 'patient_name', 'patient_id_number',
+    'authorization_code', 'claim_number', 'prescription', 'item_code', 'item_name', 'batch', 'quantity',
+    'unit_price', 'line_total', 'claim_total', 'insurance_amount', 'patient_copay',
+]
+
+
+class InsuranceClaimBatch(models.Model):
+    _name = 'pharmacy.insurance.claim.batch'
+    _description = 'Insurance Claim Batch'
+    _inherit = ['mail.thread']
+    _order = 'date_to desc, id desc'
+
+    name = fields.Char(string='Batch Reference', required=True, copy=False, readonly=True, default='New')
+    insurance_company = fields.Char(string='Insurance Company', required=True, tracking=True)
+    date_from = fields.Date(string='From', required=True)
+    date_to = fields.Date(string='To', required=True)
+    company_id = fields.Many2one('res.company', string='Company', required=True, default=lambda self: self.env.company)
+    currency_id = fields.Many2one(related='company_id.currency_id')
+    export_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('xml', 'XML'),
+    ], string='File Format', default='csv', required=True,
+       help='Claim file layout expected by the insurer; defaults to the last batch for the same insurer')
+
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('exported', 'Exported'),
+        ('submitted', 'Submitted'),
+        ('paid', 'Paid'),
+        ('cancelled', 'Cancelled'),
+    ], string='Status', default='draft', required=True, tracking=True)
+
+    line_ids = fields.One2many('pharmacy.insurance.claim.line', 'batch_id', string='Claims')
+    claim_count = fields.Integer(string='Claims', readonly=True)
+    amount_total = fields.Monetary(string='Total Billed', readonly=True)
+    insurance_total = fields.Monetary(string='Insurance Amount', readonly=True)
+    copay_total = fields.Monetary(string='Patient Co-pay', readonly=True)
+    amount_paid = fields.Monetary(string='Amount Paid', tracking=True)
+
+    attachment_id = fields.Many2one('ir.attachment', string='Claim File', readonly=True, copy=False)
+    submission_date = fields.Date(string='Submitted On', readonly=True)
+    payment_date = fields.Date(string='Paid On', readonly=True)
+    notes = fields.Text(string='Notes')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('name', 'New') == 'New':
+                vals['name'] = self.env['ir.sequence'].next_by_code('pharmacy.insurance.claim.batch') or 'New'
+            if 'export_format' not in vals and vals.get('insurance_company'):
+                previous = self.search([('insurance_company', '=ilike', vals['insurance_company'])], order='id desc', limit=1)
+                if previous:
+                    vals['export_format'] = previous.export_format
+        return super(InsuranceClaimBatch, self).create(vals_list)
+
+    def unlink(self):
+        if any(batch.state not in ('draft', 'cancelled') for batch in self):
+            raise UserError('Only draft or cancelled claim batches can be deleted.')
+        self._release_orders()
+        return super(InsuranceClaimBatch, self).unlink()
+
+    @api.model
+    def create_batches(self, date_from, date_to):
+        """One draft batch per insurer with unbatched claims in the period"""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (lower(TRIM(insurance_company))) TRIM(insurance_company)
+            FROM pos_order
+            WHERE insurance_claim AND claim_batch_id IS NULL
+              AND company_id = %s AND state IN ('paid', 'done', 'invoiced')
+              AND date_order >= %s AND date_order < %s::date + 1
+              AND COALESCE(TRIM(insurance_company), '') != ''
+            ORDER BY lower(TRIM(insurance_company)), TRIM(insurance_company)
+        """, (self.env.company.id, date_from, date_to))
+        insurers = [row[0] for row in self.env.cr.fetchall()]
+        batches = self.create([{
+            'insurance_company': insurer,
+            'date_from': date_from,
+            'date_to': date_to,
+        } for insurer in insurers])
+        batches.action_generate()
+        return batches
+
+    def action_generate(self):
+        """Collect the insurer's unbatched claims for the period in one statement"""
+        for batch in self:
+            if batch.state != 'draft':
+                raise UserError('Claims can only be regenerated on draft batches.')
+        self._release_orders()
+        self.env.flush_all()
+        for batch in self:
+            self.env.cr.execute("""
+                WITH claimed AS (
+                    UPDATE pos_order
+                    SET claim_batch_id = %(batch_id)s
+                    WHERE insurance_claim AND claim_batch_id IS NULL
+                      AND company_id = %(company_id)s AND state IN ('paid', 'done', 'invoiced')
+                      AND date_order >= %(date_from)s AND date_order < %(date_to)s::date + 1
+                      AND lower(TRIM(insurance_company)) = lower(%(insurer)s)
+                    RETURNING id, date_order, patient_id, insurance_number, amount_total, insurance_amount, patient_copay
+                )
+                INSERT INTO pharmacy_insurance_claim_line (
+                    batch_id, order_id, date_order, patient_id, member_number, authorization_code,
+                    claim_number, amount_total, insurance_amount, patient_copay, state,
+                    create_uid, create_date, write_uid, write_date)
+                SELECT %(batch_id)s, c.id, c.date_order, c.patient_id, c.insurance_number,
+                       pay.insurance_authorization_code, pay.insurance_claim_number,
+                       c.amount_total, c.insurance_amount, c.patient_copay, 'pending',
+                       %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+                FROM claimed c
+                LEFT JOIN LATERAL (
+                    SELECT p.insurance_authorization_code, p.insurance_claim_number
+                    FROM pos_payment p
+                    WHERE p.pos_order_id = c.id AND p.payment_type = 'insurance'
+                    ORDER BY p.amount DESC, p.id
+                    LIMIT 1
+                ) pay ON TRUE
+            """, {
+                'batch_id': batch.id,
+                'company_id': batch.company_id.id,
+                'date_from': batch.date_from,
+                'date_to': batch.date_to,
+                'insurer': batch.insurance_company.strip(),
+                'uid': self.env.uid,
+            })
+        self.env['pos.order'].invalidate_model(['claim_batch_id'])
+        self.env['pharmacy.insurance.claim.line'].invalidate_model()
+        self.invalidate_recordset(['line_ids'])
+        self._update_totals()
+
+    def _update_totals(self):
+        """Store batch totals from one aggregate over the claim lines"""
+        self.env['pharmacy.insurance.claim.line'].flush_model()
+        self.env.cr.execute("""
+            SELECT batch_id, COUNT(*), SUM(amount_total), SUM(insurance_amount), SUM(patient_copay)
+            FROM pharmacy_insurance_claim_line
+            WHERE batch_id = ANY(%s) AND state != 'rejected'
+            GROUP BY batch_id
+        """, (self.ids,))
+        totals = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+        for batch in self:
+            count, amount, insurance, copay = totals.get(batch.id, (0, 0.0, 0.0, 0.0))
+            batch.write({
+                'claim_count': count,
+                'amount_total': amount,
+                'insurance_total': insurance,
+                'copay_total': copay,
+            })
+
+    def _release_orders(self):
+        """Detach the batches' orders and drop their claim lines"""
+        if not self.ids:
+            return
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE pos_order SET claim_batch_id = NULL WHERE claim_batch_id = ANY(%s)", (self.ids,))
+        self.env.cr.execute("DELETE FROM pharmacy_insurance_claim_line WHERE batch_id = ANY(%s)", (self.ids,))
+        self.env['pos.order'].invalidate_model(['claim_batch_id'])
+        self.env['pharmacy.insurance.claim.line'].invalidate_model()
+        self.invalidate_recordset(['line_ids'])
+
+    # Export
+
+    def _iter_export_rows(self):
+        """Claim item rows of the batch, read EXPORT_CHUNK_SIZE claims at a time"""
+        self.ensure_one()
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT id
+            FROM pharmacy_insurance_claim_line
+            WHERE batch_id = %s AND state != 'rejected'
+            ORDER BY date_order, id
+        """, (self.id,))
+        claim_ids = [row[0] for row in self.env.cr.fetchall()]
+        for chunk in split_every(EXPORT_CHUNK_SIZE, claim_ids, list):
+            self.env.cr.execute("""
+                SELECT cl.id, o.name, o.pos_reference, cl.date_order, cl.member_number,
+                       COALESCE(pat.full_name, o.patient_name), pat.id_number,
+                       cl.authorization_code, cl.claim_number, rx.name,
+                       prod.default_code, l.full_product_name, lot.name, l.qty, l.price_unit,
+                       l.price_subtotal_incl, cl.amount_total, cl.insurance_amount, cl.patient_copay
+                FROM pharmacy_insurance_claim_line cl
+                JOIN pos_order o ON o.id = cl.order_id
+                JOIN pos_order_line l ON l.order_id = o.id
+                JOIN product_product prod ON prod.id = l.product_id
+                LEFT JOIN pharmacy_patient pat ON pat.id = cl.patient_id
+                LEFT JOIN pharmacy_prescription rx ON rx.id = o.prescription_id
+                LEFT JOIN stock_lot lot ON lot.id = l.lot_id
+                WHERE cl.id = ANY(%s)
+                ORDER BY cl.date_order, cl.id, l.id
+            """, (chunk,))
+            yield from self.env.cr.fetchall()
+
+    def _export_csv(self, stream):
+        text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(CLAIM_EXPORT_COLUMNS)
+        for row in self._iter_export_rows():
+            claim_id, name, reference, date_order = row[:4]
+            writer.writerow([f"{self.name}/{claim_id}", reference or name, fields.Datetime.to_string(date_order)]
+                            + ['' if value is None else value for value in row[4:]])
+        writer.writerow(['TOTAL', self.claim_count, '', '', '', '', '', '', '', '', '', '', '', '', '',
+                         self.amount_total, self.insurance_total, self.copay_total])
+        text.flush()
+        text.detach()
+
+    def _export_xml(self, stream):
+        def write(value):
+            stream.write(value.encode('utf-8'))
+
+        def element(tag, value):
+            return f"<{tag}>{escape('' if value is None else str(value))}</{tag}>"
+
+        write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        write(f"<ClaimBatch reference={quoteattr(self.name)} insurer={quoteattr(self.insurance_company)} "
+              f"from={quoteattr(str(self.date_from))} to={quoteattr(str(self.date_to))}>\n")
+        current = None
+        for row in self._iter_export_rows():
+            claim_id = row[0]
+            if claim_id != current:
+                if current is not None:
+                    write('</Items></Claim>\n')
+                current = claim_id
+                write('<Claim>' + ''.join([
+                    element('Reference', f"{self.name}/{claim_id}"),
+                    element('Order', row[2] or row[1]),
+                    element('Date', fields.Datetime.to_string(row[3])),
+                    element('MemberNumber', row[4]),
+                    element('PatientName', row[5]),
+                    element('PatientIdNumber', row[6]),
+                    element('AuthorizationCode', row[7]),
+                    element('ClaimNumber', row[8]),
+                    element('Prescription', row[9]),
+                    element('ClaimTotal', row[16]),
+                    element('InsuranceAmount', row[17]),
+                    element('PatientCopay', row[18]),
+                ]) + '<Items>')
+            write('<Item>' + ''.join([
+                element('Code', row[10]),
+                element('Name', row[11]),
+                element('Batch', row[12]),
+                element('Quantity', row[13]),
+                element('UnitPrice', row[14]),
+                element('Total', row[15]),
+            ]) + '</Item>')
+        if current is not None:
+            write('</Items></Claim>\n')
+        write('<Totals>' + ''.join([
+            element('Claims', self.claim_count),
+            element('AmountTotal', self.amount_total),
+            element('InsuranceAmount', self.insurance_total),
+            element('PatientCopay', self.copay_total),
+        ]) + '</Totals>\n</ClaimBatch>\n')
+
+    def action_export(self):
+        """Write the claim file to a temporary file and attach it to the batch"""
+        self.ensure_one()
+        if self.state not in ('draft', 'exported'):
+            raise UserError('Only draft or exported batches can be exported.')
+        if not self.claim_count:
+            raise UserError('This batch has no claims to export.')
+        with tempfile.TemporaryFile() as stream:
+            getattr(self, f'_export_{self.export_format}')(stream)
+            if self.attachment_id:
+                self.attachment_id.unlink()
+            self.attachment_id = attach_stream(self.env, {
+                'name': f"{self.name.replace('/', '-')}.{self.export_format}",
+                'mimetype': 'text/csv' if self.export_format == 'csv' else 'application/xml',
+                'res_model': self._name,
+                'res_id': self.id,
+            }, stream)
+        self.state = 'exported'
+        _logger.info('Exported %s claims for %s', self.claim_count, self.name)
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.attachment_id.id}?download=true',
+            'target': 'self',
+        }
+
+    def action_submit(self):
+        for batch in self:
+            if batch.state != 'exported':
+                raise UserError('Export the claim file before marking the batch as submitted.')
+        self.write({'state': 'submitted', 'submission_date': fields.Date.today()})
+
+    def action_mark_paid(self):
+        for batch in self:
+            if batch.state != 'submitted':
+                raise UserError('Only submitted batches can be marked as paid.')
+            batch.line_ids.filtered(lambda line: line.state == 'pending').write({'state': 'accepted'})
+        self.write({'state': 'paid', 'payment_date': fields.Date.today()})
+
+    def action_cancel(self):
+        if any(batch.state == 'paid' for batch in self):
+            raise UserError('Paid claim batches cannot be cancelled.')
+        self._release_orders()
+        self.write({'state': 'cancelled', 'claim_count': 0, 'amount_total': 0.0,
+                    'insurance_total': 0.0, 'copay_total': 0.0})
+
+    def action_draft(self):
+        self.filtered(lambda batch: batch.state == 'cancelled').write({'state': 'draft'})
+
+
+class InsuranceClaimLine(models.Model):
+    _name = 'pharmacy.insurance.claim.line'
+    _description = 'Insurance Claim'
+    _order = 'date_order, id'
+
+    batch_id = fields.Many2one('pharmacy.insurance.claim.batch', string='Batch', required=True, ondelete='cascade', index=True)
+    order_id = fields.Many2one('pos.order', string='Order', required=True, ondelete='restrict', index=True)
+    date_order = fields.Datetime(string='Date')
+    patient_id = fields.Many2one('pharmacy.patient', string='Patient')
+    member_number = fields.Char(string='Member Number')
+    authorization_code = fields.Char(string='Authorization Code')
+    claim_number = fields.Char(string='Claim Number')
+    currency_id = fields.Many2one(related='batch_id.currency_id')
+    amount_total = fields.Monetary(string='Total Billed')
+    insurance_amount = fields.Monetary(string='Insurance Amount')
+    patient_copay = fields.Monetary(string='Patient Co-pay')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('accepted', 'Accepted'),
+        ('rejected', 'Rejected'),
+    ], string='Status', default='pending', required=True)
+    rejection_reason = fields.Char(string='Rejection Reason')
+
+    def action_reject(self):
+        self.write({'state': 'rejected'})
+        self.batch_id._update_totals()
+
+
+class PosOrder(models.Model):
+    _inherit = 'pos.order'
+
+    claim_batch_id = fields.Many2one('pharmacy.insurance.claim.batch', string='Claim Batch',
+                                     readonly=True, copy=False, index='btree_not_null')
+
+    def init(self):
+        super(PosOrder, self).init()
+        # Claims still waiting to be batched, per insurer and period
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS pos_order_unbatched_claim_idx
+            ON pos_order (company_id, date_order)
+            WHERE insurance_claim AND claim_batch_id IS NULL
+        """)
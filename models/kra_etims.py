@@ -7,6 +7,13 @@ import io
 import base64
 from datetime import datetime
 import hashlib
+import json
+
+from .pipeline_stat import pipeline_span
+from .worker_cache import WorkerCache
+
+# Active configuration id per company
+ACTIVE_CONFIG_CACHE = WorkerCache('etims_active_config')
 
 
 class KraEtimsConfig(models.Model):
@@ -42,6 +49,39 @@ class KraEtimsConfig(models.Model):
     
     active = fields.Boolean(string='Active', default=True)
     
+    def init(self):
+        ACTIVE_CONFIG_CACHE.init(self.env.cr)
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        configs = super(KraEtimsConfig, self).create(vals_list)
+        ACTIVE_CONFIG_CACHE.invalidate(self.env, set(configs.company_id.ids))
+        return configs
+    
+    def write(self, vals):
+        # Counters are written on every order; only the lookup keys matter here
+        company_ids = set(self.company_id.ids) if {'active', 'company_id'} & set(vals) else None
+        res = super(KraEtimsConfig, self).write(vals)
+        if company_ids is not None:
+            ACTIVE_CONFIG_CACHE.invalidate(self.env, company_ids | set(self.company_id.ids))
+        return res
+    
+    def unlink(self):
+        company_ids = set(self.company_id.ids)
+        res = super(KraEtimsConfig, self).unlink()
+        ACTIVE_CONFIG_CACHE.invalidate(self.env, company_ids)
+        return res
+    
+    @api.model
+    def _get_active_config_id(self, company_id):
+        """Id of the company's active eTIMS configuration, cached per worker"""
+        return ACTIVE_CONFIG_CACHE.get(self.env, company_id, lambda: self.sudo().search(
+            [('company_id', '=', company_id), ('active', '=', True)], limit=1).id)
+    
+    @api.model
+    def _get_active_config(self, company):
+        return self.browse(self._get_active_config_id(company.id))
+    
     def reset_daily_counter(self):
         """Reset daily counter at midnight"""
         today = fields.Date.today()
@@ -75,32 +115,82 @@ class PosOrder(models.Model):
     kra_invoice_number = fields.Char(string='KRA Invoice Number', readonly=True, copy=False)
     kra_cu_serial = fields.Char(string='Control Unit Serial', readonly=True)
     kra_invoice_counter = fields.Integer(string='Invoice Counter', readonly=True)
-    kra_qr_code = fields.Binary(string='KRA QR Code', readonly=True)
-    kra_signature = fields.Char(string='KRA Signature', readonly=True)
     kra_submitted = fields.Boolean(string='Submitted to KRA', default=False, readonly=True)
     kra_submission_date = fields.Datetime(string='KRA Submission Date', readonly=True)
-    kra_response = fields.Text(string='KRA Response', readonly=True)
+    
+    # Kept in kra.etims.document so pos_order stays narrow; compressed once archived
+    kra_qr_data = fields.Char(string='KRA QR Data', readonly=True,
+                              compute='_compute_kra_document', inverse='_inverse_kra_document')
+    kra_signature = fields.Char(string='KRA Signature', readonly=True,
+                                compute='_compute_kra_document', inverse='_inverse_kra_document')
+    kra_response = fields.Text(string='KRA Response', readonly=True,
+                               compute='_compute_kra_document', inverse='_inverse_kra_document')
+    kra_payload = fields.Text(string='KRA Payload', readonly=True,
+                              compute='_compute_kra_document', inverse='_inverse_kra_document')
+    # Rendered from the QR data on demand rather than stored as an attachment per order
+    kra_qr_code = fields.Binary(string='KRA QR Code', compute='_compute_kra_qr_code')
     
     # Receipt fields
     receipt_number = fields.Char(string='Receipt Number', readonly=True, copy=False)
     cashier_name = fields.Char(string='Cashier Name', compute='_compute_cashier_name', store=True)
     
+    def init(self):
+        super(PosOrder, self).init()
+        # Invoices still waiting for KRA, counted per company by the dashboard
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS pos_order_etims_pending_idx
+            ON pos_order (company_id)
+            WHERE kra_invoice_number IS NOT NULL AND kra_submitted IS NOT TRUE
+        """)
+    
     @api.depends('user_id')
     def _compute_cashier_name(self):
         for order in self:
             order.cashier_name = order.user_id.name if order.user_id else ''
     
+    def _compute_kra_document(self):
+        documents = self.env['kra.etims.document'].sudo().search([('order_id', 'in', self.ids)])
+        values_by_order = documents._get_values()
+        for order in self:
+            values = values_by_order.get(order.id, {})
+            order.kra_signature = values.get('signature') or False
+            order.kra_qr_data = values.get('qr_data') or False
+            order.kra_response = values.get('response') or False
+            order.kra_payload = values.get('payload') or False
+    
+    def _inverse_kra_document(self):
+        Document = self.env['kra.etims.document'].sudo()
+        documents = {document.order_id.id: document for document in Document.search([('order_id', 'in', self.ids)])}
+        for order in self:
+            values = {
+                'signature': order.kra_signature,
+                'qr_data': order.kra_qr_data,
+                'response': order.kra_response,
+                'payload': order.kra_payload,
+            }
+            if order.id in documents:
+                documents[order.id]._set_values(values)
+            elif any(values.values()):
+                Document.create(dict(values, order_id=order.id))
+    
+    @api.depends('kra_qr_data')
+    def _compute_kra_qr_code(self):
+        for order in self:
+            order.kra_qr_code = order._generate_qr_code(order.kra_qr_data) if order.kra_qr_data else False
+    
     def action_pos_order_paid(self):
         """Override to generate KRA invoice and receipt"""
-        res = super(PosOrder, self).action_pos_order_paid()
-        
-        for order in self:
-            # Generate receipt number
-            if not order.receipt_number:
-                order.receipt_number = self.env['ir.sequence'].next_by_code('pos.receipt.number') or '/'
+        with pipeline_span(self.env, 'order_paid_total'):
+            res = super(PosOrder, self).action_pos_order_paid()
             
-            # Generate KRA invoice
-            order._generate_kra_invoice()
+            for order in self:
+                # Generate receipt number
+                with pipeline_span(self.env, 'receipt_number'):
+                    order._assign_receipt_number()
+                
+                # Generate KRA invoice
+                with pipeline_span(self.env, 'kra_invoice'):
+                    order._generate_kra_invoice()
         
         return res
     
@@ -109,10 +199,8 @@ class PosOrder(models.Model):
         self.ensure_one()
         
         # Get KRA configuration
-        kra_config = self.env['kra.etims.config'].search([
-            ('company_id', '=', self.company_id.id),
-            ('active', '=', True),
-        ], limit=1)
+        with pipeline_span(self.env, 'kra_config_lookup'):
+            kra_config = self.env['kra.etims.config']._get_active_config(self.company_id)
         
         if not kra_config:
             # If no KRA config, skip (for testing purposes)
@@ -120,19 +208,21 @@ class PosOrder(models.Model):
             return
         
         # Get next invoice number
-        invoice_num, daily_num = kra_config.get_next_invoice_number()
+        with pipeline_span(self.env, 'kra_counter'):
+            invoice_num, daily_num = kra_config.get_next_invoice_number()
         
         # Generate invoice number format: CU-SERIAL-YYYYMMDD-COUNTER
         today = fields.Date.today().strftime('%Y%m%d')
         kra_invoice_number = f"{kra_config.control_unit_serial}-{today}-{daily_num:05d}"
         
         # Generate signature (simplified - real implementation needs proper cryptographic signing)
-        signature_data = f"{kra_invoice_number}{self.amount_total}{self.date_order}"
-        signature = hashlib.sha256(signature_data.encode()).hexdigest()[:16]
+        with pipeline_span(self.env, 'kra_signature'):
+            signature_data = f"{kra_invoice_number}{self.amount_total}{self.date_order}"
+            signature = hashlib.sha256(signature_data.encode()).hexdigest()[:16]
         
-        # Generate QR Code
-        qr_data = self._prepare_kra_qr_data(kra_config, kra_invoice_number, signature)
-        qr_code_image = self._generate_qr_code(qr_data)
+        # QR data; the image is rendered when a receipt is printed
+        with pipeline_span(self.env, 'kra_qr'):
+            qr_data = self._prepare_kra_qr_data(kra_config, kra_invoice_number, signature)
         
         # Update order
         self.write({
@@ -140,7 +230,7 @@ class PosOrder(models.Model):
             'kra_cu_serial': kra_config.control_unit_serial,
             'kra_invoice_counter': invoice_num,
             'kra_signature': signature,
-            'kra_qr_code': qr_code_image,
+            'kra_qr_data': qr_data,
         })
         
         # Submit to KRA (in background)
@@ -209,6 +299,7 @@ class PosOrder(models.Model):
         self.write({
             'kra_submitted': True,
             'kra_submission_date': fields.Datetime.now(),
+            'kra_payload': json.dumps(invoice_data, default=str),
             'kra_response': 'Success (Simulated)',
         })
     
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+MARKDOWN_NOTIFICATION = 'softlink_pos.markdowns'
+
+
+class PharmacyMarkdownTier(models.Model):
+    _name = 'pharmacy.markdown.tier'
+    _description = 'Near-Expiry Markdown Tier'
+    _order = 'days_to_expiry'
+
+    name = fields.Char(string='Tier', required=True)
+    days_to_expiry = fields.Integer(string='Up to Days to Expiry', required=True,
+                                    help='Applies to lots expiring within this many days, unless a shorter tier matches')
+    discount = fields.Float(string='Markdown (%)', required=True)
+    active = fields.Boolean(string='Active', default=True)
+
+    _sql_constraints = [
+        ('days_uniq', 'unique(days_to_expiry)', 'Another tier already ends at this number of days.'),
+    ]
+
+    @api.constrains('days_to_expiry', 'discount')
+    def _check_values(self):
+        for tier in self:
+            if tier.days_to_expiry <= 0:
+                raise ValidationError('Tiers must end at least one day before expiry.')
+            if not 0 < tier.discount < 100:
+                raise ValidationError('Markdowns must be between 0 and 100 percent.')
+
+    @api.model
+    def _markdown_pricelist(self):
+        return self.env.ref('softlink_pos.pricelist_near_expiry_markdown')
+
+    @api.model
+    def _compute_lot_markdowns(self):
+        """Markdown per sellable lot in stock, in one query.
+
+        A lot is marked down once it is within its product's expiry alert
+        days; the shortest tier covering its remaining days sets the rate.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            WITH in_stock AS (
+                SELECT q.lot_id
+                FROM stock_quant q
+                JOIN stock_location loc ON loc.id = q.location_id
+                WHERE loc.usage = 'internal' AND q.lot_id IS NOT NULL
+                GROUP BY q.lot_id
+                HAVING SUM(q.quantity) > 0
+            )
+            SELECT lot.id, lot.product_id, lot.name, tier.discount
+            FROM in_stock s
+            JOIN stock_lot lot ON lot.id = s.lot_id
+            JOIN product_product pp ON pp.id = lot.product_id
+            JOIN product_template pt ON pt.id = pp.product_tmpl_id
+            LEFT JOIN pharmacy_product ph ON ph.id = pt.pharmacy_product_id
+            CROSS JOIN LATERAL (
+                SELECT t.discount
+                FROM pharmacy_markdown_tier t
+                WHERE t.active AND t.days_to_expiry >= lot.expiry_date - CURRENT_DATE
+                ORDER BY t.days_to_expiry
+                LIMIT 1
+            ) tier
+            WHERE lot.expiry_date > CURRENT_DATE
+              AND lot.expiry_date - CURRENT_DATE <= COALESCE(NULLIF(ph.expiry_alert_days, 0), 90)
+              AND lot.is_recalled IS NOT TRUE
+              AND lot.cold_chain_compromised IS NOT TRUE
+        """)
+        return {lot_id: (product_id, lot_name, discount) for lot_id, product_id, lot_name, discount in self.env.cr.fetchall()}
+
+    @api.model
+    def _cron_update_markdowns(self):
+        """Sync the markdown pricelist with the current tiers and push the changes to open tills"""
+        pricelist = self._markdown_pricelist()
+        Item = self.env['product.pricelist.item'].sudo()
+        wanted = self._compute_lot_markdowns()
+        existing = {item.lot_id.id: item for item in Item.search([
+            ('pricelist_id', '=', pricelist.id),
+            ('lot_id', '!=', False),
+        ])}
+
+        obsolete = Item.browse([item.id for lot_id, item in existing.items() if lot_id not in wanted])
+        removed = [{'product_id': item.product_id.id, 'lot_name': item.lot_id.name} for item in obsolete]
+        obsolete.unlink()
+
+        changed, to_create, by_discount = [], [], {}
+        for lot_id, (product_id, lot_name, discount) in wanted.items():
+            item = existing.get(lot_id)
+            if item and item.percent_price == discount:
+                continue
+            if item:
+                by_discount.setdefault(discount, []).append(item.id)
+            else:
+                to_create.append({
+                    'pricelist_id': pricelist.id,
+                    'applied_on': '0_product_variant',
+                    'product_id': product_id,
+                    'lot_id': lot_id,
+                    'compute_price': 'percentage',
+                    'percent_price': discount,
+                })
+            changed.append({'product_id': product_id, 'lot_name': lot_name, 'discount': discount})
+        for discount, item_ids in by_discount.items():
+            Item.browse(item_ids).write({'percent_price': discount})
+        Item.create(to_create)
+
+        _logger.info('Near-expiry markdowns: %s changed, %s removed', len(changed), len(removed))
+        if changed or removed:
+            self.env['pos.config'].sudo().search([])._pharmacy_notify(MARKDOWN_NOTIFICATION, {
+                'changed': changed,
+                'removed': removed,
+            })
+
+    def action_update_markdowns(self):
+        self._cron_update_markdowns()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Markdowns Updated',
+                'message': 'Near-expiry markdowns were recomputed and sent to open sessions.',
+                'type': 'success',
+                'sticky': False,
+            },
+        }
+
+
+class ProductPricelistItem(models.Model):
+    _inherit = 'product.pricelist.item'
+
+    lot_id = fields.Many2one('stock.lot', string='Lot', ondelete='cascade', index='btree_not_null',
+                             domain="[('product_id', '=', product_id)]",
+                             help='Only applies to this lot; applied by the point of sale when the lot is scanned')
+
+    def _is_applicable_for(self, product, qty_in_product_uom):
+        # Lot rules are not known to the pricelist engine, only to the till
+        if self.lot_id:
+            return False
+        return super(ProductPricelistItem, self)._is_applicable_for(product, qty_in_product_uom)
+
+
+class PosConfig(models.Model):
+    _inherit = 'pos.config'
+
+    def get_pharmacy_markdowns(self):
+        """Current lot markdowns and the bus channel their changes are pushed on"""
+        self.ensure_one()
+        items = self.env['product.pricelist.item'].sudo().search([
+            ('pricelist_id', '=', self.env['pharmacy.markdown.tier']._markdown_pricelist().id),
+            ('lot_id', '!=', False),
+        ])
+        return {
+            'channel': self._pharmacy_bus_channel(),
+            'markdowns': [{
+                'product_id': item.product_id.id,
+                'lot_name': item.lot_id.name,
+                'discount': item.percent_price,
+            } for item in items],
+        }
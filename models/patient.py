@@ -1,8 +1,57 @@
 # -*- coding: utf-8 -*-
 
+import logging
+
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+from .pharmacy_product import create_unique_index
+
+_logger = logging.getLogger(__name__)
+
+
+def clean_phone(phone):
+    """Strip the separators people type into phone numbers"""
+    return (phone or '').replace('+', '').replace(' ', '').replace('-', '')
+
+
+def is_valid_phone(phone):
+    # Basic validation for Kenyan phone numbers
+    phone = clean_phone(phone)
+    return phone.isdigit() and len(phone) >= 10
+
+
+def normalize_phone(phone):
+    """Kenyan phone number in 254XXXXXXXXX form, or False"""
+    phone = ''.join(c for c in (phone or '') if c.isdigit())
+    if phone.startswith('0') and len(phone) == 10:
+        phone = '254' + phone[1:]
+    elif len(phone) == 9 and phone[0] in '17':
+        phone = '254' + phone
+    return phone or False
+
+
+SOUNDEX_CODES = {
+    letter: digit
+    for digit, letters in (('1', 'BFPV'), ('2', 'CGJKQSXZ'), ('3', 'DT'), ('4', 'L'), ('5', 'MN'), ('6', 'R'))
+    for letter in letters
+}
+
+
+def soundex(name):
+    """American Soundex code of a name, e.g. 'Otieno' -> 'O350'"""
+    name = ''.join(c for c in (name or '').upper() if 'A' <= c <= 'Z')
+    if not name:
+        return ''
+    code, last = name[0], SOUNDEX_CODES.get(name[0], '')
+    for letter in name[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != last:
+            code += digit
+        if letter not in 'HW':
+            last = digit
+    return (code + '000')[:4]
+
 
 class Patient(models.Model):
     _name = 'pharmacy.patient'
@@ -29,6 +78,12 @@ class Patient(models.Model):
     email = fields.Char(string='Email')
     id_number = fields.Char(string='ID/Passport Number', tracking=True)
     
+    # Duplicate detection blocking keys
+    phone_normalized = fields.Char(string='Normalized Phone', compute='_compute_phone_normalized',
+                                   store=True, index='btree_not_null')
+    name_phonetic = fields.Char(string='Phonetic Name', compute='_compute_name_phonetic',
+                                store=True, index='btree_not_null')
+    
     # Address
     street = fields.Char(string='Street')
     street2 = fields.Char(string='Street 2')
@@ -81,6 +136,18 @@ class Patient(models.Model):
             names = [record.first_name or '', record.middle_name or '', record.last_name or '']
             record.full_name = ' '.join(filter(None, names))
     
+    @api.depends('phone')
+    def _compute_phone_normalized(self):
+        for record in self:
+            record.phone_normalized = normalize_phone(record.phone)
+    
+    @api.depends('first_name', 'last_name')
+    def _compute_name_phonetic(self):
+        for record in self:
+            # Sorted so that swapped first/last names still share a key
+            codes = sorted(filter(None, [soundex(record.first_name), soundex(record.last_name)]))
+            record.name_phonetic = ''.join(codes) or False
+    
     @api.depends('date_of_birth')
     def _compute_age(self):
         today = fields.Date.today()
@@ -104,22 +171,69 @@ class Patient(models.Model):
     @api.constrains('phone')
     def _check_phone(self):
         for record in self:
-            if record.phone:
-                # Basic validation for Kenyan phone numbers
-                phone = record.phone.replace('+', '').replace(' ', '').replace('-', '')
-                if not phone.isdigit() or len(phone) < 10:
-                    raise ValidationError('Please enter a valid phone number')
-    
-    @api.constrains('id_number')
-    def _check_unique_id(self):
-        for record in self:
-            if record.id_number:
-                existing = self.search([
-                    ('id_number', '=', record.id_number),
-                    ('id', '!=', record.id)
-                ])
-                if existing:
-                    raise ValidationError(f'A patient with ID/Passport number {record.id_number} already exists')
+            if record.phone and not is_valid_phone(record.phone):
+                raise ValidationError('Please enter a valid phone number')
+    
+    def init(self):
+        # ID/Passport numbers are unique, enforced by the database so bulk
+        # imports do not pay a search per record.
+        create_unique_index(self.env.cr, 'pharmacy_patient_id_number_uniq', 'pharmacy_patient',
+                            'id_number', 'patient ID/Passport numbers')
+    
+    def _merge_into(self, master):
+        """Merge these duplicate patients into ``master`` and archive them.
+
+        Every stored many2one to pharmacy.patient (prescriptions, POS orders,
+        controlled drugs register, ...) is re-pointed with one UPDATE per
+        column. Medical history text is carried over so no allergy is lost.
+        """
+        duplicates = self - master
+        if not duplicates:
+            return
+        # Duplicate candidates name the patients they compare and are not
+        # re-pointed: pairs within the merge are resolved, pairs with other
+        # patients are dropped and found again by the next search.
+        Candidate = self.env['pharmacy.patient.duplicate']
+        candidates = Candidate.search([
+            '|', ('patient_a_id', 'in', duplicates.ids), ('patient_b_id', 'in', duplicates.ids),
+        ])
+        merged = candidates.filtered(lambda candidate: candidate.patient_a_id in self and candidate.patient_b_id in self)
+        merged.write({'state': 'merged'})
+        (candidates - merged).unlink()
+        self.env.flush_all()
+        relations = self.env['ir.model.fields'].sudo().search([
+            ('relation', '=', self._name),
+            ('ttype', '=', 'many2one'),
+            ('store', '=', True),
+        ])
+        for relation in relations:
+            model = self.env.get(relation.model)
+            if model is None or not model._auto or model._transient or relation.name not in model._fields:
+                continue
+            if model._name == Candidate._name:
+                continue
+            self.env.cr.execute(
+                f'UPDATE "{model._table}" SET "{relation.name}" = %s WHERE "{relation.name}" IN %s',
+                (master.id, tuple(duplicates.ids)))
+        self.env.invalidate_all()
+        
+        vals = {}
+        for field_name in ('allergies', 'chronic_conditions', 'current_medications', 'notes'):
+            texts = [text for text in [master[field_name]] + duplicates.mapped(field_name) if text]
+            merged = '\n'.join(dict.fromkeys(texts))
+            if merged != (master[field_name] or ''):
+                vals[field_name] = merged
+        for field_name in ('id_number', 'email', 'insurance_company', 'insurance_number', 'blood_group'):
+            if not master[field_name]:
+                value = next((value for value in duplicates.mapped(field_name) if value), False)
+                if value:
+                    vals[field_name] = value
+        # Free unique ID numbers before handing them to the master
+        duplicates.write({'active': False, 'id_number': False})
+        if vals:
+            master.write(vals)
+        master.message_post(body=f"Merged duplicate patients: {', '.join(duplicates.mapped('full_name'))} "
+                                 f"(IDs {', '.join(map(str, duplicates.ids))})")
     
     def action_view_prescriptions(self):
         return {
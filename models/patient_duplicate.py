@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from itertools import combinations
+
+from odoo import models, fields, api
+
+# Blocks larger than this (e.g. a clinic switchboard number shared by many
+# walk-ins) say nothing about identity and would make pairing quadratic.
+MAX_BLOCK_SIZE = 25
+
+# Blocking key -> (SQL grouping expression, score, reason)
+BLOCKING_KEYS = [
+    ('phone_normalized', 40, 'Same phone'),
+    ('date_of_birth, name_phonetic', 50, 'Same date of birth and similar name'),
+    ('name_phonetic, phone_normalized', 30, 'Similar name and same phone'),
+]
+
+
+class PatientDuplicate(models.Model):
+    _name = 'pharmacy.patient.duplicate'
+    _description = 'Patient Duplicate Candidate'
+    _order = 'score desc, id'
+
+    patient_a_id = fields.Many2one('pharmacy.patient', string='Patient', required=True, ondelete='cascade')
+    patient_b_id = fields.Many2one('pharmacy.patient', string='Possible Duplicate', required=True, ondelete='cascade')
+    
+    patient_a_phone = fields.Char(related='patient_a_id.phone', string='Phone')
+    patient_b_phone = fields.Char(related='patient_b_id.phone', string='Duplicate Phone')
+    patient_a_dob = fields.Date(related='patient_a_id.date_of_birth', string='Date of Birth')
+    patient_b_dob = fields.Date(related='patient_b_id.date_of_birth', string='Duplicate Date of Birth')
+    
+    score = fields.Integer(string='Score', help='Higher scores share more blocking keys')
+    reason = fields.Char(string='Reason')
+    state = fields.Selection([
+        ('new', 'To Review'),
+        ('merged', 'Merged'),
+        ('ignored', 'Not a Duplicate'),
+    ], string='Status', default='new', required=True)
+    
+    _sql_constraints = [
+        ('patient_pair_uniq', 'unique(patient_a_id, patient_b_id)', 'This patient pair is already listed.'),
+    ]
+    
+    @api.model
+    def _find_candidate_pairs(self):
+        """Candidate pairs from blocking keys, as {(id_a, id_b): (score, reasons)}.
+
+        Each blocking key is one GROUP BY over indexed columns; only patients
+        sharing a key are compared, so the cost grows with block sizes rather
+        than with the square of the number of patients.
+        """
+        self.env['pharmacy.patient'].flush_model(['phone_normalized', 'name_phonetic', 'date_of_birth', 'id_number'])
+        pairs = {}
+        for expression, score, reason in BLOCKING_KEYS:
+            columns = [column.strip() for column in expression.split(',')]
+            self.env.cr.execute(f"""
+                SELECT array_agg(id ORDER BY id), array_agg(COALESCE(id_number, '') ORDER BY id)
+                FROM pharmacy_patient
+                WHERE active AND {' AND '.join(f'{column} IS NOT NULL' for column in columns)}
+                GROUP BY {expression}
+                HAVING count(*) BETWEEN 2 AND %s
+            """, (MAX_BLOCK_SIZE,))
+            for ids, id_numbers in self.env.cr.fetchall():
+                for (id_a, number_a), (id_b, number_b) in combinations(zip(ids, id_numbers), 2):
+                    # Two different ID numbers are two different people
+                    if number_a and number_b and number_a != number_b:
+                        continue
+                    total, reasons = pairs.get((id_a, id_b), (0, []))
+                    pairs[(id_a, id_b)] = (total + score, reasons + [reason])
+        return pairs
+    
+    @api.model
+    def action_find_duplicates(self):
+        """Refresh the list of duplicate candidates to review"""
+        pairs = self._find_candidate_pairs()
+        existing = {
+            (candidate.patient_a_id.id, candidate.patient_b_id.id): candidate
+            for candidate in self.search([])
+        }
+        stale = self.browse()
+        for key, candidate in existing.items():
+            if candidate.state == 'new' and key not in pairs:
+                stale |= candidate
+        stale.unlink()
+        
+        self.create([
+            {'patient_a_id': id_a, 'patient_b_id': id_b, 'score': score, 'reason': ', '.join(reasons)}
+            for (id_a, id_b), (score, reasons) in pairs.items()
+            if (id_a, id_b) not in existing
+        ])
+        return {
+            'name': 'Duplicate Patients',
+            'type': 'ir.actions.act_window',
+            'res_model': 'pharmacy.patient.duplicate',
+            'view_mode': 'list',
+            'domain': [('state', '=', 'new')],
+        }
+    
+    def action_ignore(self):
+        self.write({'state': 'ignored'})
+    
+    def action_merge(self):
+        """Open the merge wizard with the older record as master"""
+        self.ensure_one()
+        return {
+            'name': 'Merge Patients',
+            'type': 'ir.actions.act_window',
+            'res_model': 'pharmacy.patient.merge.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {
+                'default_master_id': self.patient_a_id.id,
+                'default_patient_ids': [(6, 0, [self.patient_a_id.id, self.patient_b_id.id])],
+            },
+        }
@@ -1,7 +1,78 @@
 # -*- coding: utf-8 -*-
 
+import logging
+import re
+import time
+
 from odoo import models, fields, api
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools.sql import index_exists
+
+_logger = logging.getLogger(__name__)
+
+INGREDIENT_SEPARATORS = re.compile(r'[,;/+\n]|\band\b|\bwith\b', re.IGNORECASE)
+# Strengths and units written inline, e.g. "Amoxicillin 500mg"
+INGREDIENT_NOISE = re.compile(r'\(.*?\)|\b\d+(\.\d+)?\s*(%|(mg|mcg|µg|g|ml|iu)\b)?', re.IGNORECASE)
+CONCENTRATION_UNITS = re.compile(r'\b[wv]/[wv]\b', re.IGNORECASE)
+
+# Catalogue full-text search: p95 budget, exceeded queries are logged
+SEARCH_LATENCY_TARGET_MS = 50
+SEARCH_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Fields feeding the in-memory screening index built from the catalogue
+CATALOGUE_INDEX_FIELDS = {
+    'product_id', 'name', 'generic_name', 'active_ingredient', 'strength', 'dosage_form',
+    'pharmacological_class', 'therapeutic_class', 'contraindication',
+}
+
+
+def create_unique_index(cr, index_name, table, column, label):
+    """Create a unique index on the non-empty values of ``column``.
+
+    Uniqueness is only enforced by this index, so existing duplicates fail
+    the install or upgrade, listing some of them, rather than leaving the
+    column unchecked.
+    """
+    if index_exists(cr, index_name):
+        return
+    cr.execute(f"""
+        SELECT {column}, COUNT(*)
+        FROM {table}
+        WHERE {column} IS NOT NULL AND {column} != ''
+        GROUP BY {column}
+        HAVING COUNT(*) > 1
+        ORDER BY COUNT(*) DESC, {column}
+        LIMIT 10
+    """)
+    duplicates = cr.fetchall()
+    if duplicates:
+        raise UserError(f"Duplicate {label} exist in {table}; resolve them before upgrading: "
+                        + ', '.join(f'{value} ({count}x)' for value, count in duplicates))
+    cr.execute(f"""
+        CREATE UNIQUE INDEX {index_name}
+        ON {table} ({column})
+        WHERE {column} IS NOT NULL AND {column} != ''
+    """)
+
+
+def normalize_ingredients(text):
+    """Set of lower-case ingredient names found in a free-text list"""
+    ingredients = set()
+    text = CONCENTRATION_UNITS.sub(' ', text or '')
+    for part in INGREDIENT_SEPARATORS.split(text):
+        name = ' '.join(INGREDIENT_NOISE.sub(' ', part).lower().split())
+        if name:
+            ingredients.add(name)
+    return ingredients
+
+
+def substitution_key(active_ingredient, generic_name, strength, dosage_form):
+    """Key shared by interchangeable products: ingredients|strength|dosage form"""
+    ingredients = normalize_ingredients(active_ingredient) or normalize_ingredients(generic_name)
+    if not ingredients or not dosage_form:
+        return False
+    strength = ''.join((strength or '').lower().split())
+    return f"{'+'.join(sorted(ingredients))}|{strength}|{dosage_form}"
 
 
 class PharmacyProduct(models.Model):
@@ -87,6 +158,20 @@ class PharmacyProduct(models.Model):
                                                    compute='_compute_requires_pharmacist', store=True)
     cold_chain = fields.Boolean(string='Cold Chain Required', help='Requires refrigeration')
     
+    # Full-text search (backed by the search_vector column, see init)
+    catalogue_search = fields.Char(string='Catalogue Search', store=False, search='_search_catalogue')
+    
+    # Generic substitution
+    substitution_key = fields.Char(string='Substitution Key', compute='_compute_substitution_key',
+                                   store=True, index='btree_not_null',
+                                   help='Products sharing this key have the same ingredients, strength and dosage form')
+    
+    @api.depends('active_ingredient', 'generic_name', 'strength', 'dosage_form')
+    def _compute_substitution_key(self):
+        for record in self:
+            record.substitution_key = substitution_key(
+                record.active_ingredient, record.generic_name, record.strength, record.dosage_form)
+    
     @api.depends('drug_category')
     def _compute_requires_prescription(self):
         for record in self:
@@ -98,16 +183,151 @@ class PharmacyProduct(models.Model):
             record.requires_pharmacist_approval = record.drug_category in ['prescription', 'controlled'] or \
                                                    record.schedule in ['schedule_1', 'schedule_2']
     
-    @api.constrains('ppb_registration_no')
-    def _check_ppb_registration(self):
-        for record in self:
-            if record.ppb_registration_no:
-                existing = self.search([
-                    ('ppb_registration_no', '=', record.ppb_registration_no),
-                    ('id', '!=', record.id)
-                ])
-                if existing:
-                    raise ValidationError(f"PPB Registration Number {record.ppb_registration_no} already exists for {existing.name}")
+    def init(self):
+        # Weighted full-text document kept up to date by PostgreSQL itself
+        self.env.cr.execute("""
+            ALTER TABLE pharmacy_product ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(brand_name, '') || ' ' || coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(generic_name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(active_ingredient, '') || ' ' || coalesce(therapeutic_class, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(indication, '')), 'C')
+            ) STORED
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS pharmacy_product_search_vector_idx
+            ON pharmacy_product USING gin (search_vector)
+        """)
+        
+        # PPB registration numbers are unique; enforced by the database rather
+        # than a per-record search so catalogue imports scale.
+        create_unique_index(self.env.cr, 'pharmacy_product_ppb_registration_no_uniq', 'pharmacy_product',
+                            'ppb_registration_no', 'PPB registration numbers')
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(PharmacyProduct, self).create(vals_list)
+        # Bulk loaders refresh the index once per batch instead
+        if not self.env.context.get('defer_catalogue_refresh'):
+            self.env['pharmacy.drug.interaction']._invalidate_screening_index()
+        return records
+    
+    def write(self, vals):
+        res = super(PharmacyProduct, self).write(vals)
+        if not self.env.context.get('defer_catalogue_refresh'):
+            self._refresh_catalogue_caches(vals)
+        return res
+    
+    @api.model
+    def _refresh_catalogue_caches(self, fnames):
+        """Rebuild what depends on the catalogue after ``fnames`` changed"""
+        if CATALOGUE_INDEX_FIELDS.intersection(fnames):
+            self.env['pharmacy.drug.interaction']._invalidate_screening_index()
+        if 'registration_expiry' in fnames or 'product_id' in fnames:
+            self.env['pharmacy.sale.block']._trigger_rebuild()
+    
+    def unlink(self):
+        res = super(PharmacyProduct, self).unlink()
+        self.env['pharmacy.drug.interaction']._invalidate_screening_index()
+        return res
+    
+    @api.model
+    def get_substitutes(self, product_id, limit=10):
+        """In-stock equivalents of a product.product, for the counter.
+
+        One query returns products with the same substitution key that have
+        sellable stock in the current company, with on-hand quantity and the
+        nearest usable expiry. Results are ranked nearest expiry first (FEFO),
+        then by quantity. Expired and recalled lots are not counted.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT pp.product_id, pp.id AS pharmacy_product_id, pp.name, pp.brand_name, pp.strength,
+                   pt.list_price, stock.quantity, stock.nearest_expiry
+            FROM pharmacy_product src
+            JOIN pharmacy_product pp ON pp.substitution_key = src.substitution_key AND pp.id != src.id
+            JOIN product_product prod ON prod.id = pp.product_id AND prod.active
+            JOIN product_template pt ON pt.id = prod.product_tmpl_id
+            JOIN LATERAL (
+                SELECT SUM(sq.quantity) AS quantity, MIN(lot.expiry_date) AS nearest_expiry
+                FROM stock_quant sq
+                JOIN stock_location loc ON loc.id = sq.location_id AND loc.usage = 'internal'
+                LEFT JOIN stock_lot lot ON lot.id = sq.lot_id
+                WHERE sq.product_id = pp.product_id
+                  AND sq.company_id = %(company_id)s
+                  AND sq.quantity > 0
+                  AND (lot.id IS NULL OR (
+                        (lot.expiry_date IS NULL OR lot.expiry_date >= CURRENT_DATE)
+                        AND NOT COALESCE(lot.is_recalled, FALSE)))
+            ) stock ON stock.quantity > 0
+            WHERE src.product_id = %(product_id)s AND src.substitution_key IS NOT NULL
+            ORDER BY stock.nearest_expiry ASC NULLS LAST, stock.quantity DESC
+            LIMIT %(limit)s
+        """, {'product_id': product_id, 'company_id': self.env.company.id, 'limit': limit})
+        return self.env.cr.dictfetchall()
+    
+    @api.model
+    def _catalogue_tsquery(self, query):
+        """Prefix tsquery from free text: 'amox 500' -> 'amox:* & 500:*'"""
+        tokens = SEARCH_TOKEN.findall((query or '').lower())
+        return ' & '.join(f'{token}:*' for token in tokens)
+    
+    @api.model
+    def _catalogue_search_ids(self, query, limit=20):
+        """Ids of pharmacy products matching ``query``, best match first"""
+        tsquery = self._catalogue_tsquery(query)
+        if not tsquery:
+            return []
+        start = time.perf_counter()
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT id
+            FROM pharmacy_product, to_tsquery('simple', %s) query
+            WHERE search_vector @@ query
+            ORDER BY ts_rank_cd(search_vector, query) DESC, name
+            LIMIT %s
+        """, (tsquery, limit))
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        elapsed = (time.perf_counter() - start) * 1000
+        if elapsed > SEARCH_LATENCY_TARGET_MS:
+            _logger.warning('Catalogue search %r took %.1f ms (target %s ms)', query, elapsed, SEARCH_LATENCY_TARGET_MS)
+        return ids
+    
+    @api.model
+    def search_catalogue(self, query, limit=20):
+        """Ranked catalogue search for the back office and the POS"""
+        ids = self._catalogue_search_ids(query, limit)
+        records = {record['id']: record for record in self.browse(ids).read(
+            ['name', 'generic_name', 'brand_name', 'strength', 'dosage_form', 'product_id', 'drug_category'])}
+        return [records[record_id] for record_id in ids if record_id in records]
+    
+    def _search_catalogue(self, operator, value):
+        return [('id', 'in', self._catalogue_search_ids(value, limit=None))]
+    
+    @api.model
+    def name_search(self, name='', domain=None, operator='ilike', limit=100):
+        if not name or operator not in ('ilike', 'like', '=ilike'):
+            return super(PharmacyProduct, self).name_search(name, domain, operator, limit)
+        ids = self._catalogue_search_ids(name, limit)
+        records = self.browse(ids)
+        if domain:
+            records = records.filtered_domain(domain)
+        result = [(record.id, record.display_name) for record in records]
+        if len(result) < limit:
+            # Top up with the plain name match, e.g. for codes that are not words
+            extra_domain = list(domain or []) + [('id', 'not in', records.ids)]
+            result += super(PharmacyProduct, self).name_search(name, extra_domain, operator, limit - len(result))
+        return result
+    
+    def action_view_substitutes(self):
+        self.ensure_one()
+        return {
+            'name': f'Substitutes for {self.name}',
+            'type': 'ir.actions.act_window',
+            'res_model': 'pharmacy.product',
+            'view_mode': 'list,form',
+            'domain': [('substitution_key', '=', self.substitution_key), ('id', '!=', self.id)],
+        }
     
     @api.constrains('registration_expiry')
     def _check_registration_expiry(self):
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+
+
+class PharmacySalesReport(models.Model):
+    """Sales analysis over paid POS order lines, as a database view.
+
+    One row per order line, already joined to its pharmacy classification,
+    the order's main payment type, insurer and pharmacist, so pivot and graph
+    views aggregate in a single GROUP BY.
+    """
+    _name = 'pharmacy.sales.report'
+    _description = 'Pharmacy Sales Analysis'
+    _auto = False
+    _order = 'date desc'
+
+    date = fields.Datetime(string='Order Date', readonly=True)
+    order_id = fields.Many2one('pos.order', string='Order', readonly=True)
+    session_id = fields.Many2one('pos.session', string='Session', readonly=True)
+    config_id = fields.Many2one('pos.config', string='Point of Sale', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    user_id = fields.Many2one('res.users', string='Cashier', readonly=True)
+    pharmacist_id = fields.Many2one('res.users', string='Pharmacist', readonly=True)
+    
+    product_id = fields.Many2one('product.product', string='Product', readonly=True)
+    product_tmpl_id = fields.Many2one('product.template', string='Product Template', readonly=True)
+    pharmacy_product_id = fields.Many2one('pharmacy.product', string='Pharmacy Product', readonly=True)
+    drug_category = fields.Selection(
+        selection=lambda self: self.env['pharmacy.product']._fields['drug_category'].selection,
+        string='Drug Category', readonly=True)
+    therapeutic_class = fields.Char(string='Therapeutic Class', readonly=True)
+    
+    payment_type = fields.Selection(
+        selection=lambda self: self.env['pos.payment.method']._fields['payment_type'].selection,
+        string='Payment Type', readonly=True, help='Payment type covering the largest part of the order')
+    insurance_claim = fields.Boolean(string='Insurance Claim', readonly=True)
+    insurance_company = fields.Char(string='Insurer', readonly=True)
+    has_prescription = fields.Boolean(string='Prescription Sale', readonly=True)
+    
+    qty = fields.Float(string='Quantity', readonly=True)
+    revenue = fields.Float(string='Revenue', readonly=True)
+    revenue_untaxed = fields.Float(string='Revenue (Untaxed)', readonly=True)
+    cost = fields.Float(string='Cost', readonly=True)
+    margin = fields.Float(string='Margin', readonly=True)
+    
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT
+                    l.id AS id,
+                    o.date_order AS date,
+                    o.id AS order_id,
+                    o.session_id AS session_id,
+                    s.config_id AS config_id,
+                    o.company_id AS company_id,
+                    o.user_id AS user_id,
+                    o.pharmacist_id AS pharmacist_id,
+                    l.product_id AS product_id,
+                    p.product_tmpl_id AS product_tmpl_id,
+                    pp.id AS pharmacy_product_id,
+                    pp.drug_category AS drug_category,
+                    pp.therapeutic_class AS therapeutic_class,
+                    pay.payment_type AS payment_type,
+                    COALESCE(o.insurance_claim, FALSE) AS insurance_claim,
+                    o.insurance_company AS insurance_company,
+                    o.prescription_id IS NOT NULL AS has_prescription,
+                    l.qty AS qty,
+                    l.price_subtotal_incl AS revenue,
+                    l.price_subtotal AS revenue_untaxed,
+                    COALESCE(l.total_cost, 0.0) AS cost,
+                    l.price_subtotal - COALESCE(l.total_cost, 0.0) AS margin
+                FROM pos_order_line l
+                JOIN pos_order o ON o.id = l.order_id
+                JOIN pos_session s ON s.id = o.session_id
+                JOIN product_product p ON p.id = l.product_id
+                JOIN product_template pt ON pt.id = p.product_tmpl_id
+                LEFT JOIN pharmacy_product pp ON pp.id = pt.pharmacy_product_id
+                -- Main payment of the order, read through the pos_order_id index so
+                -- filters on the orders keep the payment lookup to those orders
+                LEFT JOIN LATERAL (
+                    SELECT pm.payment_type
+                    FROM pos_payment pay
+                    JOIN pos_payment_method pm ON pm.id = pay.payment_method_id
+                    WHERE pay.pos_order_id = o.id
+                    ORDER BY pay.amount DESC, pay.id
+                    LIMIT 1
+                ) pay ON TRUE
+                WHERE o.state IN ('paid', 'done', 'invoiced')
+            )
+        """)
+
+
+class ReportPharmacySales(models.AbstractModel):
+    _name = 'report.softlink_pos.report_pharmacy_sales_document'
+    _description = 'Pharmacy Sales Report'
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        Report = self.env['pharmacy.sales.report']
+        domain = [('order_id', 'in', docids)]
+        aggregates = ['qty:sum', 'revenue:sum', 'margin:sum']
+        category_labels = dict(Report._fields['drug_category']._description_selection(self.env))
+        payment_labels = dict(Report._fields['payment_type']._description_selection(self.env))
+        return {
+            'doc_ids': docids,
+            'doc_model': 'pos.order',
+            'docs': self.env['pos.order'].browse(docids),
+            'by_category': [
+                (category_labels.get(category, 'Non-pharmaceutical'), qty, revenue, margin)
+                for category, qty, revenue, margin in Report._read_group(domain, ['drug_category'], aggregates)
+            ],
+            'by_payment': [
+                (payment_labels.get(payment_type, 'Unpaid'), qty, revenue, margin)
+                for payment_type, qty, revenue, margin in Report._read_group(domain, ['payment_type'], aggregates)
+            ],
+            'by_insurer': [
+                row for row in Report._read_group(domain + [('insurance_claim', '=', True)], ['insurance_company'], aggregates)
+            ],
+            # Sums are None when the orders have no report lines
+            'totals': [value or 0.0 for value in Report._read_group(domain, [], aggregates)[0]],
+        }
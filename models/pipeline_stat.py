@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import models, fields, api, tools, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+INSTRUMENTATION_PARAM = 'softlink_pos.pipeline_instrumentation'
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+STAGE_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+BUCKET_FIELDS = [f'bucket_le_{bound}' for bound in STAGE_BUCKETS_MS] + ['bucket_gt_1000']
+# Each worker keeps its spans in memory and flushes them this often
+FLUSH_INTERVAL = 60
+RETENTION_DAYS = 7
+
+# {dbname: {stage: [count, total_ms, max_ms, queries, [bucket counts]]}}
+_pending = {}
+_last_flush = {}
+_pending_lock = threading.Lock()
+# Registries of the databases with pending spans, and the timer flushing idle workers
+_registries = {}
+_flush_timer = None
+
+
+def _bucket_index(elapsed_ms):
+    for index, bound in enumerate(STAGE_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return index
+    return len(STAGE_BUCKETS_MS)
+
+
+@contextmanager
+def pipeline_span(env, stage):
+    """Time a stage of the paid-order pipeline and count its queries.
+
+    Costs one cached lookup when instrumentation is disabled. When enabled,
+    pending ORM writes are flushed on entry and exit so that each stage is
+    charged with its own queries.
+    """
+    if not env['pharmacy.pipeline.stat']._instrumentation_enabled():
+        yield
+        return
+    env.flush_all()
+    cr = env.cr
+    queries = cr.sql_log_count
+    start = time.perf_counter()
+    try:
+        yield
+        env.flush_all()
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        query_count = cr.sql_log_count - queries
+        _logger.debug('pipeline stage %s: %.2f ms, %s queries', stage, elapsed, query_count)
+        _record_span(env, stage, elapsed, query_count)
+
+
+def _record_span(env, stage, elapsed, query_count):
+    dbname = env.cr.dbname
+    now = time.monotonic()
+    with _pending_lock:
+        stats = _pending.setdefault(dbname, {})
+        entry = stats.get(stage)
+        if entry is None:
+            entry = stats[stage] = [0, 0.0, 0.0, 0, [0] * len(BUCKET_FIELDS)]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+        entry[3] += query_count
+        entry[4][_bucket_index(elapsed)] += 1
+        _registries[dbname] = env.registry
+        if now - _last_flush.setdefault(dbname, now) < FLUSH_INTERVAL:
+            _schedule_idle_flush()
+            return
+        _last_flush[dbname] = now
+        flushing = _pending.pop(dbname)
+    env['pharmacy.pipeline.stat']._flush_spans(flushing)
+
+
+def _schedule_idle_flush():
+    """Start the timer flushing spans left behind once a worker goes idle; call with _pending_lock held"""
+    global _flush_timer
+    if _flush_timer is None:
+        _flush_timer = threading.Timer(FLUSH_INTERVAL, _flush_idle)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def _flush_idle():
+    global _flush_timer
+    with _pending_lock:
+        _flush_timer = None
+        now = time.monotonic()
+        flushing = {dbname: _pending.pop(dbname) for dbname in list(_pending)
+                    if now - _last_flush.get(dbname, now) >= FLUSH_INTERVAL}
+        for dbname in flushing:
+            _last_flush[dbname] = now
+        if _pending:
+            _schedule_idle_flush()
+    for dbname, stats in flushing.items():
+        try:
+            with _registries[dbname].cursor() as cr:
+                api.Environment(cr, SUPERUSER_ID, {})['pharmacy.pipeline.stat']._flush_spans(stats)
+        except Exception:
+            _logger.exception('Could not flush paid-order pipeline statistics of %s', dbname)
+
+
+class PipelineStat(models.Model):
+    _name = 'pharmacy.pipeline.stat'
+    _description = 'Paid Order Pipeline Stage Statistics'
+    _order = 'period_start desc, stage'
+    _rec_name = 'stage'
+
+    stage = fields.Char(string='Stage', required=True, readonly=True)
+    period_start = fields.Datetime(string='Hour', required=True, readonly=True)
+    count = fields.Integer(string='Calls', readonly=True)
+    total_ms = fields.Float(string='Total (ms)', readonly=True, digits=(16, 1))
+    max_ms = fields.Float(string='Max (ms)', readonly=True, digits=(16, 1), aggregator='max')
+    queries = fields.Integer(string='Queries', readonly=True)
+    avg_ms = fields.Float(string='Avg (ms)', compute='_compute_summary', digits=(16, 2))
+    avg_queries = fields.Float(string='Avg Queries', compute='_compute_summary', digits=(16, 1))
+    p50_ms = fields.Float(string='p50 ≤ (ms)', compute='_compute_summary')
+    p95_ms = fields.Float(string='p95 ≤ (ms)', compute='_compute_summary')
+
+    bucket_le_1 = fields.Integer(string='≤ 1 ms', readonly=True)
+    bucket_le_5 = fields.Integer(string='≤ 5 ms', readonly=True)
+    bucket_le_10 = fields.Integer(string='≤ 10 ms', readonly=True)
+    bucket_le_25 = fields.Integer(string='≤ 25 ms', readonly=True)
+    bucket_le_50 = fields.Integer(string='≤ 50 ms', readonly=True)
+    bucket_le_100 = fields.Integer(string='≤ 100 ms', readonly=True)
+    bucket_le_250 = fields.Integer(string='≤ 250 ms', readonly=True)
+    bucket_le_500 = fields.Integer(string='≤ 500 ms', readonly=True)
+    bucket_le_1000 = fields.Integer(string='≤ 1 s', readonly=True)
+    bucket_gt_1000 = fields.Integer(string='> 1 s', readonly=True)
+
+    _sql_constraints = [
+        ('stage_period_uniq', 'unique(stage, period_start)', 'One row per stage and hour.'),
+    ]
+
+    @api.depends('count', 'total_ms', 'queries', *BUCKET_FIELDS)
+    def _compute_summary(self):
+        for stat in self:
+            stat.avg_ms = stat.total_ms / stat.count if stat.count else 0.0
+            stat.avg_queries = stat.queries / stat.count if stat.count else 0.0
+            stat.p50_ms = stat._percentile_bound(0.5)
+            stat.p95_ms = stat._percentile_bound(0.95)
+
+    def _percentile_bound(self, fraction):
+        """Upper bound of the bucket holding the percentile (max for the last bucket)"""
+        target = fraction * self.count
+        seen = 0
+        for bound, fname in zip(STAGE_BUCKETS_MS, BUCKET_FIELDS):
+            seen += self[fname]
+            if seen and seen >= target:
+                return bound
+        return self.max_ms
+
+    @api.model
+    @tools.ormcache()
+    def _instrumentation_enabled(self):
+        # ir.config_parameter clears the registry cache when it is written
+        return bool(self.env['ir.config_parameter'].sudo().get_param(INSTRUMENTATION_PARAM))
+
+    @api.model
+    def _flush_spans(self, stats):
+        """Add a worker's pending spans to the current hour in a separate cursor.
+
+        The upsert commits on its own, so row locks on the statistics are held
+        for one statement and never for the duration of a checkout.
+        """
+        period = fields.Datetime.now().replace(minute=0, second=0, microsecond=0)
+        columns = ', '.join(BUCKET_FIELDS)
+        updates = ', '.join(f'{fname} = s.{fname} + EXCLUDED.{fname}' for fname in BUCKET_FIELDS)
+        try:
+            with self.env.registry.cursor() as cr:
+                for stage, (count, total_ms, max_ms, queries, buckets) in stats.items():
+                    cr.execute(f"""
+                        INSERT INTO pharmacy_pipeline_stat AS s
+                            (stage, period_start, count, total_ms, max_ms, queries, {columns},
+                             create_uid, create_date, write_uid, write_date)
+                        VALUES (%s, %s, %s, %s, %s, %s, {', '.join(['%s'] * len(BUCKET_FIELDS))},
+                                %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC')
+                        ON CONFLICT (stage, period_start) DO UPDATE SET
+                            count = s.count + EXCLUDED.count,
+                            total_ms = s.total_ms + EXCLUDED.total_ms,
+                            max_ms = GREATEST(s.max_ms, EXCLUDED.max_ms),
+                            queries = s.queries + EXCLUDED.queries,
+                            {updates},
+                            write_date = EXCLUDED.write_date
+                    """, [stage, period, count, total_ms, max_ms, queries, *buckets, self.env.uid, self.env.uid])
+                    _logger.info('pipeline stage %s: %s calls, avg %.2f ms, max %.1f ms, avg %.1f queries',
+                                 stage, count, total_ms / count, max_ms, queries / count)
+        except Exception:
+            _logger.exception('Could not flush paid-order pipeline statistics')
+
+    @api.model
+    def _cron_purge(self):
+        """Store this worker's pending spans and drop statistics older than the retention window"""
+        with _pending_lock:
+            flushing = _pending.pop(self.env.cr.dbname, None)
+        if flushing:
+            self._flush_spans(flushing)
+        self.search([('period_start', '<', fields.Datetime.now() - timedelta(days=RETENTION_DAYS))]).unlink()
+
+    @api.model
+    def action_enable(self):
+        self.env['ir.config_parameter'].sudo().set_param(INSTRUMENTATION_PARAM, '1')
+
+    @api.model
+    def action_disable(self):
+        self.env['ir.config_parameter'].sudo().set_param(INSTRUMENTATION_PARAM, False)
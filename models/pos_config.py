@@ -2,6 +2,16 @@
 
 from odoo import models, fields, api
 
+from .worker_cache import WorkerCache
+
+# Flags read on every order; cached per worker by _get_pharmacy_settings
+PHARMACY_SETTINGS_CACHE = WorkerCache('pharmacy_settings')
+PHARMACY_CONFIG_FIELDS = [
+    'is_pharmacy_pos', 'require_prescription_validation', 'require_pharmacist_approval',
+    'allow_otc_sales', 'block_expired_products', 'warn_near_expiry', 'near_expiry_days',
+    'enable_insurance', 'default_insurance_percentage', 'require_patient_info', 'auto_create_patient',
+]
+
 
 class PosConfig(models.Model):
     _inherit = 'pos.config'
@@ -38,3 +48,39 @@ class PosConfig(models.Model):
     
     auto_create_patient = fields.Boolean(string='Auto Create Patient', default=True,
                                           help='Automatically create patient record if not exists')
+    
+    def init(self):
+        super(PosConfig, self).init()
+        PHARMACY_SETTINGS_CACHE.init(self.env.cr)
+    
+    def write(self, vals):
+        res = super(PosConfig, self).write(vals)
+        if set(PHARMACY_CONFIG_FIELDS) & set(vals):
+            PHARMACY_SETTINGS_CACHE.invalidate(self.env, self.ids)
+        return res
+    
+    def unlink(self):
+        config_ids = self.ids
+        res = super(PosConfig, self).unlink()
+        PHARMACY_SETTINGS_CACHE.invalidate(self.env, config_ids)
+        return res
+    
+    @api.model
+    def _get_pharmacy_settings(self, config_id):
+        """Pharmacy flags of a point of sale, cached per worker. Do not mutate the result."""
+        def read_settings():
+            config = self.sudo().browse(config_id)
+            return config.read(PHARMACY_CONFIG_FIELDS)[0] if config.exists() else {}
+        return PHARMACY_SETTINGS_CACHE.get(self.env, config_id, read_settings)
+    
+    def _pharmacy_bus_channel(self):
+        self.ensure_one()
+        return f'softlink_pos.config.{self.id}'
+    
+    def _pharmacy_notify(self, notification_type, payload):
+        """Push ``payload`` to the open tills of these points of sale over the bus"""
+        configs = self.filtered(lambda config: config.is_pharmacy_pos and config.current_session_id)
+        if configs:
+            self.env['bus.bus']._sendmany([
+                (config._pharmacy_bus_channel(), notification_type, payload) for config in configs
+            ])
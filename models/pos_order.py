@@ -3,12 +3,14 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
 
+from .pipeline_stat import pipeline_span
+
 
 class PosOrder(models.Model):
     _inherit = 'pos.order'
 
     # Patient Information
-    patient_id = fields.Many2one('pharmacy.patient', string='Patient', tracking=True)
+    patient_id = fields.Many2one('pharmacy.patient', string='Patient', tracking=True, index='btree_not_null')
     patient_name = fields.Char(string='Patient Name')
     patient_phone = fields.Char(string='Patient Phone')
     
@@ -64,8 +66,10 @@ class PosOrder(models.Model):
         return {
             'pos_order_id': self.id,
             'product_id': line.product_id.id,
+            'lot_id': line.lot_id.id if line.lot_id else False,
             'patient_id': self.patient_id.id if self.patient_id else False,
             'patient_name': self.patient_name or (self.patient_id.full_name if self.patient_id else ''),
+            'patient_id_number': self.patient_id.id_number if self.patient_id else False,
             'prescription_id': self.prescription_id.id if self.prescription_id else False,
             'quantity': line.qty,
             'date': self.date_order,
@@ -98,35 +102,49 @@ class PosOrder(models.Model):
     def action_pos_order_paid(self):
         """Override to add pharmacy validations and create controlled drugs register entries"""
         # Validate prescription items
-        for order in self:
-            if order.has_prescription_items and not order.prescription_id:
-                # In production, this should raise an error
-                # For now, we'll just log a warning
-                pass
-            
-            if order.requires_pharmacist_approval and not order.approved_by_pharmacist:
-                raise UserError('This order contains items that require pharmacist approval.')
+        with pipeline_span(self.env, 'pharmacy_validation'):
+            for order in self:
+                if order.has_prescription_items and not order.prescription_id:
+                    # In production, this should raise an error
+                    # For now, we'll just log a warning
+                    pass
+                
+                settings = self.env['pos.config']._get_pharmacy_settings(order.session_id.config_id.id)
+                if settings.get('require_pharmacist_approval', True) and \
+                        order.requires_pharmacist_approval and not order.approved_by_pharmacist:
+                    raise UserError('This order contains items that require pharmacist approval.')
+                
+                # Same blocklist the till checks offline
+                block_stock = settings.get('block_expired_products', True)
+                prescriber_id = order.prescription_id.prescriber_id.id \
+                    if settings.get('require_prescription_validation', True) else False
+                if block_stock or prescriber_id:
+                    self.env['pharmacy.sale.block']._check_order_lines(
+                        order.lines if block_stock else order.lines.browse(), prescriber_id)
         
-        res = super(PosOrder, self).action_pos_order_paid()
+        with pipeline_span(self.env, 'core_paid'):
+            res = super(PosOrder, self).action_pos_order_paid()
         
-        # Create controlled drugs register entries
         for order in self:
-            if order.has_controlled_drugs:
-                for line in order.lines:
-                    if line.product_id.product_tmpl_id.pharmacy_product_id:
-                        if line.product_id.product_tmpl_id.pharmacy_product_id.drug_category == 'controlled':
-                            self.env['pharmacy.controlled.drugs.register'].create(
-                                order._prepare_controlled_drugs_register_entry(line)
-                            )
+            # Create controlled drugs register entries
+            with pipeline_span(self.env, 'controlled_register'):
+                if order.has_controlled_drugs:
+                    for line in order.lines:
+                        if line.product_id.product_tmpl_id.pharmacy_product_id:
+                            if line.product_id.product_tmpl_id.pharmacy_product_id.drug_category == 'controlled':
+                                self.env['pharmacy.controlled.drugs.register'].create(
+                                    order._prepare_controlled_drugs_register_entry(line)
+                                )
             
             # Update prescription if linked
-            if order.prescription_id:
-                order.prescription_id.write({
-                    'pos_order_id': order.id,
-                    'state': 'dispensed',
-                    'dispensed_by': order.user_id.id,
-                    'dispensing_date': fields.Datetime.now(),
-                })
+            with pipeline_span(self.env, 'prescription_update'):
+                if order.prescription_id:
+                    order.prescription_id.write({
+                        'pos_order_id': order.id,
+                        'state': 'dispensed',
+                        'dispensed_by': order.user_id.id,
+                        'dispensing_date': fields.Datetime.now(),
+                    })
         
         return res
 
@@ -135,7 +153,7 @@ class PosOrderLine(models.Model):
     _inherit = 'pos.order.line'
 
     # Pharmacy specific fields
-    lot_id = fields.Many2one('stock.lot', string='Lot/Batch')
+    lot_id = fields.Many2one('stock.lot', string='Lot/Batch', index='btree_not_null')
     expiry_date = fields.Date(string='Expiry Date', related='lot_id.expiry_date', readonly=True)
     prescription_line_id = fields.Many2one('pharmacy.prescription.line', string='Prescription Line')
     
@@ -1,7 +1,20 @@
 # -*- coding: utf-8 -*-
 
+import threading
+import time
+from datetime import datetime, time as dt_time
+
+import pytz
+
 from odoo import models, fields, api
-from odoo.exceptions import UserError
+from odoo.exceptions import AccessError, UserError
+
+# Dashboard KPIs are cached per worker for a short interval so that many
+# managers opening the dashboard at shift change trigger one computation.
+DASHBOARD_CACHE_TTL = 60
+DASHBOARD_CACHE = {}
+DASHBOARD_CACHE_LOCK = threading.Lock()
+DASHBOARD_KEY_LOCKS = {}
 
 
 class PosSession(models.Model):
@@ -20,25 +33,186 @@ class PosSession(models.Model):
                                         compute='_compute_prescription_count')
     
     def _compute_controlled_drugs_count(self):
+        counts = {}
+        if self.ids:
+            self.env.flush_all()
+            self.env.cr.execute("""
+                SELECT o.session_id, COUNT(DISTINCT o.id)
+                FROM pos_order o
+                JOIN pos_order_line l ON l.order_id = o.id
+                JOIN product_product prod ON prod.id = l.product_id
+                JOIN product_template pt ON pt.id = prod.product_tmpl_id
+                JOIN pharmacy_product ph ON ph.id = pt.pharmacy_product_id
+                WHERE o.session_id = ANY(%s) AND ph.drug_category = 'controlled'
+                GROUP BY o.session_id
+            """, (self.ids,))
+            counts = dict(self.env.cr.fetchall())
         for session in self:
-            orders = self.env['pos.order'].search([('session_id', '=', session.id)])
-            count = 0
-            for order in orders:
-                if order.has_controlled_drugs:
-                    count += 1
-            session.controlled_drugs_count = count
+            session.controlled_drugs_count = counts.get(session.id, 0)
     
     def _compute_prescription_count(self):
+        groups = self.env['pos.order']._read_group(
+            [('session_id', 'in', self.ids), ('prescription_id', '!=', False)],
+            ['session_id'], ['__count'],
+        )
+        counts = {session.id: count for session, count in groups}
         for session in self:
-            session.prescription_count = self.env['pos.order'].search_count([
-                ('session_id', '=', session.id),
-                ('prescription_id', '!=', False)
-            ])
+            session.prescription_count = counts.get(session.id, 0)
     
     def action_pos_session_open(self):
         """Override to check if pharmacist is assigned"""
         for session in self:
-            if session.config_id.is_pharmacy_pos and session.config_id.require_pharmacist_approval:
+            settings = self.env['pos.config']._get_pharmacy_settings(session.config_id.id)
+            if settings.get('is_pharmacy_pos') and settings.get('require_pharmacist_approval'):
                 if not session.pharmacist_id:
                     raise UserError('Please assign a pharmacist on duty before opening the session.')
         return super(PosSession, self).action_pos_session_open()
+    
+    # Dashboard KPIs
+    
+    @api.model
+    def get_pharmacy_dashboard_kpis(self, config_id=False):
+        """Dashboard KPIs for the current company, or one point of sale.
+
+        Results are cached per database, company, point of sale and start of
+        the user's day (which carries their timezone) for
+        DASHBOARD_CACHE_TTL seconds. Concurrent requests for the same key
+        wait for the first one instead of recomputing. Restricted to
+        pharmacists and pharmacy managers.
+        """
+        if not self.env.user.has_group('softlink_pos.group_pharmacy_pharmacist'):
+            raise AccessError('Only pharmacists and pharmacy managers can view the pharmacy dashboard.')
+        company = self.env.company
+        config = self.env['pos.config']
+        if config_id:
+            config = config.browse(config_id)
+            config.check_access('read')
+            if config.company_id != company:
+                raise UserError('This point of sale belongs to another company.')
+        day_start = self._dashboard_day_start()
+        key = (self.env.cr.dbname, company.id, config.id, day_start)
+        
+        cached = DASHBOARD_CACHE.get(key)
+        if cached and cached[0] > time.monotonic():
+            return dict(cached[1])
+        
+        with DASHBOARD_CACHE_LOCK:
+            key_lock = DASHBOARD_KEY_LOCKS.setdefault(key, threading.Lock())
+        with key_lock:
+            cached = DASHBOARD_CACHE.get(key)
+            if cached and cached[0] > time.monotonic():
+                return dict(cached[1])
+            kpis = self._compute_dashboard_kpis(company, config, day_start)
+            self._dashboard_cache_store(key, kpis)
+        return dict(kpis)
+    
+    @api.model
+    def _dashboard_cache_store(self, key, kpis):
+        """Cache ``kpis`` under ``key``, dropping expired entries and their locks"""
+        now = time.monotonic()
+        with DASHBOARD_CACHE_LOCK:
+            for expired in [other for other, (expires, dummy) in DASHBOARD_CACHE.items() if expires <= now]:
+                del DASHBOARD_CACHE[expired]
+                if expired != key:
+                    DASHBOARD_KEY_LOCKS.pop(expired, None)
+            DASHBOARD_CACHE[key] = (now + DASHBOARD_CACHE_TTL, kpis)
+    
+    @api.model
+    def _dashboard_day_start(self):
+        """Start of today in the user's timezone, as naive UTC"""
+        tz = pytz.timezone(self.env.user.tz or 'UTC')
+        today = fields.Date.context_today(self)
+        start = tz.localize(datetime.combine(today, dt_time.min))
+        return start.astimezone(pytz.UTC).replace(tzinfo=None)
+    
+    @api.model
+    def _compute_dashboard_kpis(self, company, config, day_start):
+        """Compute the dashboard KPIs with one query per source table"""
+        self.env.flush_all()
+        params = {
+            'company_id': company.id,
+            'config_id': config.id or None,
+            'day_start': day_start,
+        }
+        
+        # Today's orders: sales and prescriptions
+        self.env.cr.execute("""
+            SELECT COUNT(*), COALESCE(SUM(o.amount_total), 0), COUNT(o.prescription_id)
+            FROM pos_order o
+            JOIN pos_session s ON s.id = o.session_id
+            WHERE o.company_id = %(company_id)s
+              AND o.date_order >= %(day_start)s
+              AND o.state IN ('paid', 'done', 'invoiced')
+              AND (%(config_id)s IS NULL OR s.config_id = %(config_id)s)
+        """, params)
+        order_count, sales_total, prescriptions = self.env.cr.fetchone()
+        
+        # eTIMS invoices never submitted, of any date; read from pos_order_etims_pending_idx
+        self.env.cr.execute("""
+            SELECT COUNT(*)
+            FROM pos_order o
+            JOIN pos_session s ON s.id = o.session_id
+            WHERE o.company_id = %(company_id)s
+              AND o.kra_invoice_number IS NOT NULL
+              AND o.kra_submitted IS NOT TRUE
+              AND o.state IN ('paid', 'done', 'invoiced')
+              AND (%(config_id)s IS NULL OR s.config_id = %(config_id)s)
+        """, params)
+        pending_etims = self.env.cr.fetchone()[0]
+        
+        # Controlled drugs dispensed today
+        self.env.cr.execute("""
+            SELECT COUNT(*), COALESCE(SUM(r.quantity), 0)
+            FROM pharmacy_controlled_drugs_register r
+            LEFT JOIN pos_order o ON o.id = r.pos_order_id
+            LEFT JOIN pos_session s ON s.id = o.session_id
+            WHERE r.company_id = %(company_id)s
+              AND r.date >= %(day_start)s
+              AND (%(config_id)s IS NULL OR s.config_id = %(config_id)s)
+        """, params)
+        controlled_entries, controlled_qty = self.env.cr.fetchone()
+        
+        # M-Pesa payments still awaiting confirmation
+        self.env.cr.execute("""
+            SELECT COUNT(*), COALESCE(SUM(p.amount), 0)
+            FROM pos_payment p
+            JOIN pos_session s ON s.id = p.session_id
+            WHERE p.company_id = %(company_id)s
+              AND p.payment_type = 'mpesa'
+              AND p.mpesa_status = 'pending'
+              AND (%(config_id)s IS NULL OR s.config_id = %(config_id)s)
+        """, params)
+        pending_mpesa, pending_mpesa_amount = self.env.cr.fetchone()
+        
+        return {
+            'company_id': company.id,
+            'config_id': config.id or False,
+            'currency_id': company.currency_id.id,
+            'computed_at': fields.Datetime.to_string(fields.Datetime.now()),
+            'ttl': DASHBOARD_CACHE_TTL,
+            'orders_today': order_count,
+            'sales_today': sales_total,
+            'prescriptions_today': prescriptions,
+            'controlled_dispenses_today': controlled_entries,
+            'controlled_quantity_today': controlled_qty,
+            'near_expiry_value': self._dashboard_near_expiry_value(company, config),
+            'pending_mpesa': pending_mpesa,
+            'pending_mpesa_amount': pending_mpesa_amount,
+            'pending_etims': pending_etims,
+        }
+    
+    @api.model
+    def _dashboard_near_expiry_value(self, company, config):
+        """Cost value of on-hand stock in near-expiry lots"""
+        domain = [
+            ('company_id', '=', company.id),
+            ('location_id.usage', '=', 'internal'),
+            ('lot_id.is_near_expiry', '=', True),
+            ('lot_id.is_expired', '=', False),
+            ('quantity', '>', 0),
+        ]
+        warehouse = config.picking_type_id.warehouse_id if config else False
+        if warehouse:
+            domain.append(('location_id', 'child_of', warehouse.view_location_id.id))
+        groups = self.env['stock.quant'].sudo()._read_group(domain, ['product_id'], ['quantity:sum'])
+        return sum(product.with_company(company).standard_price * quantity for product, quantity in groups)
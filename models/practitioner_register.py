@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import re
+from collections import Counter
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+REGISTER_STATUSES = [
+    ('active', 'Active'),
+    ('suspended', 'Suspended'),
+    ('deregistered', 'Deregistered'),
+]
+PRESCRIBER_REGISTER_STATUSES = REGISTER_STATUSES + [
+    ('expired', 'License Expired'),
+    ('not_found', 'Not in Register'),
+]
+# Same normalisation in Python and SQL so lookups and the bulk join agree
+LICENSE_KEY_SQL = "upper(regexp_replace({column}, '[^A-Za-z0-9]', '', 'g'))"
+
+
+def license_key(license_number):
+    """Register lookup key: the license number without spaces, dashes or slashes, upper case"""
+    return re.sub(r'[^A-Za-z0-9]', '', license_number or '').upper()
+
+
+class PractitionerRegister(models.Model):
+    """Local copy of the published practitioner register.
+
+    Rows are only written by the register import; audit columns are left out
+    to keep the table compact.
+    """
+    _name = 'pharmacy.practitioner.register'
+    _description = 'Practitioner Register Entry'
+    _order = 'license_key'
+    _rec_name = 'license_number'
+    _log_access = False
+
+    license_key = fields.Char(string='Lookup Key', required=True, readonly=True)
+    license_number = fields.Char(string='License Number', required=True, readonly=True)
+    name = fields.Char(string='Practitioner', readonly=True)
+    cadre = fields.Char(string='Cadre / Qualification', readonly=True)
+    status = fields.Selection(REGISTER_STATUSES, string='Status', required=True, default='active', readonly=True)
+    license_expiry = fields.Date(string='License Expiry', readonly=True)
+    import_id = fields.Integer(string='Import', readonly=True, help='Import run that last saw this entry')
+
+    _sql_constraints = [
+        ('license_key_uniq', 'unique(license_key)', 'The register holds one entry per license number.'),
+    ]
+
+    @api.model
+    def _is_loaded(self):
+        return bool(self.search_count([], limit=1))
+
+    @api.model
+    def _status_for(self, license_number):
+        """Register status of a license number, or False when no register is loaded"""
+        if not license_number or not self._is_loaded():
+            return False
+        entry = self.search_fetch([('license_key', '=', license_key(license_number))],
+                                  ['status', 'license_expiry'], limit=1)
+        if not entry:
+            return 'not_found'
+        if entry.status == 'active' and entry.license_expiry and entry.license_expiry < fields.Date.today():
+            return 'expired'
+        return entry.status
+
+    @api.model
+    def _prescribers_in_import(self, import_id):
+        """Ids of the prescribers whose license was in the given register import"""
+        self.env['pharmacy.prescriber'].flush_model(['license_number'])
+        self.env.cr.execute(f"""
+            SELECT p.id
+            FROM pharmacy_prescriber p
+            JOIN pharmacy_practitioner_register r
+              ON r.license_key = {LICENSE_KEY_SQL.format(column='p.license_number')}
+            WHERE r.import_id = %s
+        """, (import_id,))
+        return [prescriber_id for prescriber_id, in self.env.cr.fetchall()]
+
+    @api.model
+    def _verify_prescribers(self, prescriber_ids=None):
+        """Set register status and verification of prescribers in one statement.
+
+        All prescribers are checked when ``prescriber_ids`` is None. Status
+        changes are logged on the prescribers, as the raw update bypasses
+        field tracking. Returns a Counter of the resulting statuses; nothing
+        is changed while no register is loaded, as everyone would be
+        reported missing.
+        """
+        if not self._is_loaded():
+            return Counter()
+        self.env.flush_all()
+        where, params = '', {'uid': self.env.uid}
+        if prescriber_ids is not None:
+            if not prescriber_ids:
+                return Counter()
+            where, params['ids'] = 'WHERE p.id IN %(ids)s', tuple(prescriber_ids)
+        self.env.cr.execute(f"""
+            UPDATE pharmacy_prescriber p
+            SET register_status = v.status,
+                register_checked_on = CURRENT_DATE,
+                is_verified = v.status = 'active',
+                verification_date = CASE WHEN v.status = 'active' AND p.is_verified IS NOT TRUE
+                                         THEN CURRENT_DATE ELSE p.verification_date END,
+                verified_by = CASE WHEN v.status = 'active' AND p.is_verified IS NOT TRUE
+                                   THEN %(uid)s ELSE p.verified_by END
+            FROM (
+                SELECT p.id, p.register_status AS previous,
+                       CASE WHEN r.id IS NULL THEN 'not_found'
+                            WHEN r.status = 'active' AND r.license_expiry < CURRENT_DATE THEN 'expired'
+                            ELSE r.status
+                       END AS status
+                FROM pharmacy_prescriber p
+                LEFT JOIN pharmacy_practitioner_register r
+                       ON r.license_key = {LICENSE_KEY_SQL.format(column='p.license_number')}
+                {where}
+            ) v
+            WHERE p.id = v.id
+            RETURNING v.id, v.previous, v.status
+        """, params)
+        rows = self.env.cr.fetchall()
+        statuses = Counter(status for dummy, dummy, status in rows)
+        Prescriber = self.env['pharmacy.prescriber']
+        Prescriber.invalidate_model(
+            ['register_status', 'register_checked_on', 'is_verified', 'verification_date', 'verified_by'])
+        labels = dict(PRESCRIBER_REGISTER_STATUSES)
+        changes = {
+            prescriber_id: f"Register status changed from {labels.get(previous, 'Not checked')} to {labels[status]}"
+            for prescriber_id, previous, status in rows if previous != status
+        }
+        if changes:
+            Prescriber.browse(list(changes)).sudo()._message_log_batch(bodies=changes)
+        # Unverified prescribers are on the sale blocklist
+        self.env['pharmacy.sale.block']._trigger_rebuild()
+        return statuses
+
+    def action_verify_all_prescribers(self):
+        if not self._is_loaded():
+            raise UserError('Import the practitioner register first.')
+        statuses = self._verify_prescribers()
+        labels = dict(PRESCRIBER_REGISTER_STATUSES)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Prescribers Re-verified',
+                'message': ', '.join(f'{labels[status]}: {count}' for status, count in statuses.items())
+                           or 'No prescribers to verify.',
+                'type': 'info',
+                'sticky': False,
+            },
+        }
@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import logging
+
 from odoo import models, fields, api
-from odoo.exceptions import ValidationError
+from odoo.exceptions import ValidationError, UserError
+
+from .pharmacy_product import create_unique_index
+from .practitioner_register import PRESCRIBER_REGISTER_STATUSES
+
+_logger = logging.getLogger(__name__)
 
 
 class Prescriber(models.Model):
@@ -59,6 +66,9 @@ class Prescriber(models.Model):
                                   help='Indicates if the prescriber credentials have been verified')
     verification_date = fields.Date(string='Verification Date')
     verified_by = fields.Many2one('res.users', string='Verified By')
+    register_status = fields.Selection(PRESCRIBER_REGISTER_STATUSES, string='Register Status', readonly=True,
+                                       tracking=True, help='Status in the imported practitioner register')
+    register_checked_on = fields.Date(string='Register Checked On', readonly=True)
     
     notes = fields.Text(string='Notes')
     
@@ -67,16 +77,33 @@ class Prescriber(models.Model):
         for record in self:
             record.prescription_count = len(record.prescription_ids)
     
-    @api.constrains('license_number')
-    def _check_unique_license(self):
-        for record in self:
-            if record.license_number:
-                existing = self.search([
-                    ('license_number', '=', record.license_number),
-                    ('id', '!=', record.id)
-                ])
-                if existing:
-                    raise ValidationError(f'A prescriber with license number {record.license_number} already exists')
+    def init(self):
+        create_unique_index(self.env.cr, 'pharmacy_prescriber_license_number_uniq', 'pharmacy_prescriber',
+                            'license_number', 'prescriber license numbers')
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(Prescriber, self).create(vals_list)
+        self.env['pharmacy.practitioner.register']._verify_prescribers(records.ids)
+        self.env['pharmacy.sale.block']._trigger_rebuild()
+        return records
+    
+    def write(self, vals):
+        res = super(Prescriber, self).write(vals)
+        if 'license_number' in vals:
+            self.env['pharmacy.practitioner.register']._verify_prescribers(self.ids)
+        if {'license_expiry', 'is_verified', 'active'}.intersection(vals):
+            self.env['pharmacy.sale.block']._trigger_rebuild()
+        return res
+    
+    @api.onchange('license_number')
+    def _onchange_license_number(self):
+        status = self.env['pharmacy.practitioner.register']._status_for(self.license_number)
+        if status and status != 'active':
+            return {'warning': {
+                'title': 'Practitioner Register',
+                'message': f'License {self.license_number}: {dict(PRESCRIBER_REGISTER_STATUSES)[status]}.',
+            }}
     
     @api.constrains('license_expiry')
     def _check_license_expiry(self):
@@ -85,6 +112,13 @@ class Prescriber(models.Model):
                 raise ValidationError(f'License for {record.name} has expired. Cannot accept prescriptions from expired licenses.')
     
     def action_verify_prescriber(self):
+        Register = self.env['pharmacy.practitioner.register']
+        if Register._is_loaded():
+            statuses = dict(PRESCRIBER_REGISTER_STATUSES)
+            for record in self:
+                status = Register._status_for(record.license_number)
+                if status != 'active':
+                    raise UserError(f'{record.name} cannot be verified. Register status: {statuses[status]}.')
         self.write({
             'is_verified': True,
             'verification_date': fields.Date.today(),
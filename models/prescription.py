@@ -4,6 +4,8 @@ from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
 from datetime import datetime, timedelta
 
+from .practitioner_register import PRESCRIBER_REGISTER_STATUSES
+
 
 class Prescription(models.Model):
     _name = 'pharmacy.prescription'
@@ -68,6 +70,18 @@ class Prescription(models.Model):
     active = fields.Boolean(string='Active', default=True, tracking=True)
     active = fields.Boolean(string='Active', default=True, tracking=True)
     
+    # Interaction / allergy screening
+    screening_alerts = fields.Text(string='Screening Alerts', compute='_compute_screening_alerts')
+    
+    @api.depends('line_ids.product_id', 'patient_id')
+    def _compute_screening_alerts(self):
+        Interaction = self.env['pharmacy.drug.interaction']
+        for record in self:
+            alerts = Interaction.screen_basket(record.line_ids.product_id.ids, record.patient_id.id)
+            record.screening_alerts = '\n'.join(
+                f"[{alert['severity'].upper()}] {alert['message']}" for alert in alerts
+            ) or False
+    
     @api.depends('prescription_date')
     def _compute_valid_until(self):
         for record in self:
@@ -95,6 +109,9 @@ class Prescription(models.Model):
         return super(Prescription, self).create(vals)
     
     def action_confirm(self):
+        for prescription in self:
+            self.env['pharmacy.sale.block']._check_order_lines(
+                self.env['pos.order.line'], prescription.prescriber_id.id)
         self.write({'state': 'confirmed'})
     
     def action_verify_prescription(self):
@@ -124,6 +141,19 @@ class Prescription(models.Model):
     def action_set_to_draft(self):
         self.write({'state': 'draft'})
     
+    @api.onchange('prescriber_id')
+    def _onchange_prescriber_register(self):
+        # One indexed lookup in the local register, no call to the council
+        if not self.prescriber_id:
+            return
+        status = self.env['pharmacy.practitioner.register']._status_for(self.prescriber_id.license_number)
+        if status and status != 'active':
+            return {'warning': {
+                'title': 'Practitioner Register',
+                'message': f'Register status of {self.prescriber_id.name} ({self.prescriber_id.license_number}): '
+                           f'{dict(PRESCRIBER_REGISTER_STATUSES)[status]}.',
+            }}
+    
     @api.constrains('valid_until')
     def _check_validity(self):
         for record in self:
@@ -16,16 +16,26 @@ class ProductTemplate(models.Model):
     
     available_in_pos = fields.Boolean(string='Available in POS', default=True)
     
-    @api.model
-    def create(self, vals):
-        product = super(ProductTemplate, self).create(vals)
-        if vals.get('is_pharmaceutical'):
-            self.env['pharmacy.product'].create({
-                'name': product.name,
-                'product_id': product.product_variant_id.id,
-                'generic_name': vals.get('name', ''),
-                'active_ingredient': vals.get('description_sale', '') or product.name,
-                'dosage_form': vals.get('dosage_form', 'tablet'),
-                'drug_category': vals.get('drug_category', 'otc'),
-            })
-        return product
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super(ProductTemplate, self).create(vals_list)
+        
+        # Create the pharmacy details of the whole batch in one go
+        pharmaceutical = self.browse()
+        pharmacy_vals_list = []
+        for product, vals in zip(products, vals_list):
+            if vals.get('is_pharmaceutical') and not vals.get('pharmacy_product_id'):
+                pharmaceutical |= product
+                pharmacy_vals_list.append({
+                    'name': product.name,
+                    'product_id': product.product_variant_id.id,
+                    'generic_name': vals.get('name', ''),
+                    'active_ingredient': vals.get('description_sale', '') or product.name,
+                    'dosage_form': vals.get('dosage_form', 'tablet'),
+                    'drug_category': vals.get('drug_category', 'otc'),
+                })
+        if pharmacy_vals_list:
+            pharmacy_products = self.env['pharmacy.product'].create(pharmacy_vals_list)
+            for product, pharmacy in zip(pharmaceutical, pharmacy_products):
+                product.pharmacy_product_id = pharmacy
+        return products
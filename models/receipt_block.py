@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Numbers reserved for the server when a client sends none or an invalid one
+SERVER_BLOCK_SIZE = 20
+# A session may hold at most this many open client blocks (current + refill)
+MAX_OPEN_CLIENT_BLOCKS = 2
+
+
+class ResCompany(models.Model):
+    _inherit = 'res.company'
+
+    pharmacy_receipt_next = fields.Integer(string='Next Receipt Number', default=0, copy=False,
+                                           help='First receipt number not yet reserved by a POS session')
+
+
+class PharmacyReceiptBlock(models.Model):
+    _name = 'pharmacy.receipt.block'
+    _description = 'Reserved Receipt Number Block'
+    _order = 'range_start'
+
+    session_id = fields.Many2one('pos.session', string='Session', required=True, ondelete='cascade', index=True)
+    config_id = fields.Many2one(related='session_id.config_id', string='Point of Sale')
+    company_id = fields.Many2one('res.company', string='Company', required=True)
+    range_start = fields.Integer(string='From', required=True)
+    range_end = fields.Integer(string='To', required=True)
+    next_number = fields.Integer(string='Next Server Number',
+                                 help='Next number handed out by the server; client blocks are tracked by the POS')
+    source = fields.Selection([
+        ('client', 'POS Client'),
+        ('server', 'Server Fallback'),
+    ], string='Used By', default='client', required=True)
+    state = fields.Selection([
+        ('open', 'Open'),
+        ('closed', 'Closed'),
+    ], string='Status', default='open', required=True)
+
+    @api.model
+    def _receipt_sequence(self):
+        return self.env.ref('softlink_pos.seq_pos_receipt_number', raise_if_not_found=False)
+
+    @api.model
+    def _receipt_format(self):
+        """Prefix, padding and suffix used to print receipt numbers"""
+        sequence = self._receipt_sequence()
+        if not sequence:
+            return {'prefix': 'RCP', 'padding': 7, 'suffix': ''}
+        prefix, suffix = sequence.sudo()._get_prefix_suffix()
+        return {'prefix': prefix or '', 'padding': sequence.padding, 'suffix': suffix or ''}
+
+    @api.model
+    def _format_number(self, number, receipt_format=None):
+        receipt_format = receipt_format or self._receipt_format()
+        return f"{receipt_format['prefix']}{number:0{receipt_format['padding']}d}{receipt_format['suffix']}"
+
+    @api.model
+    def _reserve(self, session, size, source='client'):
+        """Reserve ``size`` consecutive numbers for ``session`` in one statement.
+
+        The company counter row is only locked by this UPDATE, i.e. once per
+        block rather than once per order. It never goes below the legacy
+        ``pos.receipt.number`` sequence, so numbering continues after it.
+        """
+        company = session.config_id.company_id
+        sequence = self._receipt_sequence()
+        floor = sequence.sudo().number_next_actual if sequence else 1
+        company.flush_recordset(['pharmacy_receipt_next'])
+        self.env.cr.execute("""
+            UPDATE res_company
+            SET pharmacy_receipt_next = GREATEST(pharmacy_receipt_next, %s) + %s
+            WHERE id = %s
+            RETURNING pharmacy_receipt_next - %s
+        """, (floor, size, company.id, size))
+        start = self.env.cr.fetchone()[0]
+        company.invalidate_recordset(['pharmacy_receipt_next'])
+        return self.sudo().create({
+            'session_id': session.id,
+            'company_id': company.id,
+            'range_start': start,
+            'range_end': start + size - 1,
+            'next_number': start,
+            'source': source,
+        })
+
+    def _client_data(self):
+        return [{'id': block.id, 'start': block.range_start, 'end': block.range_end} for block in self]
+
+    @api.model
+    def _take_server_number(self, session):
+        """Next fallback number for ``session``, reserving a server block as needed"""
+        self.flush_model(['next_number'])
+        for attempt in range(2):
+            self.env.cr.execute("""
+                UPDATE pharmacy_receipt_block
+                SET next_number = next_number + 1
+                WHERE id = (
+                    SELECT id FROM pharmacy_receipt_block
+                    WHERE session_id = %s AND source = 'server' AND state = 'open'
+                      AND next_number <= range_end
+                    ORDER BY range_start
+                    LIMIT 1
+                )
+                RETURNING next_number - 1
+            """, (session.id,))
+            row = self.env.cr.fetchone()
+            if row:
+                self.invalidate_model(['next_number'])
+                return row[0]
+            self._reserve(session, SERVER_BLOCK_SIZE, source='server')
+        raise UserError('Could not reserve a receipt number.')
+
+
+class PosSession(models.Model):
+    _inherit = 'pos.session'
+
+    receipt_block_ids = fields.One2many('pharmacy.receipt.block', 'session_id', string='Receipt Number Blocks')
+
+    def action_pos_session_open(self):
+        res = super(PosSession, self).action_pos_session_open()
+        for session in self:
+            if not session.receipt_block_ids.filtered(lambda block: block.source == 'client'):
+                self.env['pharmacy.receipt.block']._reserve(session, session.config_id.receipt_block_size)
+        return res
+
+    def action_pos_session_closing_control(self, *args, **kwargs):
+        res = super(PosSession, self).action_pos_session_closing_control(*args, **kwargs)
+        self.receipt_block_ids.sudo().write({'state': 'closed'})
+        return res
+
+    def get_receipt_blocks(self):
+        """Open client blocks of the session and the receipt number format"""
+        self.ensure_one()
+        blocks = self.receipt_block_ids.filtered(lambda block: block.source == 'client' and block.state == 'open')
+        return {
+            'blocks': blocks._client_data(),
+            'format': self.env['pharmacy.receipt.block']._receipt_format(),
+            'last_used': self._last_client_receipt_number(),
+        }
+
+    def _last_client_receipt_number(self):
+        """Highest receipt number of the session taken from its client blocks.
+
+        A till that lost its saved state (another browser, cleared storage)
+        resumes after it instead of reusing numbers from the start of a block.
+        """
+        self.ensure_one()
+        self.env['pos.order'].flush_model(['session_id', 'receipt_sequence_number'])
+        self.env.cr.execute("""
+            SELECT MAX(o.receipt_sequence_number)
+            FROM pos_order o
+            JOIN pharmacy_receipt_block b
+              ON b.session_id = o.session_id AND b.source = 'client'
+             AND o.receipt_sequence_number BETWEEN b.range_start AND b.range_end
+            WHERE o.session_id = %s
+        """, (self.id,))
+        return self.env.cr.fetchone()[0] or 0
+
+    def reserve_receipt_block(self):
+        """Refill requested by the POS when its current block runs low"""
+        self.ensure_one()
+        if self.state != 'opened':
+            raise UserError('Receipt numbers can only be reserved for an open session.')
+        Block = self.env['pharmacy.receipt.block']
+        open_blocks = self.receipt_block_ids.filtered(lambda block: block.source == 'client' and block.state == 'open')
+        if len(open_blocks) >= MAX_OPEN_CLIENT_BLOCKS:
+            # The client reports exhausted blocks by asking again; retire the oldest
+            open_blocks[0].sudo().state = 'closed'
+        Block._reserve(self, self.config_id.receipt_block_size)
+        return self.get_receipt_blocks()
+
+
+class PosConfig(models.Model):
+    _inherit = 'pos.config'
+
+    receipt_block_size = fields.Integer(string='Receipt Numbers per Block', default=500,
+                                        help='Receipt numbers reserved at once for a session, used offline by the till')
+
+
+class PosOrder(models.Model):
+    _inherit = 'pos.order'
+
+    receipt_sequence_number = fields.Integer(string='Receipt Sequence', readonly=True, copy=False)
+
+    def init(self):
+        super(PosOrder, self).init()
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS pos_order_receipt_sequence_uniq
+            ON pos_order (company_id, receipt_sequence_number)
+            WHERE receipt_sequence_number IS NOT NULL
+        """)
+
+    @api.model
+    def _order_fields(self, ui_order):
+        order_fields = super(PosOrder, self)._order_fields(ui_order)
+        number = ui_order.get('receipt_sequence_number')
+        session = self.env['pos.session'].browse(order_fields.get('session_id') or ui_order.get('pos_session_id'))
+        # An invalid or reused number would fail the insert on the unique
+        # index and the order could never sync; the server assigns one instead
+        if number and session and self._is_valid_client_receipt_number(session, number):
+            order_fields['receipt_sequence_number'] = number
+        elif number:
+            _logger.warning('Order %s: receipt number %s is outside the session blocks or already used',
+                            ui_order.get('name'), number)
+        return order_fields
+
+    @api.model
+    def _is_valid_client_receipt_number(self, session, number, order_id=None):
+        """Whether ``number`` is in one of the session's client blocks and unused in its company"""
+        in_block = self.env['pharmacy.receipt.block'].sudo().search_count([
+            ('session_id', '=', session.id),
+            ('source', '=', 'client'),
+            ('range_start', '<=', number),
+            ('range_end', '>=', number),
+        ], limit=1)
+        if not in_block:
+            return False
+        return not self.sudo().search_count([
+            ('company_id', '=', session.config_id.company_id.id),
+            ('receipt_sequence_number', '=', number),
+            ('id', '!=', order_id),
+        ], limit=1)
+
+    def _check_client_receipt_number(self):
+        """Whether the number sent by the till is in one of its session's blocks and unused"""
+        self.ensure_one()
+        if not self.receipt_sequence_number:
+            return False
+        return self._is_valid_client_receipt_number(self.session_id, self.receipt_sequence_number, self.id)
+
+    def _assign_receipt_number(self):
+        """Keep the till's number when valid, otherwise take a server fallback number"""
+        Block = self.env['pharmacy.receipt.block']
+        receipt_format = Block._receipt_format()
+        for order in self:
+            if order.receipt_number:
+                continue
+            if not order._check_client_receipt_number():
+                if order.receipt_sequence_number:
+                    _logger.warning('Order %s: receipt number %s is outside the session blocks or already used',
+                                    order.name, order.receipt_sequence_number)
+                order.receipt_sequence_number = Block._take_server_number(order.session_id)
+            order.receipt_number = Block._format_number(order.receipt_sequence_number, receipt_format)
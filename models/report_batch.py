@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+from odoo.tools.pdf import PdfFileReader, PdfFileWriter
+
+_logger = logging.getLogger(__name__)
+
+# Reports that may be printed in batch, by model
+BATCH_REPORTS = {
+    'pos.order': 'softlink_pos.action_report_a4_invoice',
+    'pharmacy.prescription': 'softlink_pos.action_report_prescription',
+}
+# Each worker thread drives its own wkhtmltopdf process; keep the pool small
+MAX_RENDER_WORKERS = 4
+# Block size when hashing and copying generated files into the filestore
+COPY_BLOCK_SIZE = 1024 * 1024
+# Chunk files folded into the merged PDF per pass
+MERGE_GROUP_SIZE = 10
+
+
+def attach_stream(env, values, stream):
+    """Create an attachment from the file in ``stream`` without loading it in memory.
+
+    The file is hashed and copied into the filestore in blocks, and the
+    attachment is created on the stored file. Databases keeping
+    attachments in the database get a plain attachment.
+    """
+    Attachment = env['ir.attachment']
+    stream.seek(0)
+    if Attachment._storage() != 'file':
+        return Attachment.create(dict(values, raw=stream.read()))
+    sha, size = hashlib.sha1(), 0
+    for block in iter(lambda: stream.read(COPY_BLOCK_SIZE), b''):
+        sha.update(block)
+        size += len(block)
+    checksum = sha.hexdigest()
+    fname = f'{checksum[:2]}/{checksum}'
+    full_path = Attachment._full_path(fname)
+    if not os.path.isfile(full_path):
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        stream.seek(0)
+        partial_path = f'{full_path}.{os.getpid()}.part'
+        with open(partial_path, 'wb') as target:
+            shutil.copyfileobj(stream, target, COPY_BLOCK_SIZE)
+        os.replace(partial_path, full_path)
+    return Attachment.create(dict(values, store_fname=fname, file_size=size, checksum=checksum))
+
+
+class PharmacyReportBatch(models.Model):
+    _name = 'pharmacy.report.batch'
+    _description = 'Batch PDF Rendering Job'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(string='Job', required=True, readonly=True, default='New')
+    report_id = fields.Many2one('ir.actions.report', string='Report', required=True, readonly=True, ondelete='cascade')
+    res_model = fields.Char(related='report_id.model', string='Model')
+    res_ids = fields.Text(string='Record IDs', required=True, readonly=True, help='JSON list of record ids to print')
+    record_count = fields.Integer(string='Records', readonly=True)
+
+    chunk_size = fields.Integer(string='Records per Chunk', default=50)
+    max_workers = fields.Integer(string='Parallel Renderers', default=2)
+    chunks_total = fields.Integer(string='Chunks', compute='_compute_progress')
+    chunks_done = fields.Integer(string='Chunks Rendered', compute='_compute_progress')
+    progress = fields.Float(string='Progress', compute='_compute_progress')
+
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Rendering'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='queued', required=True, readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+    duration = fields.Float(string='Duration (s)', readonly=True)
+
+    chunk_attachment_ids = fields.One2many('ir.attachment', 'res_id', string='Rendered Chunks',
+                                           domain=[('res_model', '=', 'pharmacy.report.batch'), ('name', 'like', '-chunk-')])
+    attachment_id = fields.Many2one('ir.attachment', string='Merged PDF', readonly=True)
+
+    user_id = fields.Many2one('res.users', string='Requested By', default=lambda self: self.env.user, readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company, readonly=True)
+
+    @api.depends('record_count', 'chunk_size', 'chunk_attachment_ids', 'state')
+    def _compute_progress(self):
+        for job in self:
+            total = -(-job.record_count // max(job.chunk_size, 1))
+            done = len(job.chunk_attachment_ids)
+            job.chunks_total = total
+            job.chunks_done = done
+            job.progress = 100.0 if job.state == 'done' else (100.0 * done / total if total else 0.0)
+
+    @api.model
+    def create_for_records(self, records):
+        """Queue a batch print of ``records`` and return the job form"""
+        report_xmlid = BATCH_REPORTS.get(records._name)
+        if not report_xmlid:
+            raise UserError(f'Batch printing is not available for {records._description}.')
+        if not records:
+            raise UserError('Select the records to print.')
+        records.check_access('read')
+        report = self.env.ref(report_xmlid)
+        job = self.create({
+            'name': f"{report.name} ({len(records)})",
+            'report_id': report.id,
+            'res_ids': json.dumps(records.ids),
+            'record_count': len(records),
+        })
+        self.env.ref('softlink_pos.ir_cron_report_batch').sudo()._trigger()
+        return {
+            'name': 'Batch Print',
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'view_mode': 'form',
+            'res_id': job.id,
+        }
+
+    def _chunks(self):
+        """Record id chunks as [(index, ids)]"""
+        self.ensure_one()
+        ids = json.loads(self.res_ids)
+        size = max(self.chunk_size, 1)
+        return [(index, ids[start:start + size]) for index, start in enumerate(range(0, len(ids), size))]
+
+    def _chunk_name(self, index):
+        return f"{self.name}-chunk-{index:05d}.pdf"
+
+    def _render_chunk(self, index, ids, uid, context):
+        """Render one chunk in its own cursor and store it as an attachment.
+
+        Runs in a worker thread, so it must not touch the caller's cursor:
+        everything it needs is passed in. Each call commits, so the rendered
+        chunk survives a crash of the job and its memory is released as soon
+        as the PDF is in the filestore.
+        """
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, uid, context)
+            job = env[self._name].browse(self.id)
+            pdf_content, _ = env['ir.actions.report']._render_qweb_pdf(job.report_id, ids)
+            env['ir.attachment'].create({
+                'name': job._chunk_name(index),
+                'raw': pdf_content,
+                'mimetype': 'application/pdf',
+                'res_model': self._name,
+                'res_id': job.id,
+            })
+        return index
+
+    def _merge_chunks(self):
+        """Merge the chunk PDFs into the final attachment, reading from the filestore.
+
+        Chunks are folded into a temporary file MERGE_GROUP_SIZE at a time,
+        so only one group of chunk files is open at once. qpdf is used when
+        installed, as it streams pages instead of holding them in memory.
+        """
+        self.ensure_one()
+        chunks = self.chunk_attachment_ids.sorted('name')
+        paths = []
+        for chunk in chunks:
+            if not chunk.store_fname:
+                raise UserError(f'Chunk {chunk.name} is not in the filestore.')
+            paths.append(chunk._full_path(chunk.store_fname))
+        qpdf = shutil.which('qpdf')
+        with tempfile.TemporaryDirectory() as directory:
+            merged = None
+            for index, group in enumerate(split_every(MERGE_GROUP_SIZE, paths, list)):
+                target = os.path.join(directory, f'merged-{index}.pdf')
+                self._merge_files(([merged] if merged else []) + group, target, qpdf)
+                if merged:
+                    os.unlink(merged)
+                merged = target
+            with open(merged, 'rb') as output:
+                attachment = self._attach_file(f"{self.name}.pdf", output)
+        chunks.unlink()
+        return attachment
+
+    @api.model
+    def _merge_files(self, paths, target, qpdf=None):
+        """Concatenate the PDF files at ``paths`` into ``target``"""
+        if qpdf:
+            # Exit code 3 means warnings only; the output is complete
+            result = subprocess.run([qpdf, '--empty', '--pages', *paths, '--', target], capture_output=True)
+            if result.returncode not in (0, 3):
+                raise UserError(f'Merging the PDF chunks failed: {result.stderr.decode(errors="replace")}')
+            return
+        writer = PdfFileWriter()
+        streams = []
+        try:
+            for path in paths:
+                stream = open(path, 'rb')
+                streams.append(stream)
+                reader = PdfFileReader(stream, strict=False)
+                for page in range(reader.getNumPages()):
+                    writer.addPage(reader.getPage(page))
+            with open(target, 'wb') as output:
+                writer.write(output)
+        finally:
+            for stream in streams:
+                stream.close()
+
+    def _attach_file(self, name, stream):
+        """Attach the PDF in ``stream`` to the job without loading it in memory"""
+        return attach_stream(self.env, {
+            'name': name,
+            'mimetype': 'application/pdf',
+            'res_model': self._name,
+            'res_id': self.id,
+        }, stream)
+
+    def _run(self):
+        """Render the missing chunks in a bounded pool, then merge them"""
+        self.ensure_one()
+        start = time.perf_counter()
+        self.write({'state': 'running', 'error': False})
+        self.env.cr.commit()
+
+        rendered = set(self.chunk_attachment_ids.mapped('name'))
+        pending = [(index, ids) for index, ids in self._chunks() if self._chunk_name(index) not in rendered]
+        workers = max(1, min(self.max_workers, MAX_RENDER_WORKERS, len(pending) or 1))
+        uid = self.user_id.id
+        context = dict(self.env.context, allowed_company_ids=[self.company_id.id])
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pharmacy_report_batch') as pool:
+                for index in pool.map(lambda chunk: self._render_chunk(*chunk, uid, context), pending):
+                    _logger.info('%s: rendered chunk %s of %s', self.name, index + 1, len(pending))
+            # The workers committed their chunks after this transaction's
+            # snapshot was taken; start a new one to see them
+            self.env.cr.commit()
+            self.invalidate_recordset(['chunk_attachment_ids'])
+            attachment = self._merge_chunks()
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.exception('Batch PDF job %s failed', self.name)
+            self.write({'state': 'failed', 'error': str(e)})
+            self.env.cr.commit()
+            return
+        self.write({
+            'state': 'done',
+            'attachment_id': attachment.id,
+            'duration': self.duration + time.perf_counter() - start,
+        })
+        self.env.cr.commit()
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Process queued jobs one at a time, oldest first.
+
+        Jobs are only run by this cron, which never runs twice at once, so a
+        job still marked running was interrupted; it is resumed from the
+        chunks it had already rendered.
+        """
+        self.search([('state', '=', 'running')]).write({'state': 'queued'})
+        self.env.cr.commit()
+        for job in self.search([('state', '=', 'queued')], order='id'):
+            job._run()
+
+    def action_retry(self):
+        """Requeue failed jobs; chunks already rendered are kept"""
+        self.filtered(lambda job: job.state == 'failed').write({'state': 'queued'})
+        self.env.ref('softlink_pos.ir_cron_report_batch').sudo()._trigger()
+
+    def action_download(self):
+        self.ensure_one()
+        if not self.attachment_id:
+            raise UserError('The merged PDF is not ready yet.')
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.attachment_id.id}?download=true',
+            'target': 'self',
+        }
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+BLOCKLIST_NOTIFICATION = 'softlink_pos.blocklist'
+
+BLOCK_REASONS = [
+    ('registration_expired', 'PPB Registration Expired'),
+    ('lot_expired', 'Lot Expired'),
+    ('lot_recalled', 'Lot Recalled'),
+    ('cold_chain', 'Cold Chain Compromised'),
+    ('license_expired', 'Prescriber License Expired'),
+    ('unverified', 'Prescriber Not Verified'),
+]
+
+
+class PharmacySaleBlock(models.Model):
+    _name = 'pharmacy.sale.block'
+    _description = 'Sale-Time Blocklist Entry'
+    _order = 'kind, reason, id'
+    _rec_name = 'reason'
+
+    kind = fields.Selection([
+        ('product', 'Product'),
+        ('lot', 'Lot'),
+        ('prescriber', 'Prescriber'),
+    ], string='Blocks', required=True, readonly=True)
+    reason = fields.Selection(BLOCK_REASONS, string='Reason', required=True, readonly=True)
+    product_id = fields.Many2one('product.product', string='Product', readonly=True, index='btree_not_null')
+    lot_id = fields.Many2one('stock.lot', string='Lot', readonly=True, ondelete='cascade', index='btree_not_null')
+    prescriber_id = fields.Many2one('pharmacy.prescriber', string='Prescriber', readonly=True,
+                                    ondelete='cascade', index='btree_not_null')
+
+    @api.model
+    def _compute_blocklist(self):
+        """{(kind, product_id, lot_id, prescriber_id): reason} for everything that may not be sold now.
+
+        One query over products, in-stock lots and prescribers. Lots without
+        stock cannot be scanned, so they are left out to keep the list small.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT 'product', ph.product_id, NULL::integer, NULL::integer, 'registration_expired'
+            FROM pharmacy_product ph
+            WHERE ph.registration_expiry < CURRENT_DATE AND ph.product_id IS NOT NULL
+            UNION ALL
+            SELECT 'lot', lot.product_id, lot.id, NULL,
+                   CASE WHEN lot.is_recalled THEN 'lot_recalled'
+                        WHEN lot.cold_chain_compromised THEN 'cold_chain'
+                        ELSE 'lot_expired'
+                   END
+            FROM stock_lot lot
+            WHERE (lot.expiry_date < CURRENT_DATE OR lot.is_recalled OR lot.cold_chain_compromised)
+              AND EXISTS (
+                  SELECT 1
+                  FROM stock_quant q
+                  JOIN stock_location loc ON loc.id = q.location_id
+                  WHERE q.lot_id = lot.id AND loc.usage = 'internal' AND q.quantity > 0
+              )
+            UNION ALL
+            SELECT 'prescriber', NULL, NULL, pr.id,
+                   CASE WHEN pr.license_expiry < CURRENT_DATE THEN 'license_expired' ELSE 'unverified' END
+            FROM pharmacy_prescriber pr
+            WHERE pr.active AND (pr.license_expiry < CURRENT_DATE OR pr.is_verified IS NOT TRUE)
+        """)
+        return {tuple(row[:4]): row[4] for row in self.env.cr.fetchall()}
+
+    def _client_data(self):
+        return [{
+            'kind': block.kind,
+            'product_id': block.product_id.id,
+            'lot_name': block.lot_id.name or False,
+            'prescriber_id': block.prescriber_id.id,
+            'reason': block.reason,
+        } for block in self]
+
+    @api.model
+    def _cron_rebuild(self):
+        """Rebuild the blocklist and push what changed to open tills"""
+        wanted = self._compute_blocklist()
+        existing = {
+            (block.kind, block.product_id.id or None, block.lot_id.id or None, block.prescriber_id.id or None): block
+            for block in self.search([])
+        }
+        removed = self.browse([block.id for key, block in existing.items() if key not in wanted])
+        removed_data = removed._client_data()
+        removed.unlink()
+
+        to_create, by_reason = [], {}
+        for key, reason in wanted.items():
+            block = existing.get(key)
+            if block and block.reason == reason:
+                continue
+            if block:
+                by_reason.setdefault(reason, []).append(block.id)
+            else:
+                kind, product_id, lot_id, prescriber_id = key
+                to_create.append({
+                    'kind': kind,
+                    'reason': reason,
+                    'product_id': product_id,
+                    'lot_id': lot_id,
+                    'prescriber_id': prescriber_id,
+                })
+        changed = self.browse()
+        for reason, block_ids in by_reason.items():
+            blocks = self.browse(block_ids)
+            blocks.write({'reason': reason})
+            changed |= blocks
+        changed |= self.create(to_create)
+
+        _logger.info('Sale blocklist: %s added or changed, %s removed', len(changed), len(removed_data))
+        if changed or removed_data:
+            self.env['pos.config'].sudo().search([])._pharmacy_notify(BLOCKLIST_NOTIFICATION, {
+                'changed': changed._client_data(),
+                'removed': removed_data,
+            })
+
+    @api.model
+    def _trigger_rebuild(self):
+        """Schedule a rebuild after a change to the blocking data, outside the writing transaction"""
+        cron = self.env.ref('softlink_pos.ir_cron_sale_blocklist', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _check_order_lines(self, lines, prescriber_id=False):
+        """Raise if a product or lot of ``lines`` or the prescriber is blocked"""
+        # The till identifies lots by name (pack lot lines), the backend by lot_id
+        lot_names = lines.pack_lot_ids.mapped('lot_name')
+        domain = ['|', '|',
+                  '&', ('kind', '=', 'product'), ('product_id', 'in', lines.product_id.ids),
+                  '&', ('kind', '=', 'lot'), ('lot_id', 'in', lines.lot_id.ids),
+                  '&', '&', ('kind', '=', 'lot'), ('product_id', 'in', lines.product_id.ids),
+                  ('lot_id.name', 'in', lot_names)]
+        if prescriber_id:
+            domain = ['|', '&', ('kind', '=', 'prescriber'), ('prescriber_id', '=', prescriber_id)] + domain
+        blocks = self.sudo().search(domain)
+        if blocks:
+            reasons = dict(BLOCK_REASONS)
+            details = ', '.join(
+                f"{(block.lot_id or block.product_id or block.prescriber_id).display_name} ({reasons[block.reason]})"
+                for block in blocks
+            )
+            raise UserError(f'Cannot sell or dispense: {details}.')
+
+
+class PosConfig(models.Model):
+    _inherit = 'pos.config'
+
+    def get_pharmacy_blocklist(self):
+        """Full blocklist for a till; later changes are pushed on the pharmacy bus channel"""
+        self.ensure_one()
+        return {
+            'channel': self._pharmacy_bus_channel(),
+            'blocks': self.env['pharmacy.sale.block'].sudo().search([])._client_data(),
+        }
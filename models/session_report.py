@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+REPORT_LINE_KINDS = [
+    ('controlled', 'Controlled Drug'),
+    ('insurer', 'Insurer'),
+    ('payment', 'Payment Method'),
+]
+
+
+class PharmacySessionReport(models.Model):
+    """Pharmacy Z-report, stored once when a session closes and never changed"""
+    _name = 'pharmacy.session.report'
+    _description = 'Pharmacy Session Z-Report'
+    _order = 'generated_at desc, id desc'
+    _rec_name = 'session_id'
+
+    session_id = fields.Many2one('pos.session', string='Session', required=True, readonly=True, ondelete='restrict')
+    config_id = fields.Many2one('pos.config', string='Point of Sale', readonly=True, index=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+    pharmacist_id = fields.Many2one('res.users', string='Pharmacist on Duty', readonly=True)
+    start_at = fields.Datetime(string='Opened', readonly=True)
+    stop_at = fields.Datetime(string='Closed', readonly=True)
+    generated_at = fields.Datetime(string='Generated On', readonly=True)
+
+    # Sales
+    order_count = fields.Integer(string='Orders', readonly=True)
+    amount_total = fields.Monetary(string='Total Sales', readonly=True)
+    amount_tax = fields.Monetary(string='Tax', readonly=True)
+    refund_count = fields.Integer(string='Refunds', readonly=True)
+    refund_total = fields.Monetary(string='Refunded', readonly=True)
+
+    # Dispensing
+    prescription_count = fields.Integer(string='Prescriptions Dispensed', readonly=True)
+    controlled_qty = fields.Float(string='Controlled Drug Quantity', readonly=True)
+
+    # Payments
+    cash_total = fields.Monetary(string='Cash', readonly=True)
+    mpesa_total = fields.Monetary(string='M-Pesa', readonly=True)
+    other_total = fields.Monetary(string='Other Payments', readonly=True)
+    insurance_order_count = fields.Integer(string='Insurance Orders', readonly=True)
+    insurance_total = fields.Monetary(string='Insurance Amount', readonly=True)
+
+    # KRA eTIMS
+    etims_invoice_count = fields.Integer(string='eTIMS Invoices', readonly=True)
+    etims_pending_count = fields.Integer(string='Pending Submission', readonly=True)
+    etims_first_counter = fields.Integer(string='First Invoice Counter', readonly=True)
+    etims_last_counter = fields.Integer(string='Last Invoice Counter', readonly=True)
+
+    line_ids = fields.One2many('pharmacy.session.report.line', 'report_id', string='Details', readonly=True)
+    controlled_line_ids = fields.One2many('pharmacy.session.report.line', 'report_id', string='Controlled Drugs',
+                                          domain=[('kind', '=', 'controlled')], readonly=True)
+    insurer_line_ids = fields.One2many('pharmacy.session.report.line', 'report_id', string='Insurers',
+                                       domain=[('kind', '=', 'insurer')], readonly=True)
+    payment_line_ids = fields.One2many('pharmacy.session.report.line', 'report_id', string='Payment Methods',
+                                       domain=[('kind', '=', 'payment')], readonly=True)
+
+    _sql_constraints = [
+        ('session_uniq', 'unique(session_id)', 'A session has a single Z-report.'),
+    ]
+
+    @api.model
+    def _read_session_figures(self, session):
+        """Every figure of the report in one query over the session's paid orders.
+
+        The orders are read once into a CTE; totals, controlled drug lines,
+        insurers and payment methods are grouped from it, so the cost grows
+        with the session's rows and not with the number of computed fields.
+        The totals row carries its figures as JSON keyed by report field.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            WITH orders AS MATERIALIZED (
+                SELECT o.id, o.amount_total, o.amount_tax, o.prescription_id,
+                       o.insurance_claim, TRIM(o.insurance_company) AS insurer, o.insurance_amount,
+                       o.kra_invoice_number IS NOT NULL AS etims_invoiced, o.kra_submitted, o.kra_invoice_counter
+                FROM pos_order o
+                WHERE o.session_id = %s
+                  AND o.state IN ('paid', 'done', 'invoiced')
+            ), totals AS (
+                SELECT COUNT(*) AS order_count,
+                       COALESCE(SUM(amount_total), 0) AS amount_total,
+                       COALESCE(SUM(amount_tax), 0) AS amount_tax,
+                       COUNT(*) FILTER (WHERE amount_total < 0) AS refund_count,
+                       COALESCE(-SUM(amount_total) FILTER (WHERE amount_total < 0), 0) AS refund_total,
+                       COUNT(DISTINCT prescription_id) AS prescription_count,
+                       COUNT(*) FILTER (WHERE etims_invoiced) AS etims_invoice_count,
+                       COUNT(*) FILTER (WHERE etims_invoiced AND kra_submitted IS NOT TRUE) AS etims_pending_count,
+                       MIN(kra_invoice_counter) FILTER (WHERE etims_invoiced) AS etims_first_counter,
+                       MAX(kra_invoice_counter) FILTER (WHERE etims_invoiced) AS etims_last_counter
+                FROM orders
+            )
+            SELECT 'totals', NULL::integer, NULL::varchar, NULL::bigint, NULL::numeric, NULL::numeric, to_jsonb(t)
+            FROM totals t
+            UNION ALL
+            SELECT 'controlled', l.product_id, NULL, COUNT(DISTINCT o.id), SUM(l.qty), SUM(l.price_subtotal_incl), NULL
+            FROM orders o
+            JOIN pos_order_line l ON l.order_id = o.id
+            JOIN product_product pp ON pp.id = l.product_id
+            JOIN product_template pt ON pt.id = pp.product_tmpl_id
+            JOIN pharmacy_product ph ON ph.id = pt.pharmacy_product_id
+            WHERE ph.drug_category = 'controlled'
+            GROUP BY l.product_id
+            UNION ALL
+            SELECT 'insurer', NULL, o.insurer, COUNT(*), NULL, SUM(o.insurance_amount), NULL
+            FROM orders o
+            WHERE o.insurance_claim AND COALESCE(o.insurer, '') != ''
+            GROUP BY o.insurer
+            UNION ALL
+            SELECT 'payment', p.payment_method_id, p.payment_type, COUNT(*), NULL, SUM(p.amount), NULL
+            FROM orders o
+            JOIN pos_payment p ON p.pos_order_id = o.id
+            GROUP BY p.payment_method_id, p.payment_type
+        """, (session.id,))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _prepare_report_values(self, session):
+        values = {
+            'session_id': session.id,
+            'config_id': session.config_id.id,
+            'company_id': session.company_id.id,
+            'currency_id': session.currency_id.id,
+            'pharmacist_id': session.pharmacist_id.id,
+            'start_at': session.start_at,
+            'stop_at': session.stop_at,
+            'generated_at': fields.Datetime.now(),
+            'controlled_qty': 0.0,
+            'cash_total': 0.0,
+            'mpesa_total': 0.0,
+            'other_total': 0.0,
+            'insurance_order_count': 0,
+            'insurance_total': 0.0,
+        }
+        lines = []
+        for kind, res_id, label, count, quantity, amount, totals in self._read_session_figures(session):
+            if kind == 'totals':
+                values.update({fname: value or 0 for fname, value in totals.items()})
+                continue
+            line = {'kind': kind, 'order_count': count, 'quantity': float(quantity or 0), 'amount': float(amount or 0)}
+            if kind == 'controlled':
+                line['product_id'] = res_id
+                values['controlled_qty'] += line['quantity']
+            elif kind == 'insurer':
+                line['name'] = label
+                values['insurance_order_count'] += count
+                values['insurance_total'] += line['amount']
+            else:
+                line.update({'payment_method_id': res_id, 'payment_type': label})
+                total = {'cash': 'cash_total', 'mpesa': 'mpesa_total'}.get(label, 'other_total')
+                values[total] += line['amount']
+            lines.append(line)
+        values['line_ids'] = [(0, 0, line) for line in lines]
+        return values
+
+    @api.model
+    def _generate(self, sessions):
+        """Store the Z-report of closed pharmacy sessions that do not have one yet"""
+        done = set(self.sudo().search([('session_id', 'in', sessions.ids)]).session_id.ids)
+        sessions = sessions.filtered(
+            lambda session: session.state == 'closed' and session.id not in done and session.config_id.is_pharmacy_pos
+        )
+        reports = self.sudo().create([self._prepare_report_values(session) for session in sessions])
+        for report in reports:
+            _logger.info('Stored Z-report of session %s: %s orders', report.session_id.name, report.order_count)
+        return reports
+
+    def write(self, vals):
+        raise UserError('Session Z-reports cannot be modified.')
+
+    def unlink(self):
+        raise UserError('Session Z-reports cannot be deleted.')
+
+
+class PharmacySessionReportLine(models.Model):
+    _name = 'pharmacy.session.report.line'
+    _description = 'Pharmacy Session Z-Report Line'
+    _order = 'report_id, kind, amount desc, id'
+
+    report_id = fields.Many2one('pharmacy.session.report', string='Report', required=True,
+                                ondelete='cascade', index=True, readonly=True)
+    currency_id = fields.Many2one(related='report_id.currency_id')
+    kind = fields.Selection(REPORT_LINE_KINDS, string='Section', required=True, readonly=True)
+    name = fields.Char(string='Insurer', readonly=True)
+    product_id = fields.Many2one('product.product', string='Product', readonly=True)
+    payment_method_id = fields.Many2one('pos.payment.method', string='Payment Method', readonly=True)
+    payment_type = fields.Selection(
+        selection=lambda self: self.env['pos.payment.method']._fields['payment_type'].selection,
+        string='Payment Type', readonly=True)
+    order_count = fields.Integer(string='Count', readonly=True)
+    quantity = fields.Float(string='Quantity', readonly=True)
+    amount = fields.Monetary(string='Amount', readonly=True)
+
+    def write(self, vals):
+        raise UserError('Session Z-reports cannot be modified.')
+
+    def unlink(self):
+        raise UserError('Session Z-reports cannot be deleted.')
+
+
+class PosSession(models.Model):
+    _inherit = 'pos.session'
+
+    def _validate_session(self, *args, **kwargs):
+        res = super(PosSession, self)._validate_session(*args, **kwargs)
+        # Closing may stop at a balancing wizard; only closed sessions get a report
+        self.env['pharmacy.session.report']._generate(self)
+        return res
+
+    def action_open_pharmacy_report(self):
+        """Open the session's Z-report, storing it first for sessions closed before reports existed"""
+        self.ensure_one()
+        if self.state != 'closed':
+            raise UserError('The Z-report is produced when the session is closed.')
+        Report = self.env['pharmacy.session.report']
+        report = Report.search([('session_id', '=', self.id)], limit=1) or Report._generate(self)
+        if not report:
+            raise UserError('Z-reports are only kept for pharmacy points of sale.')
+        return {
+            'name': 'Session Z-Report',
+            'type': 'ir.actions.act_window',
+            'res_model': 'pharmacy.session.report',
+            'view_mode': 'form',
+            'res_id': report.id,
+        }
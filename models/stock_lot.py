@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
+from odoo.exceptions import UserError
 from datetime import datetime, timedelta
 
+RECALL_QUARANTINE_LOCATION = 'Recall Quarantine'
+
 
 class StockLot(models.Model):
     _inherit = 'stock.lot'
@@ -13,8 +16,17 @@ class StockLot(models.Model):
     is_near_expiry = fields.Boolean(string='Near Expiry', compute='_compute_expiry_status', store=True)
     days_to_expiry = fields.Integer(string='Days to Expiry', compute='_compute_expiry_status', store=True)
     
-    batch_number = fields.Char(string='Batch Number', copy=False)
-    supplier_batch_no = fields.Char(string='Supplier Batch Number')
+    batch_number = fields.Char(string='Batch Number', copy=False, index='btree_not_null')
+    supplier_batch_no = fields.Char(string='Supplier Batch Number', index='btree_not_null')
+    
+    # Recall
+    is_recalled = fields.Boolean(string='Recalled', default=False, tracking=True)
+    recall_date = fields.Datetime(string='Recall Date', readonly=True)
+    recall_reference = fields.Char(string='Recall Reference', readonly=True)
+    
+    # Cold chain
+    cold_chain_compromised = fields.Boolean(string='Cold Chain Compromised', readonly=True, tracking=True,
+                                            help='Stored outside the allowed temperature range for longer than tolerated')
     
     # Pharmacy specific
     pharmacy_product_id = fields.Many2one('pharmacy.product', string='Pharmacy Product', 
@@ -22,9 +34,14 @@ class StockLot(models.Model):
     
     @api.depends('product_id')
     def _compute_pharmacy_product(self):
+        # One search for the whole batch; the lowest id wins as with search(limit=1)
+        pharmacy_by_product = {}
+        if self.product_id:
+            for pharmacy in self.env['pharmacy.product'].search(
+                    [('product_id', 'in', self.product_id.ids)], order='id desc'):
+                pharmacy_by_product[pharmacy.product_id.id] = pharmacy.id
         for record in self:
-            pharmacy = self.env['pharmacy.product'].search([('product_id', '=', record.product_id.id)], limit=1)
-            record.pharmacy_product_id = pharmacy.id if pharmacy else False
+            record.pharmacy_product_id = pharmacy_by_product.get(record.product_id.id, False)
     
     @api.depends('expiry_date')
     def _compute_expiry_status(self):
@@ -45,6 +62,135 @@ class StockLot(models.Model):
                 record.is_expired = False
                 record.is_near_expiry = False
     
+    def init(self):
+        # Lots sold through the standard POS lot selection are only linked by name
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS pos_pack_operation_lot_lot_name_idx
+            ON pos_pack_operation_lot (lot_name)
+        """)
+    
+    def write(self, vals):
+        res = super(StockLot, self).write(vals)
+        if {'expiry_date', 'is_recalled', 'cold_chain_compromised'}.intersection(vals):
+            self.env['pharmacy.sale.block']._trigger_rebuild()
+        return res
+    
+    @api.model
+    def _search_recalled_batch(self, batch, product_id=False):
+        """Find lots matching a recalled batch by lot name, batch or supplier batch number"""
+        domain = ['|', '|',
+                  ('name', '=', batch),
+                  ('batch_number', '=', batch),
+                  ('supplier_batch_no', '=', batch)]
+        if product_id:
+            domain = [('product_id', '=', product_id)] + domain
+        return self.search(domain)
+    
+    def _get_recall_trace(self):
+        """Return every dispense of these lots as a list of dicts.
+
+        A single indexed query covers POS lines linked through ``lot_id``,
+        standard POS lot selections (by lot name) and manual controlled drugs
+        register entries that are not attached to a POS order.
+        """
+        if not self:
+            return []
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT ol.lot_id, o.id AS pos_order_id, o.date_order AS date, o.patient_id,
+                   COALESCE(p.full_name, o.patient_name) AS patient_name,
+                   COALESCE(p.phone, o.patient_phone) AS phone,
+                   ol.product_id, ol.qty AS quantity, 'pos' AS source
+            FROM pos_order_line ol
+            JOIN pos_order o ON o.id = ol.order_id
+            LEFT JOIN pharmacy_patient p ON p.id = o.patient_id
+            WHERE ol.lot_id IN %(lot_ids)s
+              AND o.state IN ('paid', 'done', 'invoiced')
+            UNION ALL
+            SELECT lot.id, o.id, o.date_order, o.patient_id,
+                   COALESCE(p.full_name, o.patient_name),
+                   COALESCE(p.phone, o.patient_phone),
+                   ol.product_id, ol.qty, 'pos'
+            FROM stock_lot lot
+            JOIN pos_pack_operation_lot pl ON pl.lot_name = lot.name
+            JOIN pos_order_line ol ON ol.id = pl.pos_order_line_id AND ol.product_id = lot.product_id
+            JOIN pos_order o ON o.id = ol.order_id
+            LEFT JOIN pharmacy_patient p ON p.id = o.patient_id
+            WHERE lot.id IN %(lot_ids)s
+              AND ol.lot_id IS NULL
+              AND o.state IN ('paid', 'done', 'invoiced')
+            UNION ALL
+            SELECT r.lot_id, NULL, r.date, r.patient_id,
+                   COALESCE(p.full_name, r.patient_name),
+                   p.phone,
+                   r.product_id, r.quantity, 'register'
+            FROM pharmacy_controlled_drugs_register r
+            LEFT JOIN pharmacy_patient p ON p.id = r.patient_id
+            WHERE r.lot_id IN %(lot_ids)s
+              AND r.pos_order_id IS NULL
+            ORDER BY date DESC
+        """, {'lot_ids': tuple(self.ids)})
+        return self.env.cr.dictfetchall()
+    
+    @api.model
+    def _get_recall_quarantine_location(self, warehouse):
+        Location = self.env['stock.location']
+        location = Location.search([
+            ('name', '=', RECALL_QUARANTINE_LOCATION),
+            ('location_id', '=', warehouse.view_location_id.id),
+        ], limit=1)
+        if not location:
+            location = Location.create({
+                'name': RECALL_QUARANTINE_LOCATION,
+                'usage': 'internal',
+                'location_id': warehouse.view_location_id.id,
+                'company_id': warehouse.company_id.id,
+            })
+        return location
+    
+    def action_recall(self, reference=False):
+        """Flag lots as recalled and move their remaining stock into quarantine"""
+        self.write({
+            'is_recalled': True,
+            'recall_date': fields.Datetime.now(),
+            'recall_reference': reference or False,
+        })
+        quants = self.env['stock.quant'].search([
+            ('lot_id', 'in', self.ids),
+            ('location_id.usage', '=', 'internal'),
+            ('location_id.name', '!=', RECALL_QUARANTINE_LOCATION),
+            ('quantity', '>', 0),
+        ])
+        moves = self.env['stock.move']
+        for quant in quants:
+            warehouse = quant.location_id.warehouse_id
+            if not warehouse:
+                raise UserError(f'Cannot quarantine lot {quant.lot_id.name}: '
+                                f'location {quant.location_id.display_name} has no warehouse.')
+            destination = self._get_recall_quarantine_location(warehouse)
+            moves |= self.env['stock.move'].create({
+                'name': f'Recall {reference or quant.lot_id.name}',
+                'product_id': quant.product_id.id,
+                'product_uom': quant.product_id.uom_id.id,
+                'product_uom_qty': quant.quantity,
+                'location_id': quant.location_id.id,
+                'location_dest_id': destination.id,
+                'company_id': quant.company_id.id,
+                'picked': True,
+                'move_line_ids': [(0, 0, {
+                    'product_id': quant.product_id.id,
+                    'product_uom_id': quant.product_id.uom_id.id,
+                    'lot_id': quant.lot_id.id,
+                    'quantity': quant.quantity,
+                    'location_id': quant.location_id.id,
+                    'location_dest_id': destination.id,
+                })],
+            })
+        if moves:
+            moves._action_confirm()
+            moves._action_done()
+        return moves
+    
     @api.constrains('expiry_date')
     def _check_expiry_date(self):
         for record in self:
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+
+class WorkerCache:
+    """Per-worker cache of one lookup, invalidated without touching the registry caches.
+
+    Entries are kept per database. Each cache has a PostgreSQL sequence as
+    its version: invalidating drops the given keys in this worker and, once
+    the transaction commits, bumps the sequence. Other workers read the
+    version once per cursor and drop this cache only when it moved, so
+    unrelated ormcaches survive catalogue and settings edits.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.sequence = f'softlink_pos_cache_{name}'
+        self._lock = threading.Lock()
+        self._databases = {}
+
+    def init(self, cr):
+        """Create the version sequence; call from the owning model's init()"""
+        cr.execute(f'CREATE SEQUENCE IF NOT EXISTS {self.sequence}')
+
+    def _entries(self, cr):
+        version = cr.cache.get(self.sequence)
+        if version is None:
+            cr.execute(f'SELECT last_value FROM {self.sequence}')
+            version = cr.cache[self.sequence] = cr.fetchone()[0]
+        with self._lock:
+            cached_version, entries = self._databases.get(cr.dbname, (None, None))
+            if cached_version != version:
+                entries = {}
+                self._databases[cr.dbname] = (version, entries)
+        return entries
+
+    def get(self, env, key, loader):
+        """Cached value of ``key``, computed by ``loader()`` when missing. Do not mutate it."""
+        entries = self._entries(env.cr)
+        try:
+            return entries[key]
+        except KeyError:
+            value = entries[key] = loader()
+            return value
+
+    def invalidate(self, env, keys=None):
+        """Drop ``keys`` (all entries when None) here, and the whole cache in other workers after commit"""
+        cr, dbname = env.cr, env.cr.dbname
+
+        def drop():
+            with self._lock:
+                version, entries = self._databases.get(dbname, (None, {}))
+                if keys is None:
+                    entries.clear()
+                else:
+                    for key in keys:
+                        entries.pop(key, None)
+
+        drop()
+        # Entries reloaded from this transaction's rows are wrong after a rollback
+        cr.postrollback.add(drop)
+        # One bump per transaction, however many records it changed
+        if self.sequence in cr.postcommit.data:
+            return
+        cr.postcommit.data[self.sequence] = True
+
+        @cr.postcommit.add
+        def bump():
+            with self._lock:
+                self._databases.pop(dbname, None)
+            # Bumped after commit: a worker reloading earlier would cache
+            # the old rows under the new version
+            with env.registry.cursor() as bump_cr:
+                bump_cr.execute('SELECT nextval(%s)', (self.sequence,))
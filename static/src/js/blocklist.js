@@ -0,0 +1,97 @@
+/** @odoo-module **/
+
+import { Order } from "@point_of_sale/app/store/models";
+import { PosStore } from "@point_of_sale/app/store/pos_store";
+import { ErrorPopup } from "@point_of_sale/app/errors/popups/error_popup";
+import { _t } from "@web/core/l10n/translation";
+import { patch } from "@web/core/utils/patch";
+
+// Must match BLOCKLIST_NOTIFICATION in models/sale_blocklist.py
+const BLOCKLIST_NOTIFICATION = "softlink_pos.blocklist";
+
+function blockKey(block) {
+    if (block.kind === "lot") {
+        return `${block.product_id}|${block.lot_name}`;
+    }
+    return block.kind === "product" ? block.product_id : block.prescriber_id;
+}
+
+patch(PosStore.prototype, {
+    async after_load_server_data() {
+        await super.after_load_server_data(...arguments);
+        // One Map per kind so every check is a single lookup
+        this.saleBlocklist = { product: new Map(), lot: new Map(), prescriber: new Map() };
+        try {
+            const data = await this.env.services.orm.call("pos.config", "get_pharmacy_blocklist", [[this.config.id]]);
+            this._applyBlocklistDelta({ changed: data.blocks, removed: [] });
+            const bus = this.env.services.bus_service;
+            bus.addChannel(data.channel);
+            bus.subscribe(BLOCKLIST_NOTIFICATION, (payload) => this._applyBlocklistDelta(payload));
+        } catch {
+            // Offline: the server still rejects blocked items when the order is synced
+        }
+    },
+
+    _applyBlocklistDelta({ changed, removed }) {
+        for (const block of removed) {
+            this.saleBlocklist[block.kind].delete(blockKey(block));
+        }
+        for (const block of changed) {
+            this.saleBlocklist[block.kind].set(blockKey(block), block.reason);
+        }
+    },
+
+    productBlockReason(productId) {
+        return this.saleBlocklist && this.saleBlocklist.product.get(productId);
+    },
+
+    lotBlockReason(productId, lotName) {
+        return this.saleBlocklist && this.saleBlocklist.lot.get(`${productId}|${lotName}`);
+    },
+
+    prescriberBlockReason(prescriberId) {
+        return this.saleBlocklist && prescriberId && this.saleBlocklist.prescriber.get(prescriberId);
+    },
+
+    async addProductToCurrentOrder(product, options = {}) {
+        if (this.config.block_expired_products && this.productBlockReason(product.id)) {
+            await this.popup.add(ErrorPopup, {
+                title: _t("Product Blocked"),
+                body: _t("%s cannot be sold: its PPB registration has expired.", product.display_name),
+            });
+            return;
+        }
+        return super.addProductToCurrentOrder(...arguments);
+    },
+});
+
+patch(Order.prototype, {
+    setPrescription(prescription) {
+        super.setPrescription(...arguments);
+        this.prescriber_id = prescription && prescription.prescriber_id ? prescription.prescriber_id[0] : null;
+    },
+
+    /**
+     * Names of the lines and prescriber the blocklist rejects, checked locally.
+     */
+    getBlockedItems() {
+        const blocked = [];
+        if (this.pos.config.block_expired_products) {
+            for (const line of this.get_orderlines()) {
+                const product = line.get_product();
+                if (this.pos.productBlockReason(product.id)) {
+                    blocked.push(product.display_name);
+                }
+                for (const lot of line.get_lot_lines()) {
+                    if (this.pos.lotBlockReason(product.id, lot.lot_name)) {
+                        blocked.push(`${product.display_name} (${lot.lot_name})`);
+                    }
+                }
+            }
+        }
+        if (this.pos.config.require_prescription_validation && this.pos.prescriberBlockReason(this.prescriber_id)) {
+            blocked.push(_t("the prescriber of this prescription"));
+        }
+        return blocked;
+    },
+});
@@ -0,0 +1,66 @@
+/** @odoo-module **/
+
+import { Orderline } from "@point_of_sale/app/store/models";
+import { PosStore } from "@point_of_sale/app/store/pos_store";
+import { patch } from "@web/core/utils/patch";
+
+// Must match MARKDOWN_NOTIFICATION in models/markdown.py
+const MARKDOWN_NOTIFICATION = "softlink_pos.markdowns";
+
+function markdownKey(productId, lotName) {
+    return `${productId}|${lotName}`;
+}
+
+patch(PosStore.prototype, {
+    async after_load_server_data() {
+        await super.after_load_server_data(...arguments);
+        this.lotMarkdowns = new Map();
+        try {
+            const data = await this.env.services.orm.call("pos.config", "get_pharmacy_markdowns", [[this.config.id]]);
+            this._applyMarkdownDelta({ changed: data.markdowns, removed: [] });
+            const bus = this.env.services.bus_service;
+            bus.addChannel(data.channel);
+            bus.subscribe(MARKDOWN_NOTIFICATION, (payload) => this._applyMarkdownDelta(payload));
+        } catch {
+            // Offline: lots are sold at list price until the next load
+        }
+    },
+
+    /**
+     * Only the changed lots are sent by the server; products are not reloaded.
+     */
+    _applyMarkdownDelta({ changed, removed }) {
+        for (const markdown of removed) {
+            this.lotMarkdowns.delete(markdownKey(markdown.product_id, markdown.lot_name));
+        }
+        for (const markdown of changed) {
+            this.lotMarkdowns.set(markdownKey(markdown.product_id, markdown.lot_name), markdown.discount);
+        }
+    },
+
+    getLotMarkdown(productId, lotName) {
+        return (this.lotMarkdowns && this.lotMarkdowns.get(markdownKey(productId, lotName))) || 0;
+    },
+});
+
+patch(Orderline.prototype, {
+    setPackLotLines() {
+        super.setPackLotLines(...arguments);
+        this._applyLotMarkdown();
+    },
+
+    /**
+     * Discount the line by the markdown of its lot, never below a manual discount.
+     */
+    _applyLotMarkdown() {
+        const lotNames = this.get_lot_lines().map((lot) => lot.lot_name);
+        if (!lotNames.length) {
+            return;
+        }
+        const productId = this.get_product().id;
+        const markdown = Math.min(...lotNames.map((lotName) => this.pos.getLotMarkdown(productId, lotName)));
+        if (markdown > this.get_discount()) {
+            this.set_discount(markdown);
+        }
+    },
+});
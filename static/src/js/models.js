@@ -10,6 +10,7 @@ patch(Order.prototype, {
         this.patient_name = this.patient_name || '';
         this.patient_phone = this.patient_phone || '';
         this.prescription_id = this.prescription_id || null;
+        this.prescriber_id = this.prescriber_id || null;
         this.insurance_claim = this.insurance_claim || false;
         this.insurance_company = this.insurance_company || '';
         this.insurance_number = this.insurance_number || '';
@@ -25,6 +26,7 @@ patch(Order.prototype, {
         json.patient_name = this.patient_name;
         json.patient_phone = this.patient_phone;
         json.prescription_id = this.prescription_id;
+        json.prescriber_id = this.prescriber_id;
         json.insurance_claim = this.insurance_claim;
         json.insurance_company = this.insurance_company;
         json.insurance_number = this.insurance_number;
@@ -41,6 +43,7 @@ patch(Order.prototype, {
         this.patient_name = json.patient_name;
         this.patient_phone = json.patient_phone;
         this.prescription_id = json.prescription_id;
+        this.prescriber_id = json.prescriber_id || null;
         this.insurance_claim = json.insurance_claim;
         this.insurance_company = json.insurance_company;
         this.insurance_number = json.insurance_number;
@@ -0,0 +1,153 @@
+/** @odoo-module **/
+
+import { Order } from "@point_of_sale/app/store/models";
+import { PosStore } from "@point_of_sale/app/store/pos_store";
+import { PaymentScreen } from "@point_of_sale/app/screens/payment_screen/payment_screen";
+import { patch } from "@web/core/utils/patch";
+
+// Ask for a new block when less than this share of the current one is left
+const REFILL_THRESHOLD = 0.2;
+
+patch(PosStore.prototype, {
+    async after_load_server_data() {
+        await super.after_load_server_data(...arguments);
+        this.receiptNumbering = this._loadReceiptNumbering();
+        try {
+            const data = await this.env.services.orm.call("pos.session", "get_receipt_blocks", [[this.pos_session.id]]);
+            this._mergeReceiptBlocks(data);
+        } catch {
+            // Offline: keep using the blocks saved on this till
+        }
+    },
+
+    _receiptStorageKey() {
+        return `softlink_pos.receipt_numbering.${this.pos_session.id}`;
+    },
+
+    _loadReceiptNumbering() {
+        const saved = localStorage.getItem(this._receiptStorageKey());
+        return saved ? JSON.parse(saved) : { blocks: [], next: null, format: null, refilling: false };
+    },
+
+    _saveReceiptNumbering() {
+        localStorage.setItem(this._receiptStorageKey(), JSON.stringify({ ...this.receiptNumbering, refilling: false }));
+    },
+
+    _mergeReceiptBlocks(data) {
+        const numbering = this.receiptNumbering;
+        const known = new Set(numbering.blocks.map((block) => block.id));
+        for (const block of data.blocks) {
+            if (!known.has(block.id)) {
+                numbering.blocks.push(block);
+            }
+        }
+        numbering.blocks.sort((a, b) => a.start - b.start);
+        numbering.format = data.format;
+        if (numbering.next === null && numbering.blocks.length) {
+            numbering.next = numbering.blocks[0].start;
+        }
+        // Resume after numbers already synced by this session, e.g. from
+        // another browser or before the saved state was cleared
+        if (numbering.next !== null && data.last_used && numbering.next <= data.last_used) {
+            numbering.next = data.last_used + 1;
+        }
+        this._saveReceiptNumbering();
+    },
+
+    async _refillReceiptBlocks() {
+        const numbering = this.receiptNumbering;
+        if (numbering.refilling) {
+            return;
+        }
+        numbering.refilling = true;
+        try {
+            const data = await this.env.services.orm.call("pos.session", "reserve_receipt_block", [[this.pos_session.id]]);
+            this._mergeReceiptBlocks(data);
+        } catch {
+            // Offline: retried on the next order
+        } finally {
+            numbering.refilling = false;
+        }
+    },
+
+    /**
+     * Take the next receipt number from the reserved blocks without a server
+     * round trip. Returns null when every block is used up; the server then
+     * assigns a number when the order is synced.
+     */
+    takeReceiptNumber() {
+        const numbering = this.receiptNumbering;
+        if (!numbering || numbering.next === null) {
+            return null;
+        }
+        // Drop blocks that are used up
+        while (numbering.blocks.length && numbering.next > numbering.blocks[0].end) {
+            numbering.blocks.shift();
+            if (numbering.blocks.length) {
+                numbering.next = Math.max(numbering.next, numbering.blocks[0].start);
+            }
+        }
+        const block = numbering.blocks[0];
+        if (!block) {
+            this._refillReceiptBlocks();
+            return null;
+        }
+        const number = numbering.next++;
+        const remaining = block.end - number + numbering.blocks.slice(1).reduce((sum, b) => sum + b.end - b.start + 1, 0);
+        if (remaining < (block.end - block.start + 1) * REFILL_THRESHOLD) {
+            this._refillReceiptBlocks();
+        }
+        this._saveReceiptNumbering();
+        return number;
+    },
+
+    formatReceiptNumber(number) {
+        const format = this.receiptNumbering && this.receiptNumbering.format;
+        if (!format) {
+            return String(number);
+        }
+        return `${format.prefix}${String(number).padStart(format.padding, "0")}${format.suffix}`;
+    },
+});
+
+patch(Order.prototype, {
+    setup(_defaultObj, options) {
+        super.setup(...arguments);
+        this.receipt_sequence_number = this.receipt_sequence_number || null;
+        this.receipt_number = this.receipt_number || '';
+    },
+
+    export_as_JSON() {
+        const json = super.export_as_JSON(...arguments);
+        json.receipt_sequence_number = this.receipt_sequence_number;
+        return json;
+    },
+
+    init_from_JSON(json) {
+        super.init_from_JSON(...arguments);
+        this.receipt_sequence_number = json.receipt_sequence_number || null;
+        if (this.receipt_sequence_number) {
+            this.receipt_number = this.pos.formatReceiptNumber(this.receipt_sequence_number);
+        }
+    },
+
+    export_for_printing() {
+        const result = super.export_for_printing(...arguments);
+        result.receipt_number = this.receipt_number;
+        return result;
+    },
+});
+
+patch(PaymentScreen.prototype, {
+    async validateOrder(isForceValidate) {
+        const order = this.currentOrder;
+        if (!order.receipt_sequence_number) {
+            const number = this.pos.takeReceiptNumber();
+            if (number !== null) {
+                order.receipt_sequence_number = number;
+                order.receipt_number = this.pos.formatReceiptNumber(number);
+            }
+        }
+        return super.validateOrder(...arguments);
+    },
+});
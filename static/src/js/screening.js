@@ -0,0 +1,82 @@
+/** @odoo-module **/
+
+import { Order } from "@point_of_sale/app/store/models";
+import { PosStore } from "@point_of_sale/app/store/pos_store";
+import { _t } from "@web/core/l10n/translation";
+import { patch } from "@web/core/utils/patch";
+
+// Must match SEVERITY_RANK in models/drug_interaction.py
+const SEVERITY_RANK = { contraindicated: 4, major: 3, moderate: 2, minor: 1 };
+
+patch(PosStore.prototype, {
+    async after_load_server_data() {
+        await super.after_load_server_data(...arguments);
+        // Copy of the server screening index, used when screen_basket cannot be reached
+        this.screeningIndex = null;
+        try {
+            const data = await this.env.services.orm.call("pharmacy.drug.interaction", "get_pos_screening_index", []);
+            this.screeningIndex = {
+                products: new Map(Object.entries(data.products).map(([id, [name, terms]]) => [Number(id), { name, terms }])),
+                interactions: data.interactions,
+            };
+        } catch {
+            // Offline at start-up: baskets are screened by the pharmacist by hand
+        }
+    },
+});
+
+patch(Order.prototype, {
+    /**
+     * Interaction and duplicate-ingredient alerts of the basket, computed like
+     * screen_basket from the till's copy of the index. Patient allergies and
+     * medications are only checked by the server. Returns null when the
+     * index was never loaded.
+     */
+    getLocalScreeningAlerts() {
+        const index = this.pos.screeningIndex;
+        if (!index) {
+            return null;
+        }
+        const ids = [...new Set(this.get_orderlines().map(line => line.get_product().id))];
+        const basket = ids.filter(id => index.products.has(id)).map(id => [id, index.products.get(id)]);
+        const alerts = [];
+        for (let i = 0; i < basket.length; i++) {
+            const [idA, productA] = basket[i];
+            for (const [idB, productB] of basket.slice(i + 1)) {
+                for (const termA of productA.terms) {
+                    const partners = index.interactions[termA] || {};
+                    for (const termB of productB.terms) {
+                        if (partners[termB]) {
+                            const [severity, description] = partners[termB];
+                            alerts.push({
+                                type: 'interaction',
+                                severity,
+                                message: `${productA.name} (${termA}) interacts with ${productB.name} (${termB}). ${description}`.trim(),
+                                product_ids: [idA, idB],
+                            });
+                        }
+                    }
+                }
+                const shared = productA.terms.filter(term => productB.terms.includes(term));
+                if (shared.length) {
+                    alerts.push({
+                        type: 'duplicate',
+                        severity: 'moderate',
+                        message: `${productA.name} and ${productB.name} both contain ${shared.join(', ')}.`,
+                        product_ids: [idA, idB],
+                    });
+                }
+            }
+        }
+        alerts.sort((a, b) => SEVERITY_RANK[b.severity] - SEVERITY_RANK[a.severity]);
+        if (this.patient_id) {
+            alerts.push({
+                type: 'offline',
+                severity: 'minor',
+                message: _t('Offline: check the patient allergies and current medications by hand.'),
+                product_ids: [],
+            });
+        }
+        return alerts;
+    },
+});
@@ -41,19 +41,43 @@ patch(ProductScreen.prototype, {
             }
         }
 
-        // Check for expired products
-        const expiredLines = order.get_orderlines().filter(line => {
-            return line.lot_id && line.lot_id.is_expired;
-        });
-
-        if (expiredLines.length > 0 && this.pos.config.block_expired_products) {
+        // Check expired, recalled and unregistered items against the local blocklist
+        const blockedItems = order.getBlockedItems();
+        if (blockedItems.length > 0) {
             await this.showPopup('ErrorPopup', {
-                title: this.env._t('Expired Products'),
-                body: this.env._t('This order contains expired products. Please remove them before proceeding.'),
+                title: this.env._t('Blocked Items'),
+                body: this.env._t('This order cannot be sold: ') + blockedItems.join(', '),
             });
             return;
         }
 
+        // Screen the basket for interactions and allergies
+        const productIds = order.get_orderlines().map(line => line.get_product().id);
+        if (productIds.length) {
+            let alerts;
+            try {
+                alerts = await this.env.services.orm.call(
+                    "pharmacy.drug.interaction", "screen_basket", [productIds, order.patient_id || false]
+                );
+            } catch {
+                // Offline: screen against the till's copy of the index
+                alerts = order.getLocalScreeningAlerts() || [{
+                    severity: 'minor',
+                    message: this.env._t('Interaction and allergy screening is unavailable offline. Check the basket manually.'),
+                }];
+            }
+            if (alerts.length) {
+                const { confirmed } = await this.showPopup('ConfirmPopup', {
+                    title: this.env._t('Screening Alerts'),
+                    body: alerts.map(alert => `[${alert.severity.toUpperCase()}] ${alert.message}`).join('\n'),
+                    confirmText: this.env._t('Proceed Anyway'),
+                });
+                if (!confirmed) {
+                    return;
+                }
+            }
+        }
+
         // Continue with standard payment flow
         return super._onClickPay(...arguments);
     },
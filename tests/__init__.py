@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_benchmark
+from . import test_escpos_receipt
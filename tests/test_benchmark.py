@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""Hot-path benchmarks, run on a test database with the Odoo test runner:
+
+    odoo-bin -d <test_db> -i softlink_pos --test-tags /softlink_pos:benchmark --stop-after-init
+
+Everything runs in the test transaction and is rolled back. Set
+SOFTLINK_POS_BENCHMARK_SCALE (small, medium, large), ..._SEED and
+..._ITERATIONS to change the data set. Results are kept per scale in
+softlink_pos_benchmarks.json in the data directory, and each run logs its
+change against the previous run at the same scale.
+"""
+
+import json
+import logging
+import os
+import random
+import time
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+# Generated volumes per scale; paid_orders is the sales history, orders the drafts paid by test_order_paid
+BENCHMARK_SCALES = {
+    'small': {'products': 50, 'lots': 3, 'patients': 200, 'prescriptions': 100, 'paid_orders': 200, 'orders': 20},
+    'medium': {'products': 500, 'lots': 3, 'patients': 2000, 'prescriptions': 1000, 'paid_orders': 2000, 'orders': 100},
+    'large': {'products': 5000, 'lots': 3, 'patients': 20000, 'prescriptions': 10000, 'paid_orders': 20000, 'orders': 500},
+}
+RESULTS_FILE = 'softlink_pos_benchmarks.json'
+
+FIRST_NAMES = ['Wanjiru', 'Otieno', 'Achieng', 'Kamau', 'Njeri', 'Mutua', 'Chebet', 'Kiprop', 'Amina', 'Baraka']
+LAST_NAMES = ['Mwangi', 'Odhiambo', 'Wambui', 'Kariuki', 'Onyango', 'Kiplagat', 'Mohamed', 'Ndungu', 'Wekesa', 'Mutiso']
+GENERICS = ['Amoxicillin', 'Paracetamol', 'Metformin', 'Amlodipine', 'Omeprazole', 'Ciprofloxacin',
+            'Salbutamol', 'Ibuprofen', 'Losartan', 'Cetirizine', 'Diclofenac', 'Artemether/Lumefantrine']
+STRENGTHS = ['5mg', '10mg', '250mg', '500mg', '1g']
+CATEGORIES = ['otc', 'otc', 'pharmacy', 'prescription', 'prescription', 'controlled']
+
+
+@tagged('benchmark', '-standard', 'post_install', '-at_install')
+class TestPharmacyBenchmark(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestPharmacyBenchmark, cls).setUpClass()
+        cls.scale = os.environ.get('SOFTLINK_POS_BENCHMARK_SCALE', 'small')
+        cls.seed = int(os.environ.get('SOFTLINK_POS_BENCHMARK_SEED', 42))
+        cls.iterations = int(os.environ.get('SOFTLINK_POS_BENCHMARK_ITERATIONS', 100))
+        cls.volumes = BENCHMARK_SCALES[cls.scale]
+        cls.rng = random.Random(cls.seed)
+        cls.results = {}
+        cls._generate_data()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._save_results()
+        super(TestPharmacyBenchmark, cls).tearDownClass()
+
+    # Data generator
+
+    @classmethod
+    def _generate_data(cls):
+        """Create a deterministic data set for the seed and scale"""
+        env, rng, volumes = cls.env, cls.rng, cls.volumes
+        today = fields.Date.today()
+        company = env.company
+        warehouse = env['stock.warehouse'].search([('company_id', '=', company.id)], limit=1)
+
+        # Products, with their pharmacy details
+        templates = env['product.template'].create([{
+            'name': f"BENCH {rng.choice(GENERICS)} {rng.choice(STRENGTHS)} #{index}",
+            'is_pharmaceutical': True,
+            'type': 'consu',
+            'is_storable': True,
+            'tracking': 'lot',
+            'list_price': round(rng.uniform(20, 2500), 2),
+            'standard_price': round(rng.uniform(10, 1500), 2),
+            'available_in_pos': True,
+        } for index in range(volumes['products'])])
+        by_category = {}
+        for pharmacy in templates.pharmacy_product_id:
+            by_category.setdefault(rng.choice(CATEGORIES), []).append(pharmacy.id)
+        for category, ids in by_category.items():
+            env['pharmacy.product'].browse(ids).write({
+                'drug_category': category,
+                'expiry_alert_days': 90,
+                'registration_expiry': today + timedelta(days=rng.randint(1, 720)),
+            })
+        cls.products = templates.product_variant_id
+
+        # Lots with stock, spread from expired to two years out
+        cls.lots = env['stock.lot'].create([{
+            'name': f"BENCH-{product.id}-{index}",
+            'product_id': product.id,
+            'company_id': company.id,
+            'expiry_date': today + timedelta(days=rng.randint(-60, 730)),
+        } for product in cls.products for index in range(volumes['lots'])])
+        Quant = env['stock.quant'].sudo()
+        for lot in cls.lots:
+            Quant._update_available_quantity(lot.product_id, warehouse.lot_stock_id, rng.randint(5, 500), lot_id=lot)
+
+        # Patients and prescriptions
+        cls.patients = env['pharmacy.patient'].create([{
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': f"{rng.choice(LAST_NAMES)}{index}",
+            'date_of_birth': today - timedelta(days=rng.randint(365, 365 * 85)),
+            'gender': rng.choice(['male', 'female']),
+            'phone': f"07{rng.randint(10000000, 99999999)}",
+        } for index in range(volumes['patients'])])
+        prescriber = env['pharmacy.prescriber'].create({
+            'name': 'Dr. Benchmark',
+            'license_number': f"BENCH-{cls.seed}-{rng.randint(100000, 999999)}",
+            'phone': '0700000000',
+        })
+        cls.prescriptions = env['pharmacy.prescription'].create([{
+            'patient_id': rng.choice(cls.patients).id,
+            'prescriber_id': prescriber.id,
+            'diagnosis': 'Benchmark',
+            'valid_until': today + timedelta(days=30),
+            'line_ids': [(0, 0, {'product_id': rng.choice(cls.products).id, 'quantity': rng.randint(1, 3)})
+                         for dummy in range(rng.randint(1, 3))],
+        } for dummy in range(volumes['prescriptions'])])
+
+        cls.session = cls._benchmark_session()
+
+        # Paid sales history, spread over the last 90 days
+        cls.paid_orders = cls._create_draft_orders(volumes['paid_orders'], history_days=90)
+        for order in cls.paid_orders:
+            order.action_pos_order_paid()
+
+    @classmethod
+    def _benchmark_session(cls):
+        """A dedicated pharmacy point of sale with an open session"""
+        env = cls.env
+        journal = env['account.journal'].create({'name': 'Benchmark Cash', 'type': 'cash', 'code': 'BNCH'})
+        payment_method = env['pos.payment.method'].create({
+            'name': 'Benchmark Cash',
+            'journal_id': journal.id,
+            'payment_type': 'cash',
+        })
+        pos_config = env['pos.config'].create({
+            'name': 'Benchmark Pharmacy',
+            'is_pharmacy_pos': True,
+            'payment_method_ids': [(6, 0, payment_method.ids)],
+        })
+        return env['pos.session'].create({
+            'config_id': pos_config.id,
+            'user_id': env.uid,
+            'pharmacist_id': env.uid,
+        })
+
+    @classmethod
+    def _create_draft_orders(cls, count, history_days=0):
+        """Unpaid orders of the benchmark session, dated up to ``history_days`` back"""
+        payment_method = cls.session.config_id.payment_method_ids[:1]
+        now = fields.Datetime.now()
+        orders = cls.env['pos.order']
+        for dummy in range(count):
+            lines = []
+            for product in cls.rng.sample(list(cls.products), min(3, len(cls.products))):
+                qty = cls.rng.randint(1, 3)
+                price = product.lst_price
+                lines.append((0, 0, {
+                    'product_id': product.id,
+                    'qty': qty,
+                    'price_unit': price,
+                    'price_subtotal': price * qty,
+                    'price_subtotal_incl': price * qty,
+                    'tax_ids': [(6, 0, [])],
+                }))
+            total = sum(line[2]['price_subtotal_incl'] for line in lines)
+            values = {
+                'session_id': cls.session.id,
+                'date_order': now - timedelta(minutes=cls.rng.randint(0, history_days * 24 * 60)),
+                'lines': lines,
+                'amount_tax': 0.0,
+                'amount_total': total,
+                'amount_paid': total,
+                'amount_return': 0.0,
+                'approved_by_pharmacist': True,
+                'pharmacist_id': cls.env.uid,
+            }
+            # A third of the history is dispensed against a prescription
+            if history_days and cls.rng.random() < 1 / 3:
+                prescription = cls.rng.choice(cls.prescriptions)
+                values.update({'prescription_id': prescription.id, 'patient_id': prescription.patient_id.id})
+            order = cls.env['pos.order'].create(values)
+            order.add_payment({
+                'pos_order_id': order.id,
+                'amount': total,
+                'payment_method_id': payment_method.id,
+            })
+            orders |= order
+        return orders
+
+    # Measurement
+
+    def _measure(self, case, function):
+        """Record wall time and query count of ``function``, which returns its number of operations"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        cr = self.env.cr
+        queries = cr.sql_log_count
+        start = time.perf_counter()
+        operations = function() or 1
+        self.env.flush_all()
+        elapsed = (time.perf_counter() - start) * 1000
+        queries = cr.sql_log_count - queries
+        _logger.info('Benchmark %s: %s ops in %.1f ms, %s queries', case, operations, elapsed, queries)
+        self.results[case] = {
+            'operations': operations,
+            'total_ms': elapsed,
+            'ms_per_op': elapsed / operations,
+            'queries': queries,
+            'queries_per_op': queries / operations,
+        }
+
+    @classmethod
+    def _save_results(cls):
+        """Log the change against the previous run at this scale and keep these results"""
+        if not cls.results:
+            return
+        path = os.path.join(config['data_dir'], RESULTS_FILE)
+        stored = {}
+        if os.path.isfile(path):
+            with open(path) as results_file:
+                stored = json.load(results_file)
+        previous = stored.get(cls.scale, {}).get('results', {})
+        for case, values in sorted(cls.results.items()):
+            baseline = previous.get(case, {}).get('ms_per_op')
+            delta = f"{100.0 * (values['ms_per_op'] - baseline) / baseline:+.1f}%" if baseline else 'n/a'
+            _logger.info('Benchmark %-24s %10.3f ms/op %8.2f queries/op  %s vs previous',
+                         case, values['ms_per_op'], values['queries_per_op'], delta)
+        stored[cls.scale] = {
+            'seed': cls.seed,
+            'iterations': cls.iterations,
+            'run_date': fields.Datetime.to_string(fields.Datetime.now()),
+            'results': cls.results,
+        }
+        os.makedirs(config['data_dir'], exist_ok=True)
+        with open(path, 'w') as results_file:
+            json.dump(stored, results_file, indent=2, sort_keys=True)
+
+    # Cases
+
+    def test_order_paid(self):
+        orders = self._create_draft_orders(self.volumes['orders'])
+
+        def pay():
+            for order in orders:
+                order.action_pos_order_paid()
+            return len(orders)
+        self._measure('order_paid', pay)
+
+    def test_expiry_wizard(self):
+        wizard = self.env['pharmacy.expiry.alert.wizard'].create({'days_threshold': 90})
+        self._measure('expiry_wizard', lambda: wizard.action_generate_report() and 1)
+
+    def test_session_counters(self):
+        def count():
+            sessions = self.env['pos.session'].search([], limit=50, order='id desc')
+            sessions.mapped('controlled_drugs_count')
+            sessions.mapped('prescription_count')
+            return len(sessions)
+        self._measure('session_counters', count)
+
+    def test_etims_payload(self):
+        orders = self.paid_orders[:self.iterations]
+
+        def build():
+            for order in orders:
+                order._prepare_invoice_items()
+            return len(orders)
+        self._measure('etims_payload', build)
+
+    def test_patient_search(self):
+        Patient = self.env['pharmacy.patient']
+
+        def search():
+            for dummy in range(self.iterations):
+                Patient.name_search(self.rng.choice(LAST_NAMES)[:4], limit=8)
+            return self.iterations
+        self._measure('patient_search', search)
+
+    def test_config_lookup(self):
+        """Per-order eTIMS and pharmacy settings lookups, uncached against the worker-level caches"""
+        company = self.env.company
+        pos_config = self.session.config_id
+
+        def uncached():
+            for dummy in range(self.iterations):
+                self.env['kra.etims.config'].search([('company_id', '=', company.id), ('active', '=', True)], limit=1)
+                pos_config.invalidate_recordset(['require_pharmacist_approval'])
+                pos_config.require_pharmacist_approval
+            return self.iterations
+
+        def cached():
+            for dummy in range(self.iterations):
+                self.env['kra.etims.config']._get_active_config(company)
+                self.env['pos.config']._get_pharmacy_settings(pos_config.id)
+            return self.iterations
+        self._measure('config_lookup_uncached', uncached)
+        self._measure('config_lookup_cached', cached)
+        self.assertLessEqual(self.results['config_lookup_cached']['queries'],
+                             self.results['config_lookup_uncached']['queries'])
+
+    def test_reorder_forecast(self):
+        wizard = self.env['pharmacy.reorder.wizard'].create({'only_suggestions': False})
+
+        def compute():
+            wizard.action_compute()
+            return len(wizard.line_ids)
+        self._measure('reorder_forecast', compute)
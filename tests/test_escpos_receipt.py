@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Golden tests for the ESC/POS receipts.
+
+Each case builds a receipt, from the builder primitives or from fixed
+pos.order records, and compares its bytes with a file checked in under
+tests/golden. After an intended change to the output, regenerate the
+files with SOFTLINK_POS_UPDATE_GOLDEN=1 and review them with a hex diff.
+"""
+
+import os
+
+from odoo import fields
+from odoo.tests import BaseCase, TransactionCase, tagged
+
+from odoo.addons.softlink_pos.models.escpos_receipt import EscPosReceipt
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), 'golden')
+
+
+class GoldenCase:
+
+    def assertGolden(self, name, receipt):
+        data = receipt.getvalue()
+        path = os.path.join(GOLDEN_DIR, f'{name}.bin')
+        if os.environ.get('SOFTLINK_POS_UPDATE_GOLDEN'):
+            with open(path, 'wb') as golden_file:
+                golden_file.write(data)
+        with open(path, 'rb') as golden_file:
+            expected = golden_file.read()
+        if data != expected:
+            offset = next((index for index, (a, b) in enumerate(zip(data, expected)) if a != b),
+                          min(len(data), len(expected)))
+            self.fail(f'{name}.bin differs at byte {offset}: '
+                      f'got {data[offset:offset + 16]!r}, expected {expected[offset:offset + 16]!r}')
+
+
+
+@tagged('post_install', '-at_install')
+class TestEscPosReceipt(GoldenCase, BaseCase):
+
+    def test_empty(self):
+        self.assertGolden('empty', EscPosReceipt())
+
+    def test_layout(self):
+        receipt = EscPosReceipt()
+        receipt.align('center').bold().size(2, 2).line('Options Pharmacy').size().bold(False)
+        receipt.line('Moi Avenue, Nairobi').bold().line('PIN: P051234567Z').bold(False)
+        receipt.align('left').separator()
+        receipt.columns('Receipt No:', 'POS/0001-001-0042')
+        receipt.columns('A label far too long to fit next to its value on the line', 'KES 1,250.00')
+        receipt.bold().wrap('Amoxicillin/Clavulanic Acid 625mg Film-Coated Tablets, pack of fourteen').bold(False)
+        receipt.columns(f"  {2:g} x 625.00", '1,250.00')
+        receipt.separator('=')
+        receipt.bold().size(1, 2).columns('TOTAL:', 'KES 1,250.00').size().bold(False)
+        self.assertGolden('layout', receipt.cut())
+
+    def test_codepage(self):
+        # Euro, accents and micro sign are in PC858; omega and the tick become '?'
+        receipt = EscPosReceipt().line('Crème 15€').line('Ω µg ✓')
+        self.assertGolden('codepage', receipt)
+
+    def test_narrow_width(self):
+        receipt = EscPosReceipt(width=32).separator().columns('Subtotal:', 'KES 99,999.99')
+        receipt.wrap('Paracetamol 500mg tablets, take two every six hours', indent='  ')
+        self.assertGolden('narrow_width', receipt.cut(feed=2))
+
+    def test_qr(self):
+        receipt = EscPosReceipt().align('center')
+        receipt.qr('PIN:P051234567Z|CU:KRACU0100001234|INV:KRACU0100001234-20240115-00042|TOTAL:1250.00')
+        receipt.qr('short', module_size=3, error_level='H')
+        self.assertGolden('qr', receipt.line().align('left').cut())
+
+
+@tagged('post_install', '-at_install')
+class TestEscPosOrderReceipt(GoldenCase, TransactionCase):
+    """Receipts of fixed orders, rendered in the Africa/Nairobi timezone"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestEscPosOrderReceipt, cls).setUpClass()
+        env = cls.env
+        env.company.write({
+            'name': 'Options Pharmacy',
+            'street': 'Moi Avenue',
+            'street2': False,
+            'city': 'Nairobi',
+            'phone': '0711 000111',
+            'vat': 'P051234567Z',
+        })
+        cls.cashier = env['res.users'].create({
+            'name': 'Grace Akinyi',
+            'login': 'escpos.cashier',
+            'tz': 'Africa/Nairobi',
+        })
+        cls.pharmacist = env['res.users'].create({
+            'name': 'Dr. Peter Kamau',
+            'login': 'escpos.pharmacist',
+            'tz': 'Africa/Nairobi',
+        })
+        journal = env['account.journal'].create({'name': 'Receipt Cash', 'type': 'cash', 'code': 'RCSH'})
+        cls.cash = env['pos.payment.method'].create({
+            'name': 'Cash',
+            'journal_id': journal.id,
+            'payment_type': 'cash',
+        })
+        bank = env['account.journal'].create({'name': 'Receipt M-Pesa', 'type': 'bank', 'code': 'RMPS'})
+        cls.mpesa = env['pos.payment.method'].create({
+            'name': 'M-Pesa',
+            'journal_id': bank.id,
+            'payment_type': 'mpesa',
+        })
+        pos_config = env['pos.config'].create({
+            'name': 'Receipt Pharmacy',
+            'payment_method_ids': [(6, 0, (cls.cash | cls.mpesa).ids)],
+        })
+        cls.session = env['pos.session'].create({'config_id': pos_config.id, 'user_id': cls.cashier.id})
+        cls.paracetamol = env['product.product'].create({'name': 'Paracetamol 500mg Tablets x100', 'type': 'consu'})
+        cls.amoxicillin = env['product.product'].create({
+            'name': 'Amoxicillin 500mg Capsules x21',
+            'type': 'consu',
+            'is_storable': True,
+            'tracking': 'lot',
+        })
+        cls.lot = env['stock.lot'].create({
+            'name': 'AMX2403B',
+            'product_id': cls.amoxicillin.id,
+            'company_id': env.company.id,
+            'expiry_date': fields.Date.to_date('2026-03-31'),
+        })
+
+    def _order(self, lines, payments, **values):
+        total = sum(qty * price for dummy, qty, price in lines)
+        order = self.env['pos.order'].create(dict({
+            'session_id': self.session.id,
+            'user_id': self.cashier.id,
+            'date_order': fields.Datetime.to_datetime('2024-01-15 09:30:00'),
+            'lines': [(0, 0, {
+                'product_id': product.id,
+                'full_product_name': product.name,
+                'qty': qty,
+                'price_unit': price,
+                'price_subtotal': qty * price,
+                'price_subtotal_incl': qty * price,
+                'lot_id': self.lot.id if product == self.amoxicillin else False,
+                'tax_ids': [(6, 0, [])],
+            }) for product, qty, price in lines],
+            'amount_tax': 0.0,
+            'amount_total': total,
+            'amount_paid': total,
+            'amount_return': 0.0,
+        }, **values))
+        for payment in payments:
+            self.env['pos.payment'].create(dict(payment, pos_order_id=order.id))
+        return order.with_context(tz='Africa/Nairobi')
+
+    def test_cash_order(self):
+        order = self._order(
+            [(self.paracetamol, 2, 150.0)],
+            [{'payment_method_id': self.cash.id, 'amount': 300.0, 'amount_tendered': 500.0}],
+            receipt_number='RCP-000101',
+        )
+        self.assertGolden('order_cash', order._render_escpos())
+
+    def test_insured_etims_order(self):
+        patient = self.env['pharmacy.patient'].create({
+            'first_name': 'Mary',
+            'last_name': 'Wanjiru',
+            'date_of_birth': fields.Date.to_date('1985-06-01'),
+            'gender': 'female',
+            'phone': '0722000333',
+        })
+        prescriber = self.env['pharmacy.prescriber'].create({
+            'name': 'Dr. Ruth Otieno',
+            'license_number': 'KMPDC-ESCPOS-1',
+            'phone': '0700000001',
+        })
+        prescription = self.env['pharmacy.prescription'].create({
+            'name': 'RX/2024/0042',
+            'patient_id': patient.id,
+            'prescriber_id': prescriber.id,
+            'diagnosis': 'Upper respiratory tract infection',
+            'valid_until': fields.Date.to_date('2024-02-15'),
+        })
+        order = self._order(
+            [(self.amoxicillin, 1, 850.0), (self.paracetamol, 1, 150.0)],
+            [{'payment_method_id': self.mpesa.id, 'amount': 200.0, 'mpesa_receipt_number': 'SAB1C2D3E4'}],
+            receipt_number='RCP-000102',
+            patient_id=patient.id,
+            prescription_id=prescription.id,
+            insurance_claim=True,
+            insurance_company='AAR Insurance',
+            insurance_number='AAR-778899',
+            insurance_amount=800.0,
+            patient_copay=200.0,
+            approved_by_pharmacist=True,
+            pharmacist_id=self.pharmacist.id,
+            kra_invoice_number='KRACU0100001234-20240115-00042',
+            kra_cu_serial='KRACU0100001234',
+            kra_signature='9f2c4e1ab37d5c08',
+            kra_qr_data='PIN:P051234567Z|CU:KRACU0100001234|INV:KRACU0100001234-20240115-00042'
+                        '|DATE:2024-01-15 09:30:00|TOTAL:1000.00|SIG:9f2c4e1ab37d5c08',
+        )
+        self.assertGolden('order_insured_etims', order._render_escpos())
@@ -1,3 +1,12 @@
 # -*- coding: utf-8 -*-
 
+from . import csv_import_mixin
 from . import expiry_alert_wizard
+from . import batch_recall_wizard
+from . import lot_intake_wizard
+from . import catalogue_import_wizard
+from . import patient_import_wizard
+from . import patient_merge_wizard
+from . import claim_batch_wizard
+from . import reorder_wizard
+from . import practitioner_import_wizard
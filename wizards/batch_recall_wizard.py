@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+
+class BatchRecallWizard(models.TransientModel):
+    _name = 'pharmacy.batch.recall.wizard'
+    _description = 'Batch Recall Wizard'
+
+    batch_number = fields.Char(string='Batch / Lot Number', required=True,
+                               help='Lot name, batch number or supplier batch number being recalled')
+    product_id = fields.Many2one('product.product', string='Product',
+                                 help='Restrict the recall to one product when batch numbers are not unique')
+    recall_reference = fields.Char(string='Recall Reference', help='Supplier or PPB recall notice reference')
+    
+    lot_ids = fields.Many2many('stock.lot', string='Recalled Lots', readonly=True)
+    line_ids = fields.One2many('pharmacy.batch.recall.line', 'wizard_id', string='Affected Patients')
+    patient_count = fields.Integer(string='Patients Affected', compute='_compute_patient_count')
+    
+    @api.depends('line_ids.patient_name', 'line_ids.phone')
+    def _compute_patient_count(self):
+        for wizard in self:
+            wizard.patient_count = len(set(
+                line.patient_id.id or (line.patient_name, line.phone) for line in wizard.line_ids
+            ))
+    
+    def _reopen(self):
+        return {
+            'name': 'Batch Recall',
+            'type': 'ir.actions.act_window',
+            'res_model': 'pharmacy.batch.recall.wizard',
+            'view_mode': 'form',
+            'res_id': self.id,
+            'target': 'new',
+        }
+    
+    def action_trace(self):
+        """Find every patient who received the recalled batch"""
+        self.ensure_one()
+        lots = self.env['stock.lot']._search_recalled_batch(self.batch_number.strip(), self.product_id.id)
+        if not lots:
+            raise UserError(f'No lot found for batch {self.batch_number}.')
+        
+        self.line_ids.unlink()
+        self.env['pharmacy.batch.recall.line'].create([
+            dict(row, wizard_id=self.id) for row in lots._get_recall_trace()
+        ])
+        self.lot_ids = [(6, 0, lots.ids)]
+        return self._reopen()
+    
+    def action_quarantine(self):
+        """Flag the lots as recalled and quarantine the remaining stock"""
+        self.ensure_one()
+        if not self.lot_ids:
+            self.action_trace()
+        self.lot_ids.action_recall(self.recall_reference)
+        return self._reopen()
+
+
+class BatchRecallLine(models.TransientModel):
+    _name = 'pharmacy.batch.recall.line'
+    _description = 'Batch Recall Line'
+    _order = 'date desc'
+
+    wizard_id = fields.Many2one('pharmacy.batch.recall.wizard', string='Wizard', required=True, ondelete='cascade')
+    
+    lot_id = fields.Many2one('stock.lot', string='Lot/Batch')
+    product_id = fields.Many2one('product.product', string='Product')
+    pos_order_id = fields.Many2one('pos.order', string='POS Order')
+    date = fields.Datetime(string='Date Dispensed')
+    quantity = fields.Float(string='Quantity')
+    
+    patient_id = fields.Many2one('pharmacy.patient', string='Patient')
+    patient_name = fields.Char(string='Patient Name')
+    phone = fields.Char(string='Phone')
+    
+    source = fields.Selection([
+        ('pos', 'POS Sale'),
+        ('register', 'Controlled Drugs Register'),
+    ], string='Source')
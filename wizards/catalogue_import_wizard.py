@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from psycopg2.extras import execute_values
+
+from odoo import models, fields, api
+
+# CSV column -> pharmacy.product field, updated on every import
+CATALOGUE_COLUMNS = {
+    'name': 'name',
+    'generic_name': 'generic_name',
+    'brand_name': 'brand_name',
+    'active_ingredient': 'active_ingredient',
+    'strength': 'strength',
+    'dosage_form': 'dosage_form',
+    'drug_category': 'drug_category',
+    'registration_date': 'registration_date',
+    'registration_expiry': 'registration_expiry',
+    'therapeutic_class': 'therapeutic_class',
+    'pharmacological_class': 'pharmacological_class',
+}
+
+
+class CatalogueImportWizard(models.TransientModel):
+    """Upsert of the Pharmacy and Poisons Board drug register.
+
+    Rows are matched on ``ppb_registration_no``. Known drugs are updated in
+    place with one write per distinct set of changes, new drugs get a
+    product and pharmacy details created in bulk. The screening index and
+    the sale blocklist are refreshed once per chunk. Uniqueness is enforced by the partial unique index on the registration
+    number, so no per-record search is needed.
+    """
+    _name = 'pharmacy.catalogue.import.wizard'
+    _inherit = 'pharmacy.csv.import.mixin'
+    _description = 'PPB Catalogue Import'
+
+    skip_expired = fields.Boolean(string='Skip Expired Registrations', default=True,
+                                  help='Ignore rows whose registration has already expired; '
+                                       'otherwise they are reported as errors, as expired drugs cannot be stored')
+    
+    @api.model
+    def _selection_map(self, field_name):
+        """Accept either selection keys or labels (case-insensitive)"""
+        mapping = {}
+        for key, label in self.env['pharmacy.product']._fields[field_name].selection:
+            mapping[key.lower()] = key
+            mapping[label.lower()] = key
+        return mapping
+    
+    def _prepare_catalogue_vals(self, row, dosage_forms, categories):
+        vals = {}
+        for column, field_name in CATALOGUE_COLUMNS.items():
+            if row.get(column):
+                vals[field_name] = row[column]
+        for field_name in ('registration_date', 'registration_expiry'):
+            if field_name in vals:
+                vals[field_name] = self._parse_date(vals[field_name])
+        if 'dosage_form' in vals:
+            vals['dosage_form'] = dosage_forms.get(vals['dosage_form'].lower(), 'other')
+        if 'drug_category' in vals:
+            vals['drug_category'] = categories.get(vals['drug_category'].lower(), 'otc')
+        return vals
+    
+    def _import_chunk(self, rows, stats):
+        PharmacyProduct = self.env['pharmacy.product'].with_context(defer_catalogue_refresh=True)
+        dosage_forms = self._selection_map('dosage_form')
+        categories = self._selection_map('drug_category')
+        today = fields.Date.today()
+        
+        # Last row wins when a registration number repeats within the chunk
+        rows_by_ppb = {}
+        for row in rows:
+            ppb = (row.get('ppb_registration_no') or '').strip()
+            if not ppb:
+                stats['errors'].append(f"Line {row['_line']}: missing ppb_registration_no")
+                continue
+            try:
+                vals = self._prepare_catalogue_vals(row, dosage_forms, categories)
+            except ValueError as e:
+                stats['errors'].append(f"Line {row['_line']}: {e}")
+                continue
+            if vals.get('registration_expiry') and vals['registration_expiry'] < today:
+                if self.skip_expired:
+                    stats['skipped'] += 1
+                else:
+                    stats['errors'].append(f"Line {row['_line']}: registration {ppb} expired on {vals['registration_expiry']}")
+                continue
+            rows_by_ppb[ppb] = vals
+        if not rows_by_ppb:
+            return
+        
+        existing = PharmacyProduct.search_fetch(
+            [('ppb_registration_no', 'in', list(rows_by_ppb))], list(CATALOGUE_COLUMNS.values()) + ['ppb_registration_no'])
+        # Records with the same changes are written together
+        updates = defaultdict(list)
+        for record in existing:
+            vals = rows_by_ppb[record.ppb_registration_no]
+            changed = tuple(sorted(
+                (name, value) for name, value in vals.items()
+                if record[name] != value
+            ))
+            if changed:
+                updates[changed].append(record.id)
+                stats['updated'] += 1
+            else:
+                stats['skipped'] += 1
+        changed_fields = set()
+        for changed, ids in updates.items():
+            PharmacyProduct.browse(ids).write(dict(changed))
+            changed_fields.update(name for name, value in changed)
+        for ppb in set(existing.mapped('ppb_registration_no')):
+            del rows_by_ppb[ppb]
+        
+        if rows_by_ppb:
+            self._create_products(PharmacyProduct, rows_by_ppb)
+            stats['created'] += len(rows_by_ppb)
+            changed_fields.update(CATALOGUE_COLUMNS.values())
+        PharmacyProduct._refresh_catalogue_caches(changed_fields)
+    
+    def _create_products(self, PharmacyProduct, rows_by_ppb):
+        """New drugs: one product.template create, one pharmacy.product create and one link update"""
+        new_vals = []
+        for ppb, vals in rows_by_ppb.items():
+            generic_name = vals.get('generic_name') or vals.get('name') or ppb
+            vals.update({
+                'ppb_registration_no': ppb,
+                'name': vals.get('name') or vals.get('brand_name') or generic_name,
+                'generic_name': generic_name,
+                'active_ingredient': vals.get('active_ingredient') or generic_name,
+                'dosage_form': vals.get('dosage_form', 'other'),
+            })
+            new_vals.append(vals)
+        templates = self.env['product.template'].create([{
+            'name': vals['name'],
+            'sale_ok': True,
+            'available_in_pos': True,
+        } for vals in new_vals])
+        for template, vals in zip(templates, new_vals):
+            vals['product_id'] = template.product_variant_id.id
+        pharmacy_products = PharmacyProduct.create(new_vals)
+        
+        # drug_category is a stored related field, so it is set with the link
+        templates.flush_recordset()
+        pharmacy_products.flush_recordset()
+        execute_values(self.env.cr._obj, """
+            UPDATE product_template t
+            SET is_pharmaceutical = TRUE, pharmacy_product_id = v.pharmacy_id, drug_category = v.drug_category
+            FROM (VALUES %s) AS v (id, pharmacy_id, drug_category)
+            WHERE t.id = v.id
+        """, [(template.id, pharmacy.id, pharmacy.drug_category)
+              for template, pharmacy in zip(templates, pharmacy_products)], page_size=len(templates))
+        templates.invalidate_recordset(['is_pharmaceutical', 'pharmacy_product_id', 'drug_category'])
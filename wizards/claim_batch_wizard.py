@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+
+class ClaimBatchWizard(models.TransientModel):
+    _name = 'pharmacy.claim.batch.wizard'
+    _description = 'Generate Insurance Claim Batches'
+
+    date_from = fields.Date(string='From', required=True,
+                            default=lambda self: fields.Date.today().replace(day=1) - relativedelta(months=1))
+    date_to = fields.Date(string='To', required=True,
+                          default=lambda self: fields.Date.today().replace(day=1) - relativedelta(days=1))
+    
+    def action_generate(self):
+        """Create one claim batch per insurer for the period"""
+        self.ensure_one()
+        if self.date_from > self.date_to:
+            raise UserError('The start date must be before the end date.')
+        batches = self.env['pharmacy.insurance.claim.batch'].create_batches(self.date_from, self.date_to)
+        if not batches:
+            raise UserError('There are no unbatched insurance claims in this period.')
+        return {
+            'name': 'Claim Batches',
+            'type': 'ir.actions.act_window',
+            'res_model': 'pharmacy.insurance.claim.batch',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', batches.ids)],
+        }
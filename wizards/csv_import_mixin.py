@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import csv
+import io
+import logging
+import time
+from datetime import datetime
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y%m%d')
+MAX_REPORTED_ERRORS = 50
+
+
+class CsvImportMixin(models.AbstractModel):
+    """Chunked CSV import shared by the pharmacy bulk import wizards.
+
+    Rows are parsed lazily and handed to ``_import_chunk`` ``chunk_size`` at a
+    time. The ORM cache is flushed and cleared between chunks so memory stays
+    flat however large the file is.
+    """
+    _name = 'pharmacy.csv.import.mixin'
+    _description = 'Pharmacy CSV Import Mixin'
+
+    data_file = fields.Binary(string='File', required=True)
+    file_name = fields.Char(string='File Name')
+    delimiter = fields.Selection([
+        (',', 'Comma'),
+        (';', 'Semicolon'),
+        ('\t', 'Tab'),
+    ], string='Delimiter', default=',', required=True)
+    chunk_size = fields.Integer(string='Chunk Size', default=1000, required=True)
+    
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('done', 'Done'),
+    ], string='Status', default='draft')
+    result_summary = fields.Text(string='Result', readonly=True)
+    
+    @api.model
+    def _parse_date(self, value):
+        value = (value or '').strip()
+        if not value:
+            return False
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, date_format).date()
+            except ValueError:
+                continue
+        raise ValueError(f'Unrecognised date {value!r}')
+    
+    def _iter_csv_chunks(self):
+        """Yield lists of row dicts with normalised (lower_snake_case) headers"""
+        self.ensure_one()
+        stream = io.TextIOWrapper(io.BytesIO(base64.b64decode(self.data_file)), encoding='utf-8-sig')
+        reader = csv.reader(stream, delimiter=self.delimiter)
+        header = next(reader, None)
+        if not header:
+            raise UserError('The file is empty.')
+        header = [column.strip().lower().replace(' ', '_') for column in header]
+        
+        chunk = []
+        for line_number, values in enumerate(reader, start=2):
+            if not any(values):
+                continue
+            row = dict(zip(header, (value.strip() for value in values)))
+            row['_line'] = line_number
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def _import_chunk(self, rows, stats):
+        """Import one chunk of rows, updating ``stats`` counters and errors"""
+        raise NotImplementedError()
+    
+    def _finalize_import(self, stats):
+        """Hook run once after the last chunk, before the summary is written"""
+        pass
+    
+    def _summary_lines(self, stats):
+        """Extra result lines for importers that keep their own counters"""
+        return []
+    
+    def _import_context(self):
+        return dict(self.env.context, tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
+    
+    def action_import(self):
+        self.ensure_one()
+        if self.chunk_size <= 0:
+            raise UserError('Chunk size must be greater than zero.')
+        
+        stats = {'rows': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'errors': []}
+        wizard = self.with_context(self._import_context())
+        start = time.perf_counter()
+        for rows in wizard._iter_csv_chunks():
+            stats['rows'] += len(rows)
+            wizard._import_chunk(rows, stats)
+            self.env.flush_all()
+            self.env.invalidate_all()
+        wizard._finalize_import(stats)
+        elapsed = time.perf_counter() - start
+        
+        rate = stats['rows'] / elapsed if elapsed else 0.0
+        summary = [
+            f"Rows read: {stats['rows']}",
+            f"Created: {stats['created']}",
+            f"Updated: {stats['updated']}",
+            f"Skipped: {stats['skipped']}",
+            f"Errors: {len(stats['errors'])}",
+            f"Time: {elapsed:.2f}s ({rate:.0f} rows/s)",
+        ] + self._summary_lines(stats)
+        if stats['errors']:
+            summary.append('')
+            summary.extend(stats['errors'][:MAX_REPORTED_ERRORS])
+            if len(stats['errors']) > MAX_REPORTED_ERRORS:
+                summary.append(f"... and {len(stats['errors']) - MAX_REPORTED_ERRORS} more")
+        _logger.info('%s: imported %s (%s)', self._name, self.file_name or 'file', ', '.join(summary[:6]))
+        
+        self.write({'state': 'done', 'result_summary': '\n'.join(summary)})
+        return {
+            'name': self._description,
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'view_mode': 'form',
+            'res_id': self.id,
+            'target': 'new',
+        }
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+
+class LotIntakeWizard(models.TransientModel):
+    """Goods-received import of supplier batches.
+
+    Expected columns: ``product_code`` (internal reference or barcode),
+    ``lot_name``, ``batch_number``, ``supplier_batch_no``, ``expiry_date`` and
+    ``manufacturing_date``. Only ``product_code`` and ``lot_name`` are required.
+    """
+    _name = 'pharmacy.lot.intake.wizard'
+    _inherit = 'pharmacy.csv.import.mixin'
+    _description = 'Supplier Lot Intake'
+
+    def _resolve_products(self, codes, cache):
+        """Map product codes to product ids with one lookup per chunk.
+
+        ``cache`` is kept for the whole import so a product is looked up once.
+        """
+        missing = [code for code in codes if code not in cache]
+        if missing:
+            for product in self.env['product.product'].search_fetch(
+                    ['|', ('default_code', 'in', missing), ('barcode', 'in', missing)],
+                    ['default_code', 'barcode']):
+                for code in (product.default_code, product.barcode):
+                    if code in missing:
+                        cache.setdefault(code, product.id)
+            for code in missing:
+                cache.setdefault(code, False)
+        return cache
+    
+    def _import_chunk(self, rows, stats):
+        products = self._resolve_products({row.get('product_code', '') for row in rows},
+                                          stats.setdefault('product_cache', {}))
+        
+        candidates = []
+        for row in rows:
+            product_id = products.get(row.get('product_code', ''))
+            if not product_id:
+                stats['errors'].append(f"Line {row['_line']}: unknown product {row.get('product_code')!r}")
+                continue
+            if not row.get('lot_name'):
+                stats['errors'].append(f"Line {row['_line']}: missing lot_name")
+                continue
+            try:
+                expiry_date = self._parse_date(row.get('expiry_date'))
+                manufacturing_date = self._parse_date(row.get('manufacturing_date'))
+            except ValueError as e:
+                stats['errors'].append(f"Line {row['_line']}: {e}")
+                continue
+            candidates.append({
+                'name': row['lot_name'],
+                'product_id': product_id,
+                'company_id': self.env.company.id,
+                'batch_number': row.get('batch_number') or False,
+                'supplier_batch_no': row.get('supplier_batch_no') or False,
+                'expiry_date': expiry_date,
+                'manufacturing_date': manufacturing_date,
+            })
+        if not candidates:
+            return
+        
+        existing = {
+            (lot.name, lot.product_id.id)
+            for lot in self.env['stock.lot'].search_fetch([
+                ('name', 'in', [vals['name'] for vals in candidates]),
+                ('product_id', 'in', list({vals['product_id'] for vals in candidates})),
+                ('company_id', 'in', [self.env.company.id, False]),
+            ], ['name', 'product_id'])
+        }
+        vals_list = []
+        for vals in candidates:
+            key = (vals['name'], vals['product_id'])
+            if key in existing:
+                stats['skipped'] += 1
+                continue
+            existing.add(key)
+            vals_list.append(vals)
+        
+        # One create per chunk: pharmacy product and expiry status are computed in batch
+        self.env['stock.lot'].create(vals_list)
+        stats['created'] += len(vals_list)
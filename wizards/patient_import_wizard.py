@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+
+from ..models.patient import is_valid_phone
+
+PATIENT_COLUMNS = [
+    'first_name', 'middle_name', 'last_name', 'date_of_birth', 'gender', 'phone', 'email',
+    'id_number', 'street', 'city', 'county', 'allergies', 'chronic_conditions',
+    'insurance_company', 'insurance_number',
+]
+PRESCRIBER_COLUMNS = [
+    'name', 'title', 'license_number', 'license_expiry', 'specialization', 'phone', 'email',
+    'facility_name',
+]
+MAX_CONFLICT_SAMPLES = 20
+
+
+class PatientImportWizard(models.TransientModel):
+    """Bulk load of an existing patient or prescriber list.
+
+    Uniqueness of ``id_number`` / ``license_number`` is checked with one
+    search per chunk against the database and against rows already read from
+    the file. Rejected rows are reported per conflict type rather than one
+    error per line.
+    """
+    _name = 'pharmacy.patient.import.wizard'
+    _inherit = 'pharmacy.csv.import.mixin'
+    _description = 'Patient / Prescriber Import'
+
+    import_type = fields.Selection([
+        ('patient', 'Patients'),
+        ('prescriber', 'Prescribers'),
+    ], string='Import', default='patient', required=True)
+    
+    def _conflict(self, stats, kind, key):
+        conflicts = stats.setdefault('conflicts', {})
+        entry = conflicts.setdefault(kind, {'count': 0, 'samples': []})
+        entry['count'] += 1
+        if len(entry['samples']) < MAX_CONFLICT_SAMPLES:
+            entry['samples'].append(key)
+        stats['skipped'] += 1
+    
+    def _summary_lines(self, stats):
+        lines = []
+        for kind, entry in stats.get('conflicts', {}).items():
+            lines.append(f"{kind}: {entry['count']} ({', '.join(str(sample) for sample in entry['samples'])})")
+        return [''] + lines if lines else []
+    
+    @api.model
+    def _selection_key(self, model, field_name, value, default):
+        for key, label in self.env[model]._fields[field_name].selection:
+            if value.lower() in (key.lower(), label.lower()):
+                return key
+        return default
+    
+    def _prepare_patient_vals(self, row):
+        vals = {column: row[column] for column in PATIENT_COLUMNS if row.get(column)}
+        vals['date_of_birth'] = self._parse_date(vals.get('date_of_birth'))
+        vals['gender'] = self._selection_key('pharmacy.patient', 'gender', vals.get('gender', ''), 'other')
+        if vals.get('insurance_company'):
+            vals['has_insurance'] = True
+        return vals
+    
+    def _prepare_prescriber_vals(self, row):
+        vals = {column: row[column] for column in PRESCRIBER_COLUMNS if row.get(column)}
+        vals['license_expiry'] = self._parse_date(vals.get('license_expiry'))
+        vals['title'] = self._selection_key('pharmacy.prescriber', 'title', vals.get('title', ''), 'dr')
+        vals['specialization'] = self._selection_key(
+            'pharmacy.prescriber', 'specialization', vals.get('specialization', ''), 'general')
+        return vals
+    
+    def _import_chunk(self, rows, stats):
+        if self.import_type == 'patient':
+            model, key_field = 'pharmacy.patient', 'id_number'
+            required, prepare = ('first_name', 'last_name', 'date_of_birth', 'phone'), self._prepare_patient_vals
+        else:
+            model, key_field = 'pharmacy.prescriber', 'license_number'
+            required, prepare = ('name', 'license_number', 'phone'), self._prepare_prescriber_vals
+        seen = stats.setdefault('seen', set())
+        today = fields.Date.today()
+        
+        candidates = []
+        for row in rows:
+            try:
+                vals = prepare(row)
+            except ValueError:
+                self._conflict(stats, 'Invalid date', row['_line'])
+                continue
+            missing = [name for name in required if not vals.get(name)]
+            if missing:
+                self._conflict(stats, f"Missing {', '.join(missing)}", row['_line'])
+                continue
+            if not is_valid_phone(vals['phone']):
+                self._conflict(stats, 'Invalid phone', row['_line'])
+                continue
+            if vals.get('license_expiry') and vals['license_expiry'] < today:
+                self._conflict(stats, 'Expired license', vals['license_number'])
+                continue
+            key = vals.get(key_field)
+            if key:
+                if key in seen:
+                    self._conflict(stats, f'Duplicate {key_field} in file', key)
+                    continue
+                seen.add(key)
+            candidates.append(vals)
+        
+        keys = [vals[key_field] for vals in candidates if vals.get(key_field)]
+        existing = set()
+        if keys:
+            existing = set(self.env[model].with_context(active_test=False).search_fetch(
+                [(key_field, 'in', keys)], [key_field]).mapped(key_field))
+        vals_list = []
+        for vals in candidates:
+            if vals.get(key_field) in existing:
+                self._conflict(stats, f'{key_field} already exists', vals[key_field])
+            else:
+                vals_list.append(vals)
+        self.env[model].create(vals_list)
+        stats['created'] += len(vals_list)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+
+class PatientMergeWizard(models.TransientModel):
+    _name = 'pharmacy.patient.merge.wizard'
+    _description = 'Merge Patients'
+
+    patient_ids = fields.Many2many('pharmacy.patient', string='Patients', required=True)
+    master_id = fields.Many2one('pharmacy.patient', string='Keep', required=True,
+                                domain="[('id', 'in', patient_ids)]",
+                                help='Record that is kept; the others are archived into it')
+    
+    @api.model
+    def default_get(self, fields_list):
+        res = super(PatientMergeWizard, self).default_get(fields_list)
+        if self.env.context.get('active_model') == 'pharmacy.patient' and self.env.context.get('active_ids'):
+            patient_ids = sorted(self.env.context['active_ids'])
+            res.setdefault('patient_ids', [(6, 0, patient_ids)])
+            res.setdefault('master_id', patient_ids[0])
+        return res
+    
+    def action_merge(self):
+        self.ensure_one()
+        if self.master_id not in self.patient_ids:
+            raise UserError('The patient to keep must be one of the selected patients.')
+        if len(self.patient_ids) < 2:
+            raise UserError('Select at least two patients to merge.')
+        id_numbers = set(filter(None, self.patient_ids.mapped('id_number')))
+        if len(id_numbers) > 1:
+            raise UserError(f"These patients have different ID numbers ({', '.join(sorted(id_numbers))}) "
+                            f"and cannot be merged.")
+        self.patient_ids._merge_into(self.master_id)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'pharmacy.patient',
+            'view_mode': 'form',
+            'res_id': self.master_id.id,
+        }
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+from psycopg2.extras import execute_values
+
+from odoo import models, fields, api
+
+from ..models.practitioner_register import PRESCRIBER_REGISTER_STATUSES, REGISTER_STATUSES, license_key
+
+# Published status wording mapped to register statuses
+STATUS_ALIASES = {
+    'retained': 'active',
+    'licensed': 'active',
+    'registered': 'active',
+    'removed': 'deregistered',
+    'struck off': 'deregistered',
+    'erased': 'deregistered',
+    'inactive': 'suspended',
+}
+
+
+class PractitionerImportWizard(models.TransientModel):
+    """Streaming load of the published practitioner register.
+
+    Each chunk is upserted with one statement. With a full refresh, entries
+    absent from the file are removed once the whole file has been read, so a
+    failed import leaves the previous register in place.
+    """
+    _name = 'pharmacy.practitioner.import.wizard'
+    _inherit = 'pharmacy.csv.import.mixin'
+    _description = 'Practitioner Register Import'
+
+    chunk_size = fields.Integer(default=5000)
+    full_refresh = fields.Boolean(string='Full Register', default=True,
+                                  help='The file is the complete register; entries missing from it are removed')
+    reverify = fields.Boolean(string='Re-verify Prescribers', default=True,
+                              help='Check prescribers against the new register once imported: all of them '
+                                   'after a complete full refresh, otherwise those listed in the file')
+
+    @api.model
+    def _register_status(self, value):
+        value = (value or 'active').strip().lower()
+        value = STATUS_ALIASES.get(value, value)
+        for key, label in REGISTER_STATUSES:
+            if value in (key, label.lower()):
+                return key
+        raise ValueError(f'Unknown status {value!r}')
+
+    def _import_chunk(self, rows, stats):
+        entries = {}
+        for row in rows:
+            key = license_key(row.get('license_number'))
+            if not key:
+                stats['errors'].append(f"Line {row['_line']}: missing license_number")
+                stats['skipped'] += 1
+                continue
+            try:
+                status = self._register_status(row.get('status'))
+                expiry = self._parse_date(row.get('license_expiry'))
+            except ValueError as e:
+                stats['errors'].append(f"Line {row['_line']}: {e}")
+                stats['skipped'] += 1
+                continue
+            # A license listed twice keeps its last row
+            entries[key] = (key, row['license_number'], row.get('name') or None, row.get('cadre') or None,
+                            status, expiry or None, self.id)
+        if not entries:
+            return
+        inserted = execute_values(self.env.cr._obj, """
+            INSERT INTO pharmacy_practitioner_register AS r
+                (license_key, license_number, name, cadre, status, license_expiry, import_id)
+            VALUES %s
+            ON CONFLICT (license_key) DO UPDATE SET
+                license_number = EXCLUDED.license_number,
+                name = EXCLUDED.name,
+                cadre = EXCLUDED.cadre,
+                status = EXCLUDED.status,
+                license_expiry = EXCLUDED.license_expiry,
+                import_id = EXCLUDED.import_id
+            RETURNING xmax = 0
+        """, list(entries.values()), page_size=len(entries), fetch=True)
+        created = sum(1 for is_new, in inserted if is_new)
+        stats['created'] += created
+        stats['updated'] += len(entries) - created
+
+    def _finalize_import(self, stats):
+        if self.full_refresh and not stats['errors']:
+            self.env.cr.execute("DELETE FROM pharmacy_practitioner_register WHERE import_id != %s", (self.id,))
+            stats['removed'] = self.env.cr.rowcount
+        Register = self.env['pharmacy.practitioner.register']
+        Register.invalidate_model()
+        if self.reverify:
+            # Only a pruned full register proves that missing licenses are gone
+            prescriber_ids = None if 'removed' in stats else Register._prescribers_in_import(self.id)
+            stats['verified'] = Register._verify_prescribers(prescriber_ids)
+
+    def _summary_lines(self, stats):
+        lines = []
+        if 'removed' in stats:
+            lines.append(f"Removed from register: {stats['removed']}")
+        elif self.full_refresh:
+            lines.append('Register not pruned because of errors in the file')
+        if stats.get('verified'):
+            labels = dict(PRESCRIBER_REGISTER_STATUSES)
+            lines.append('Prescribers: ' + ', '.join(
+                f'{labels[status]} {count}' for status, count in stats['verified'].items()))
+        return [''] + lines if lines else []
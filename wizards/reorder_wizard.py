@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+import numpy as np
+
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+
+
+def daily_demand_matrix(rows, product_ids, days):
+    """(products x days) quantity matrix from (product_id, day_index, qty) rows"""
+    index = {product_id: position for position, product_id in enumerate(product_ids)}
+    matrix = np.zeros((len(product_ids), days))
+    if rows:
+        products, day_indexes, quantities = zip(*rows)
+        matrix[[index[product_id] for product_id in products], list(day_indexes)] = quantities
+    return matrix
+
+
+def forecast_profile(matrix, method, first_weekday):
+    """Expected daily demand per product for each weekday, as a (products x 7) array.
+
+    ``first_weekday`` is the weekday of the first column of ``matrix``. The
+    moving average spreads the mean evenly over the week; the seasonal model
+    averages each weekday separately over the full weeks of history.
+    """
+    if method == 'moving_average':
+        return np.repeat(matrix.mean(axis=1, keepdims=True), 7, axis=1)
+    weeks = matrix.shape[1] // 7
+    recent = matrix[:, matrix.shape[1] - weeks * 7:]
+    by_position = recent.reshape(len(matrix), weeks, 7).mean(axis=1)
+    # Column 0 of the reshaped history is this weekday
+    start = (first_weekday + matrix.shape[1] - weeks * 7) % 7
+    return np.roll(by_position, start, axis=1)
+
+
+def cumulative_demand(profile, weekday, horizons, rows=None):
+    """Forecast demand from today until ``horizons`` days ahead.
+
+    ``rows`` selects the profile row of each horizon (one row per product
+    when omitted), so lots of different products are evaluated in one call.
+    """
+    rotated = np.roll(profile, -weekday, axis=1)
+    prefix = np.concatenate([np.zeros((len(profile), 1)), np.cumsum(rotated, axis=1)], axis=1)
+    if rows is None:
+        rows = np.arange(len(profile))
+    horizons = np.maximum(horizons, 0)
+    weeks, remainder = np.divmod(horizons, 7)
+    return weeks * prefix[rows, 7] + prefix[rows, remainder.astype(int)]
+
+
+def usable_stock(lot_products, lot_quantities, lot_demand, product_count):
+    """Stock each product can sell before its lots reach their sell-by date.
+
+    Lots are ordered by product then sell-by date and consumed first-expiry
+    first-out: a lot only contributes what the forecast demand up to its
+    sell-by date leaves after the lots before it.
+    """
+    usable = np.zeros(product_count)
+    current, consumed = -1, 0.0
+    for product, quantity, demand in zip(lot_products, lot_quantities, lot_demand):
+        if product != current:
+            current, consumed = product, 0.0
+        taken = min(quantity, max(demand - consumed, 0.0))
+        consumed += taken
+        usable[product] += taken
+    return usable
+
+
+class ReorderWizard(models.TransientModel):
+    _name = 'pharmacy.reorder.wizard'
+    _description = 'Reorder Suggestions Wizard'
+
+    method = fields.Selection([
+        ('moving_average', 'Moving Average'),
+        ('seasonal', 'Weekly Seasonal'),
+    ], string='Forecast Model', default='seasonal', required=True)
+    history_days = fields.Integer(string='Sales History (days)', default=56, required=True)
+    lead_time_days = fields.Integer(string='Supplier Lead Time (days)', default=3, required=True)
+    coverage_days = fields.Integer(string='Cover Demand For (days)', default=14, required=True,
+                                   help='Days of demand the order should cover once received')
+    company_id = fields.Many2one('res.company', string='Company', required=True, default=lambda self: self.env.company)
+    only_suggestions = fields.Boolean(string='Only Products to Reorder', default=True)
+
+    line_ids = fields.One2many('pharmacy.reorder.line', 'wizard_id', string='Suggestions')
+
+    @api.constrains('history_days', 'lead_time_days', 'coverage_days')
+    def _check_days(self):
+        for wizard in self:
+            if wizard.history_days < 14:
+                raise ValidationError('At least 14 days of sales history are needed to forecast.')
+            if wizard.lead_time_days < 0 or wizard.coverage_days <= 0:
+                raise ValidationError('Lead time cannot be negative and coverage must be at least one day.')
+
+    def _sales_history(self, date_from):
+        """Daily quantities sold per product since ``date_from``, in one aggregate query"""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT l.product_id, (o.date_order::date - %(date_from)s::date) AS day, SUM(l.qty)
+            FROM pos_order_line l
+            JOIN pos_order o ON o.id = l.order_id
+            WHERE o.state IN ('paid', 'done', 'invoiced')
+              AND o.company_id = %(company_id)s
+              AND o.date_order >= %(date_from)s
+              AND o.date_order < %(date_to)s
+            GROUP BY l.product_id, day
+        """, {
+            'date_from': date_from,
+            'date_to': fields.Date.today(),
+            'company_id': self.company_id.id,
+        })
+        return self.env.cr.fetchall()
+
+    def _stock_by_lot(self):
+        """On-hand quantity per product and lot with the lot's sell-by date.
+
+        The sell-by date is the expiry date less the product's expiry alert
+        days. Recalled and cold-chain compromised lots cannot be sold.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT q.product_id,
+                   CASE WHEN lot.is_recalled OR lot.cold_chain_compromised THEN CURRENT_DATE
+                        WHEN lot.expiry_date IS NOT NULL
+                        THEN lot.expiry_date - COALESCE(NULLIF(ph.expiry_alert_days, 0), 90)
+                   END AS sell_by,
+                   SUM(q.quantity)
+            FROM stock_quant q
+            JOIN stock_location loc ON loc.id = q.location_id
+            JOIN product_product pp ON pp.id = q.product_id
+            JOIN product_template pt ON pt.id = pp.product_tmpl_id
+            LEFT JOIN pharmacy_product ph ON ph.id = pt.pharmacy_product_id
+            LEFT JOIN stock_lot lot ON lot.id = q.lot_id
+            WHERE loc.usage = 'internal'
+              AND q.company_id = %s
+            GROUP BY q.product_id, sell_by
+            HAVING SUM(q.quantity) > 0
+            ORDER BY q.product_id, sell_by NULLS LAST
+        """, (self.company_id.id,))
+        return self.env.cr.fetchall()
+
+    def action_compute(self):
+        """Forecast demand for the whole catalogue and suggest order quantities"""
+        self.ensure_one()
+        self.line_ids.unlink()
+        today = fields.Date.today()
+        date_from = today - timedelta(days=self.history_days)
+        sales = self._sales_history(date_from)
+        stock = self._stock_by_lot()
+
+        product_ids = sorted({row[0] for row in sales} | {row[0] for row in stock})
+        if not product_ids:
+            return self._reopen()
+        position = {product_id: index for index, product_id in enumerate(product_ids)}
+        matrix = daily_demand_matrix(sales, product_ids, self.history_days)
+        profile = forecast_profile(matrix, self.method, date_from.weekday())
+        weekday = today.weekday()
+        horizon = self.lead_time_days + self.coverage_days
+        demand = cumulative_demand(profile, weekday, np.full(len(product_ids), horizon))
+
+        lot_products = np.array([position[row[0]] for row in stock], dtype=int)
+        lot_quantities = np.array([row[2] for row in stock], dtype=float)
+        # Lots without expiry stay sellable for the whole horizon
+        lot_days = np.array([(row[1] - today).days if row[1] else horizon for row in stock], dtype=float)
+        on_hand = np.bincount(lot_products, weights=lot_quantities, minlength=len(product_ids))
+        lot_horizons = np.minimum(lot_days, horizon)
+        lot_demand = cumulative_demand(profile, weekday, lot_horizons, rows=lot_products)
+        usable = usable_stock(lot_products, lot_quantities, lot_demand, len(product_ids))
+        # Stock reaching its sell-by date within the horizon without being sold
+        expiring = np.where(lot_days < horizon, lot_quantities, 0.0)
+        expiring = np.bincount(lot_products, weights=expiring, minlength=len(product_ids))
+        at_risk = np.minimum(np.maximum(on_hand - usable, 0.0), expiring)
+        suggested = np.ceil(np.maximum(demand - usable, 0.0) - 1e-9)
+
+        keep = suggested > 0 if self.only_suggestions else (suggested > 0) | (on_hand > 0) | (demand > 0)
+        self.env['pharmacy.reorder.line'].create([{
+            'wizard_id': self.id,
+            'product_id': product_ids[index],
+            'daily_demand': profile[index].mean(),
+            'forecast_qty': demand[index],
+            'on_hand_qty': on_hand[index],
+            'usable_qty': usable[index],
+            'at_risk_qty': at_risk[index],
+            'suggested_qty': suggested[index],
+        } for index in np.flatnonzero(keep).tolist()])
+        return self._reopen()
+
+    def _reopen(self):
+        return {
+            'name': 'Reorder Suggestions',
+            'type': 'ir.actions.act_window',
+            'res_model': 'pharmacy.reorder.wizard',
+            'view_mode': 'form',
+            'res_id': self.id,
+            'target': 'new',
+        }
+
+
+class ReorderLine(models.TransientModel):
+    _name = 'pharmacy.reorder.line'
+    _description = 'Reorder Suggestion'
+    _order = 'suggested_qty desc, product_id'
+
+    wizard_id = fields.Many2one('pharmacy.reorder.wizard', string='Wizard', required=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', string='Product', required=True)
+    daily_demand = fields.Float(string='Daily Demand', digits=(16, 2))
+    forecast_qty = fields.Float(string='Forecast Demand', digits=(16, 1),
+                                help='Forecast demand over the lead time and coverage period')
+    on_hand_qty = fields.Float(string='On Hand')
+    usable_qty = fields.Float(string='Sellable Before Expiry', digits=(16, 1),
+                              help='On-hand stock the forecast sells before each lot reaches its expiry alert date')
+    at_risk_qty = fields.Float(string='At Risk of Expiry', digits=(16, 1))
+    suggested_qty = fields.Float(string='Suggested Order')
+    days_of_cover = fields.Float(string='Days of Cover', compute='_compute_days_of_cover', digits=(16, 1))
+
+    @api.depends('usable_qty', 'daily_demand')
+    def _compute_days_of_cover(self):
+        for line in self:
+            line.days_of_cover = line.usable_qty / line.daily_demand if line.daily_demand else 0.0